@@ -0,0 +1,49 @@
+"""Benchmarks of xsdba, run with `asv <https://asv.readthedocs.io/>`_ from this directory's parent."""
+
+from __future__ import annotations
+
+import numpy as np
+import xarray as xr
+
+from xsdba.base import Grouper
+from xsdba.processing import stack_variables
+from xsdba.testing import test_timelonlatseries
+
+# Number of days of the synthetic series
+NTIME = 365 * 10
+# Groupings of the adjustments, by name
+GROUPS = {
+    "time": Grouper("time"),
+    "time.month": Grouper("time.month"),
+    "time.dayofyear": Grouper("time.dayofyear", window=31),
+}
+
+
+def synthetic(variable: str, size: int, backend: str, offset: int = 0) -> xr.DataArray:
+    """
+    Daily series of temperature or precipitation on a grid of `size` x `size` points.
+
+    The seasonal cycle, the mean and the spread change with `offset`, which gives `ref` (0), `hist` (1) and
+    `sim` (2). With the "dask" backend, the array has one chunk per longitude.
+    """
+    rng = np.random.default_rng(offset)
+    shape = (NTIME, size, size)
+    season = np.sin(2 * np.pi * np.arange(NTIME) / 365)[:, np.newaxis, np.newaxis]
+    if variable == "tas":
+        values = 280 + offset + (10 + offset) * season + rng.normal(size=shape)
+        attrs = {"units": "K", "kind": "+"}
+    else:
+        values = np.where(
+            rng.random(shape) < 0.6, 0, rng.gamma(0.8, 4 + offset, size=shape)
+        )
+        attrs = {"units": "mm/d", "kind": "*"}
+    da = test_timelonlatseries(values.astype(np.float32), attrs=attrs).rename(variable)
+    return da.chunk(lon=1) if backend == "dask" else da
+
+
+def synthetic_multivariate(size: int, backend: str, offset: int = 0) -> xr.DataArray:
+    """Temperature and precipitation stacked along the "multivar" dimension."""
+    ds = xr.Dataset(
+        {var: synthetic(var, size, backend, offset) for var in ["tas", "pr"]}
+    )
+    return stack_variables(ds)
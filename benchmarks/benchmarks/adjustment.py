@@ -0,0 +1,192 @@
+"""Benchmarks of the training and adjustment of the methods of :py:mod:`xsdba.adjustment`."""
+
+from __future__ import annotations
+
+from xsdba import adjustment
+
+from . import GROUPS, synthetic, synthetic_multivariate
+
+BACKENDS = ["numpy", "dask"]
+
+
+class Univariate:
+    """Methods adjusting a single variable, by group."""
+
+    params = (
+        [
+            "EmpiricalQuantileMapping",
+            "DetrendedQuantileMapping",
+            "QuantileDeltaMapping",
+            "LOCI",
+            "Scaling",
+        ],
+        list(GROUPS),
+        [2, 10],
+        BACKENDS,
+    )
+    param_names = ["method", "group", "size", "backend"]
+    timeout = 300
+
+    train_kwargs = {
+        "EmpiricalQuantileMapping": {"nquantiles": 50, "kind": "*"},
+        "DetrendedQuantileMapping": {"nquantiles": 50, "kind": "*"},
+        "QuantileDeltaMapping": {"nquantiles": 50, "kind": "*"},
+        "LOCI": {"thresh": "1 mm/d"},
+        "Scaling": {"kind": "*"},
+    }
+    adjust_kwargs = {
+        "EmpiricalQuantileMapping": {"interp": "linear"},
+        "DetrendedQuantileMapping": {"interp": "linear"},
+        "QuantileDeltaMapping": {"interp": "linear"},
+        "LOCI": {},
+        "Scaling": {},
+    }
+
+    def setup(self, method, group, size, backend):
+        """Generate the inputs and train the adjustment used by the adjustment benchmarks."""
+        self.cls = getattr(adjustment, method)
+        self.ref, self.hist, self.sim = (
+            synthetic("pr", size, backend, offset) for offset in range(3)
+        )
+        self.kwargs = {"group": GROUPS[group], **self.train_kwargs[method]}
+        self.trained = self.cls.train(self.ref, self.hist, **self.kwargs)
+        self.trained.ds.load()
+
+    def time_train(self, method, group, size, backend):
+        """Time the training."""
+        self.cls.train(self.ref, self.hist, **self.kwargs).ds.load()
+
+    def peakmem_train(self, method, group, size, backend):
+        """Measure the peak memory of the training."""
+        self.cls.train(self.ref, self.hist, **self.kwargs).ds.load()
+
+    def time_adjust(self, method, group, size, backend):
+        """Time the adjustment."""
+        self.trained.adjust(self.sim, **self.adjust_kwargs[method]).load()
+
+    def peakmem_adjust(self, method, group, size, backend):
+        """Measure the peak memory of the adjustment."""
+        self.trained.adjust(self.sim, **self.adjust_kwargs[method]).load()
+
+
+class ExtremeValues:
+    """Adjustment of the extremes of a quantile mapping."""
+
+    params = ([2, 10], BACKENDS)
+    param_names = ["size", "backend"]
+    timeout = 300
+
+    def setup(self, size, backend):
+        """Generate the inputs, the adjusted scenario of a quantile mapping and the trained adjustment."""
+        self.ref, self.hist, self.sim = (
+            synthetic("pr", size, backend, offset) for offset in range(3)
+        )
+        self.scen = (
+            adjustment.QuantileDeltaMapping.train(
+                self.ref, self.hist, nquantiles=50, kind="*"
+            )
+            .adjust(self.sim)
+            .load()
+        )
+        self.trained = adjustment.ExtremeValues.train(
+            self.ref, self.hist, cluster_thresh="1 mm/d", q_thresh=0.97
+        )
+        self.trained.ds.load()
+
+    def _train(self):
+        return adjustment.ExtremeValues.train(
+            self.ref, self.hist, cluster_thresh="1 mm/d", q_thresh=0.97
+        ).ds.load()
+
+    def time_train(self, size, backend):
+        """Time the training."""
+        self._train()
+
+    def peakmem_train(self, size, backend):
+        """Measure the peak memory of the training."""
+        self._train()
+
+    def time_adjust(self, size, backend):
+        """Time the adjustment."""
+        self.trained.adjust(self.sim, scen=self.scen).load()
+
+    def peakmem_adjust(self, size, backend):
+        """Measure the peak memory of the adjustment."""
+        self.trained.adjust(self.sim, scen=self.scen).load()
+
+
+class MultivariateTrainAdjust:
+    """Multivariate methods with a training, adjusting temperature and precipitation together, by group."""
+
+    params = (["PrincipalComponents", "MBCn"], list(GROUPS), [1, 3], BACKENDS)
+    param_names = ["method", "group", "size", "backend"]
+    timeout = 900
+    number = 1
+
+    def setup(self, method, group, size, backend):
+        """Generate the stacked inputs and train the adjustment used by the adjustment benchmarks."""
+        self.cls = getattr(adjustment, method)
+        self.ref, self.hist, self.sim = (
+            synthetic_multivariate(size, backend, offset) for offset in range(3)
+        )
+        if method == "MBCn":
+            self.kwargs = {
+                "base_kws": {"nquantiles": 20, "group": GROUPS[group]},
+                "n_iter": 5,
+            }
+            self.adjust_kwargs = {"ref": self.ref, "hist": self.hist}
+        else:
+            self.kwargs = {"crd_dim": "multivar", "group": GROUPS[group]}
+            self.adjust_kwargs = {}
+        # Monthly groups raise a NotImplementedError for MBCn, which skips the benchmark
+        self.trained = self.cls.train(self.ref, self.hist, **self.kwargs)
+        self.trained.ds.load()
+
+    def time_train(self, method, group, size, backend):
+        """Time the training."""
+        self.cls.train(self.ref, self.hist, **self.kwargs).ds.load()
+
+    def peakmem_train(self, method, group, size, backend):
+        """Measure the peak memory of the training."""
+        self.cls.train(self.ref, self.hist, **self.kwargs).ds.load()
+
+    def time_adjust(self, method, group, size, backend):
+        """Time the adjustment."""
+        self.trained.adjust(sim=self.sim, **self.adjust_kwargs).load()
+
+    def peakmem_adjust(self, method, group, size, backend):
+        """Measure the peak memory of the adjustment."""
+        self.trained.adjust(sim=self.sim, **self.adjust_kwargs).load()
+
+
+class MultivariateAdjust:
+    """Multivariate methods without a training step, adjusting temperature and precipitation together."""
+
+    params = (["NpdfTransform", "OTC", "dOTC"], list(GROUPS), [1, 3], BACKENDS)
+    param_names = ["method", "group", "size", "backend"]
+    timeout = 900
+    number = 1
+
+    def setup(self, method, group, size, backend):
+        """Generate the stacked inputs and the arguments of the adjustment."""
+        self.cls = getattr(adjustment, method)
+        ref, hist, sim = (
+            synthetic_multivariate(size, backend, offset) for offset in range(3)
+        )
+        if method == "NpdfTransform":
+            self.kwargs = {
+                "base_kws": {"nquantiles": 20, "group": GROUPS[group]},
+                "n_iter": 5,
+            }
+        else:
+            self.kwargs = {"group": GROUPS[group]}
+        # OTC adjusts `hist` to `ref`
+        self.inputs = (ref, hist) if method == "OTC" else (ref, hist, sim)
+
+    def time_adjust(self, method, group, size, backend):
+        """Time the adjustment."""
+        self.cls.adjust(*self.inputs, **self.kwargs).load()
+
+    def peakmem_adjust(self, method, group, size, backend):
+        """Measure the peak memory of the adjustment."""
+        self.cls.adjust(*self.inputs, **self.kwargs).load()
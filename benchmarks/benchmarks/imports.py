@@ -0,0 +1,13 @@
+"""Benchmark of the import of the package, run in a new interpreter."""
+
+from __future__ import annotations
+
+
+def timeraw_import_xsdba():
+    """Time the import of the package."""
+    return "import xsdba"
+
+
+def timeraw_import_adjustment():
+    """Time the import of the adjustment module and its dependencies."""
+    return "import xsdba.adjustment"
@@ -0,0 +1,61 @@
+"""Benchmarks of the compiled quantile computations of :py:mod:`xsdba.nbutils`."""
+
+from __future__ import annotations
+
+import numpy as np
+
+from xsdba import nbutils
+
+from . import GROUPS, synthetic
+
+QUANTILES = np.linspace(0.01, 0.99, 50)
+
+
+class Quantile:
+    """Quantiles over the time dimension, with the inputs in memory, chunked in space or chunked in time."""
+
+    params = ([2, 10, 30], ["numpy", "dask", "dask-time"])
+    param_names = ["size", "backend"]
+
+    def setup(self, size, backend):
+        """Generate the input and compile the kernels."""
+        self.da = synthetic("pr", size, "numpy")
+        if backend == "dask":
+            self.da = self.da.chunk(lon=1)
+        elif backend == "dask-time":
+            self.da = self.da.chunk(time=365)
+        # Compile the kernels outside of the timings
+        nbutils.quantile(self.da.isel(lon=[0], lat=[0]), QUANTILES, "time").load()
+
+    def time_quantile(self, size, backend):
+        """Time the computation of the quantiles."""
+        nbutils.quantile(self.da, QUANTILES, "time").load()
+
+    def peakmem_quantile(self, size, backend):
+        """Measure the peak memory of the computation of the quantiles."""
+        nbutils.quantile(self.da, QUANTILES, "time").load()
+
+
+class GroupedQuantile:
+    """Quantiles of each group, from the index table of the groups and their windows."""
+
+    params = (list(GROUPS), [2, 10, 30], ["numpy", "dask"])
+    param_names = ["group", "size", "backend"]
+
+    def setup(self, group, size, backend):
+        """Generate the input and its index table, and compile the kernels."""
+        self.da = synthetic("pr", size, backend)
+        self.grouper = GROUPS[group]
+        self.indexes = self.grouper.get_group_indexes(self.da)
+        self.dims = [self.grouper.dim, *self.grouper.add_dims]
+        nbutils.grouped_quantile(
+            self.da.isel(lon=[0], lat=[0]), QUANTILES, self.indexes, self.dims
+        ).load()
+
+    def time_grouped_quantile(self, group, size, backend):
+        """Time the computation of the quantiles of the groups."""
+        nbutils.grouped_quantile(self.da, QUANTILES, self.indexes, self.dims).load()
+
+    def peakmem_grouped_quantile(self, group, size, backend):
+        """Measure the peak memory of the computation of the quantiles of the groups."""
+        nbutils.grouped_quantile(self.da, QUANTILES, self.indexes, self.dims).load()
@@ -0,0 +1,39 @@
+"""Benchmarks of the interpolation of the adjustment factors of :py:mod:`xsdba.utils`."""
+
+from __future__ import annotations
+
+import numpy as np
+
+from xsdba import nbutils, utils
+
+from . import GROUPS, synthetic
+
+
+class InterpOnQuantiles:
+    """Interpolation of adjustment factors, given at quantiles of each group, on new values."""
+
+    params = (list(GROUPS), ["nearest", "linear", "cubic"], [2, 10], ["numpy", "dask"])
+    param_names = ["group", "method", "size", "backend"]
+
+    def setup(self, group, method, size, backend):
+        """Generate the values to interpolate on and the quantiles of the adjustment factors."""
+        self.group = GROUPS[group]
+        hist = synthetic("tas", size, "numpy", 1)
+        self.sim = synthetic("tas", size, backend, 2)
+        quantiles = np.linspace(0.01, 0.99, 50)
+        self.xq = self.group.apply(nbutils.quantile, hist, q=quantiles)
+        self.yq = self.xq + 2
+        if backend == "dask":
+            self.xq, self.yq = self.xq.chunk(lon=1), self.yq.chunk(lon=1)
+
+    def time_interp_on_quantiles(self, group, method, size, backend):
+        """Time the interpolation."""
+        utils.interp_on_quantiles(
+            self.sim, self.xq, self.yq, group=self.group, method=method
+        ).load()
+
+    def peakmem_interp_on_quantiles(self, group, method, size, backend):
+        """Measure the peak memory of the interpolation."""
+        utils.interp_on_quantiles(
+            self.sim, self.xq, self.yq, group=self.group, method=method
+        ).load()
@@ -20,30 +20,98 @@
 
 from __future__ import annotations
 
+import importlib
 import importlib.util
-import warnings
+from typing import TYPE_CHECKING
 
-from xsdba import adjustment, base, detrending, processing, units, utils
+from xsdba.options import set_options
 
 xclim_installed = importlib.util.find_spec("xclim") is not None
-if xclim_installed:
+
+# Submodules and objects are imported on first access (PEP 562), so that `import xsdba` does not pull in
+# scipy, numba, statsmodels or xclim. This matters for short-lived processes like dask workers and the CLI.
+_SUBMODULES = {
+    "adjustment",
+    "base",
+    "detrending",
+    "formatting",
+    "loess",
+    "measures",
+    "nbutils",
+    "processing",
+    "profiling",
+    "properties",
+    "units",
+    "utils",
+}
+_OBJECTS = {
+    # xsdba.adjustment.__all__
+    "LOCI": "adjustment",
+    "OTC": "adjustment",
+    "BaseAdjustment": "adjustment",
+    "DetrendedQuantileMapping": "adjustment",
+    "EmpiricalQuantileMapping": "adjustment",
+    "ExtremeValues": "adjustment",
+    "MBCn": "adjustment",
+    "NpdfTransform": "adjustment",
+    "PrincipalComponents": "adjustment",
+    "QuantileDeltaMapping": "adjustment",
+    "Scaling": "adjustment",
+    "dOTC": "adjustment",
+    "dOTCTrainAdjust": "adjustment",
+    "Grouper": "base",
+    "stack_periods": "base",
+    "unstack_periods": "base",
+    "stack_variables": "processing",
+    "unstack_variables": "processing",
+}
+
+# The modules depending on xclim are only exported if it is installed, as they fail to import otherwise.
+__all__ = sorted(
+    (_SUBMODULES - (set() if xclim_installed else {"measures", "properties"}))
+    | set(_OBJECTS)
+    | {"set_options", "xclim_installed"}
+)
+
+if TYPE_CHECKING:
     from xsdba import (
+        adjustment,
+        base,
+        detrending,
+        formatting,
+        loess,
         measures,
+        nbutils,
+        processing,
+        profiling,
         properties,
+        units,
+        utils,
     )
+    from xsdba.adjustment import *
+    from xsdba.base import Grouper, stack_periods, unstack_periods
+    from xsdba.processing import stack_variables, unstack_variables
+
+
+def __getattr__(name: str):
+    """Import the submodules and the public objects on first access."""
+    if name in _SUBMODULES:
+        return importlib.import_module(f"xsdba.{name}")
+    if name in _OBJECTS:
+        obj = getattr(importlib.import_module(f"xsdba.{_OBJECTS[name]}"), name)
+        globals()[name] = obj
+        return obj
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    """List the module attributes, including those not imported yet."""
+    return sorted(set(globals()) | _SUBMODULES | set(_OBJECTS))
 
-from xsdba.adjustment import *
-from xsdba.base import Grouper, stack_periods, unstack_periods
-from xsdba.options import set_options
-from xsdba.processing import stack_variables, unstack_variables
 
 # TODO: ISIMIP ? Used for precip freq adjustment in biasCorrection.R
 # Hempel, S., Frieler, K., Warszawski, L., Schewe, J., & Piontek, F. (2013). A trend-preserving bias correction &ndash;
 # The ISI-MIP approach. Earth System Dynamics, 4(2), 219–236. https://doi.org/10.5194/esd-4-219-2013
-# If SBCK is installed, create adjustment classes wrapping SBCK's algorithms.
-if hasattr(adjustment, "_generate_SBCK_classes"):
-    for cls in adjustment._generate_SBCK_classes():
-        adjustment.__dict__[cls.__name__] = cls
 
 __author__ = """Éric Dupuis"""
 __email__ = "dupuis.eric@ouranos.ca"
@@ -16,11 +16,11 @@ import xarray as xr
 
 from . import nbutils as nbu
 from . import utils as u
-from ._processing import _adapt_freq
-from .base import Grouper, map_blocks, map_groups
+from ._processing import _adapt_freq_group
+from .base import Grouper, get_seed, map_blocks, map_groups
 from .detrending import PolyDetrend
 from .options import set_options
-from .processing import escore, jitter_under_thresh, reordering, standardize
+from .processing import escore, jitter_under_thresh
 from .units import convert_units_to
 from .utils import _fitfunc_1d
 
@@ -29,8 +29,8 @@ def _adapt_freq_hist(ds: xr.Dataset, adapt_freq_thresh: str):
     """Adapt frequency of null values of `hist`    in order to match `ref`."""
     thresh = convert_units_to(adapt_freq_thresh, ds.ref)
     dim = ["time"] + ["window"] * ("window" in ds.hist.dims)
-    return _adapt_freq.func(
-        xr.Dataset({"sim": ds.hist, "ref": ds.ref}), thresh=thresh, dim=dim
+    return _adapt_freq_group(
+        xr.Dataset({"sim": ds.hist, "ref": ds.ref}), thresh=thresh, dim=dim, key="hist"
     ).sim_ad
 
 
@@ -47,6 +47,7 @@ def dqm_train(
     quantiles: np.ndarray,
     adapt_freq_thresh: str | None = None,
     jitter_under_thresh_value: str | None = None,
+    parallel: bool = False,
 ) -> xr.Dataset:
     """
     Train step on one group.
@@ -69,6 +70,9 @@ def dqm_train(
     jitter_under_thresh_value : str, optional
         Threshold under which to add uniform random noise to values, a quantity with units.
         Default is None, meaning that jitter under thresh is not performed.
+    parallel : bool
+        Whether to compute the quantiles of the different series in parallel with `numba`.
+        Should only be True for in-memory data, the blocks of `dask` arrays being already processed in parallel.
 
     Returns
     -------
@@ -76,7 +80,7 @@ def dqm_train(
         The dataset containing the adjustment factors, the quantiles over the training data, and the scaling factor.
     """
     ds["hist"] = (
-        jitter_under_thresh(ds.hist, jitter_under_thresh_value)
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
         if jitter_under_thresh_value
         else ds.hist
     )
@@ -87,8 +91,8 @@ def dqm_train(
     refn = u.apply_correction(ds.ref, u.invert(ds.ref.mean(dim), kind), kind)
     histn = u.apply_correction(ds.hist, u.invert(ds.hist.mean(dim), kind), kind)
 
-    ref_q = nbu.quantile(refn, quantiles, dim)
-    hist_q = nbu.quantile(histn, quantiles, dim)
+    ref_q = nbu.quantile(refn, quantiles, dim, parallel=parallel)
+    hist_q = nbu.quantile(histn, quantiles, dim, parallel=parallel)
 
     af = u.get_correction(hist_q, ref_q, kind)
     mu_ref = ds.ref.mean(dim)
@@ -110,6 +114,7 @@ def eqm_train(
     quantiles: np.ndarray,
     adapt_freq_thresh: str | None = None,
     jitter_under_thresh_value: str | None = None,
+    parallel: bool = False,
 ) -> xr.Dataset:
     """
     EQM: Train step on one group.
@@ -132,6 +137,9 @@ def eqm_train(
     jitter_under_thresh_value : str, optional
         Threshold under which to add uniform random noise to values, a quantity with units.
         Default is None, meaning that jitter under thresh is not performed.
+    parallel : bool
+        Whether to compute the quantiles of the different series in parallel with `numba`.
+        Should only be True for in-memory data, the blocks of `dask` arrays being already processed in parallel.
 
     Returns
     -------
@@ -139,22 +147,399 @@ def eqm_train(
         The dataset containing the adjustment factors and the quantiles over the training data.
     """
     ds["hist"] = (
-        jitter_under_thresh(ds.hist, jitter_under_thresh_value)
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
         if jitter_under_thresh_value
         else ds.hist
     )
     ds["hist"] = (
         _adapt_freq_hist(ds, adapt_freq_thresh) if adapt_freq_thresh else ds.hist
     )
-    ref_q = nbu.quantile(ds.ref, quantiles, dim)
-    hist_q = nbu.quantile(ds.hist, quantiles, dim)
+    ref_q = nbu.quantile(ds.ref, quantiles, dim, parallel=parallel)
+    hist_q = nbu.quantile(ds.hist, quantiles, dim, parallel=parallel)
 
     af = u.get_correction(hist_q, ref_q, kind)
 
     return xr.Dataset(data_vars={"af": af, "hist_q": hist_q})
 
 
-def _npdft_train(ref, hist, rots, quantiles, method, extrap, n_escore, standardize):
+def use_grouped_quantiles(group: Grouper, adapt_freq_thresh: str | None = None) -> bool:
+    """
+    Whether the training of quantile mapping methods can be done with the sort-based grouped quantiles.
+
+    The grouped path (:py:func:`eqm_train_grouped`, :py:func:`dqm_train_grouped`) gives the same results
+    as the `groupby` path (:py:func:`eqm_train`, :py:func:`dqm_train`), which is kept as a fallback for
+    the cases it does not cover : frequency adaptation, which is done group-wise, `fastnanquantile`
+    being installed or groupings without a known coordinate.
+    """
+    return (
+        not nbu.USE_FASTNANQUANTILE
+        and adapt_freq_thresh is None
+        and group.dim == "time"
+        and group.prop in ["group", "month", "season", "dayofyear"]
+    )
+
+
+@map_groups(
+    af=[Grouper.PROP, "quantiles"],
+    hist_q=[Grouper.PROP, "quantiles"],
+    indexed=True,
+)
+def eqm_train_grouped(
+    ds: xr.Dataset,
+    *,
+    dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
+    kind: str,
+    quantiles: np.ndarray,
+    jitter_under_thresh_value: str | None = None,
+    parallel: bool = False,
+) -> xr.Dataset:
+    """
+    EQM: Train step on one block, all groups at once.
+
+    Same as :py:func:`eqm_train`, but the quantiles of all groups are computed in a single pass
+    by :py:func:`xsdba.nbutils.grouped_quantile`, instead of going through `groupby`.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data
+    dim : sequence of str
+        The dimensions along which to compute the quantiles, the main one first.
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        The grouper object.
+    kind : str
+        The kind of correction to compute. See :py:func:`xsdba.utils.get_correction`.
+    quantiles : array-like
+        The quantiles to compute.
+    jitter_under_thresh_value : str, optional
+        Threshold under which to add uniform random noise to values, a quantity with units.
+        Default is None, meaning that jitter under thresh is not performed.
+    parallel : bool
+        Whether to compute the quantiles of the different series in parallel with `numba`.
+        Should only be True for in-memory data, the blocks of `dask` arrays being already processed in parallel.
+
+    Returns
+    -------
+    xr.Dataset
+        The dataset containing the adjustment factors and the quantiles over the training data.
+    """
+    hist = (
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
+        if jitter_under_thresh_value
+        else ds.hist
+    )
+    ref_q = nbu.grouped_quantile(ds.ref, quantiles, indexes, dim, parallel=parallel)
+    hist_q = nbu.grouped_quantile(hist, quantiles, indexes, dim, parallel=parallel)
+
+    af = u.get_correction(hist_q, ref_q, kind)
+
+    return xr.Dataset(data_vars={"af": af, "hist_q": hist_q})
+
+
+@map_groups(
+    af=[Grouper.PROP, "quantiles"],
+    hist_q=[Grouper.PROP, "quantiles"],
+    scaling=[Grouper.PROP],
+    indexed=True,
+)
+def dqm_train_grouped(
+    ds: xr.Dataset,
+    *,
+    dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
+    kind: str,
+    quantiles: np.ndarray,
+    jitter_under_thresh_value: str | None = None,
+    parallel: bool = False,
+) -> xr.Dataset:
+    """
+    DQM: Train step on one block, all groups at once.
+
+    Same as :py:func:`dqm_train`, but the means and quantiles of all groups are computed in single passes
+    by :py:func:`xsdba.nbutils.grouped_mean` and :py:func:`xsdba.nbutils.grouped_quantile`, instead of going
+    through `groupby`. The group means are summed in a different order, so results are equal up to
+    floating point precision.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data
+    dim : sequence of str
+        The dimensions along which to compute the quantiles, the main one first.
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        The grouper object.
+    kind : str
+        The kind of correction to compute. See :py:func:`xsdba.utils.get_correction`.
+    quantiles : array-like
+        The quantiles to compute.
+    jitter_under_thresh_value : str, optional
+        Threshold under which to add uniform random noise to values, a quantity with units.
+        Default is None, meaning that jitter under thresh is not performed.
+    parallel : bool
+        Whether to compute the quantiles of the different series in parallel with `numba`.
+        Should only be True for in-memory data, the blocks of `dask` arrays being already processed in parallel.
+
+    Returns
+    -------
+    xr.Dataset
+        The dataset containing the adjustment factors, the quantiles over the training data, and the scaling factor.
+    """
+    hist = (
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
+        if jitter_under_thresh_value
+        else ds.hist
+    )
+
+    mu_ref = nbu.grouped_mean(ds.ref, indexes, dim)
+    mu_hist = nbu.grouped_mean(hist, indexes, dim)
+
+    # Quantiles of the normalized data, the normalization is applied on each group inside the kernel.
+    norm = "scale" if kind == u.MULTIPLICATIVE else "shift"
+    ref_q = nbu.grouped_quantile(
+        ds.ref,
+        quantiles,
+        indexes,
+        dim,
+        parallel=parallel,
+        **{norm: u.invert(mu_ref, kind)},
+    )
+    hist_q = nbu.grouped_quantile(
+        hist,
+        quantiles,
+        indexes,
+        dim,
+        parallel=parallel,
+        **{norm: u.invert(mu_hist, kind)},
+    )
+
+    af = u.get_correction(hist_q, ref_q, kind)
+    scaling = u.get_correction(mu_hist, mu_ref, kind=kind)
+
+    return xr.Dataset(data_vars={"af": af, "hist_q": hist_q, "scaling": scaling})
+
+
+def check_sketch_training(group: Grouper, adapt_freq_thresh: str | None = None):
+    """
+    Raise an error if the training of quantile mapping methods cannot be done with quantile sketches.
+
+    The sketch path (:py:func:`eqm_train_sketch`, :py:func:`dqm_train_sketch`) needs the index table
+    of the groups and cannot adapt the frequency of `hist`, which needs all elements of a group at once.
+    """
+    if adapt_freq_thresh is not None:
+        raise ValueError(
+            "Frequency adaptation is not supported when training with quantile sketches (`sketch_error`)."
+        )
+    if group.dim != "time" or group.prop not in [
+        "group",
+        "month",
+        "season",
+        "dayofyear",
+    ]:
+        raise ValueError(
+            f"Training with quantile sketches (`sketch_error`) is not supported with group {group.name}."
+        )
+
+
+def eqm_train_sketch(
+    ds: xr.Dataset,
+    *,
+    dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
+    kind: str,
+    quantiles: np.ndarray,
+    sketch_error: float,
+    jitter_under_thresh_value: str | None = None,
+) -> xr.Dataset:
+    """
+    EQM: Train step with approximate quantiles, chunk by chunk along the main dimension.
+
+    Same as :py:func:`eqm_train_grouped`, but the quantiles are estimated from the mergeable sketches of
+    :py:func:`xsdba.nbutils.grouped_sketch`. The inputs can be chunked along the main dimension.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data
+    dim : sequence of str
+        The dimensions along which to compute the quantiles, the main one first.
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        The grouper object.
+    kind : str
+        The kind of correction to compute. See :py:func:`xsdba.utils.get_correction`.
+    quantiles : array-like
+        The quantiles to compute.
+    sketch_error : float
+        The rank error bound of the estimated quantiles. See :py:func:`xsdba.nbutils.grouped_sketch`.
+    jitter_under_thresh_value : str, optional
+        Threshold under which to add uniform random noise to values, a quantity with units.
+        Default is None, meaning that jitter under thresh is not performed.
+
+    Returns
+    -------
+    xr.Dataset
+        The dataset containing the adjustment factors and the quantiles over the training data.
+    """
+    hist = (
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
+        if jitter_under_thresh_value
+        else ds.hist
+    )
+    ref_q = nbu.sketch_quantile(
+        nbu.grouped_sketch(ds.ref, indexes, dim, sketch_error), quantiles
+    )
+    hist_q = nbu.sketch_quantile(
+        nbu.grouped_sketch(hist, indexes, dim, sketch_error), quantiles
+    )
+
+    af = u.get_correction(hist_q, ref_q, kind)
+
+    return xr.Dataset(data_vars={"af": af, "hist_q": hist_q})
+
+
+def _sketch_normalized_quantile(sketch, quantiles, norm, kind):
+    """Compute the quantiles of the data summarized by `sketch`, normalized group-wise by `norm`."""
+    q = nbu.sketch_quantile(sketch, quantiles)
+    if kind == u.MULTIPLICATIVE:
+        # A negative scale reverses the order of the values.
+        qr = nbu.sketch_quantile(sketch, 1 - quantiles).assign_coords(
+            quantiles=quantiles
+        )
+        q = q.where(norm >= 0, qr)
+    return u.apply_correction(q, norm, kind)
+
+
+def dqm_train_sketch(
+    ds: xr.Dataset,
+    *,
+    dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
+    kind: str,
+    quantiles: np.ndarray,
+    sketch_error: float,
+    jitter_under_thresh_value: str | None = None,
+) -> xr.Dataset:
+    """
+    DQM: Train step with approximate quantiles, chunk by chunk along the main dimension.
+
+    Same as :py:func:`dqm_train_grouped`, but the means and quantiles are obtained from the mergeable sketches of
+    :py:func:`xsdba.nbutils.grouped_sketch`. The means are exact, the quantiles of the normalized data are
+    derived from the ones of the data. The inputs can be chunked along the main dimension.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data
+    dim : sequence of str
+        The dimensions along which to compute the quantiles, the main one first.
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        The grouper object.
+    kind : str
+        The kind of correction to compute. See :py:func:`xsdba.utils.get_correction`.
+    quantiles : array-like
+        The quantiles to compute.
+    sketch_error : float
+        The rank error bound of the estimated quantiles. See :py:func:`xsdba.nbutils.grouped_sketch`.
+    jitter_under_thresh_value : str, optional
+        Threshold under which to add uniform random noise to values, a quantity with units.
+        Default is None, meaning that jitter under thresh is not performed.
+
+    Returns
+    -------
+    xr.Dataset
+        The dataset containing the adjustment factors, the quantiles over the training data, and the scaling factor.
+    """
+    hist = (
+        jitter_under_thresh(ds.hist, jitter_under_thresh_value, key="hist")
+        if jitter_under_thresh_value
+        else ds.hist
+    )
+    ref_sk = nbu.grouped_sketch(ds.ref, indexes, dim, sketch_error)
+    hist_sk = nbu.grouped_sketch(hist, indexes, dim, sketch_error)
+
+    mu_ref = nbu.sketch_mean(ref_sk)
+    mu_hist = nbu.sketch_mean(hist_sk)
+
+    ref_q = _sketch_normalized_quantile(ref_sk, quantiles, u.invert(mu_ref, kind), kind)
+    hist_q = _sketch_normalized_quantile(
+        hist_sk, quantiles, u.invert(mu_hist, kind), kind
+    )
+
+    af = u.get_correction(hist_q, ref_q, kind)
+    scaling = u.get_correction(mu_hist, mu_ref, kind=kind)
+
+    return xr.Dataset(data_vars={"af": af, "hist_q": hist_q, "scaling": scaling})
+
+
+def _time_block_indexes(gw_idxs: xr.DataArray) -> np.ndarray:
+    """
+    Time indexes of the windowed time blocks as a padded integer array.
+
+    The indexes of each block are kept in their order and moved to the start of the row,
+    the padding (-1) is moved to the end. The array is trimmed to the length of the largest block.
+    """
+    gr_dim = gw_idxs.attrs["group_dim"]
+    idxs = gw_idxs.transpose(gr_dim, ...).fillna(-1).astype(int).values
+    idxs = np.take_along_axis(idxs, np.argsort(idxs < 0, axis=1, kind="stable"), axis=1)
+    return idxs[:, : (idxs >= 0).sum(axis=1).max()]
+
+
+def _gather_time_blocks(arr: np.ndarray, indexes: np.ndarray) -> np.ndarray:
+    """Gather the time blocks of `arr` along its last axis, padded with NaNs: (..., time) -> (..., block, block_time)."""
+    return np.where(indexes >= 0, arr[..., indexes], np.nan)
+
+
+def _time_blocks(da: xr.DataArray, indexes: np.ndarray, gr_dim: str) -> xr.DataArray:
+    """
+    Gather the time blocks of a DataArray along new dimensions `gr_dim` and "time".
+
+    The new "time" dimension has the length of the largest block. Its coordinate is a placeholder:
+    the first times of `da`.
+    """
+    out = xr.apply_ufunc(
+        _gather_time_blocks,
+        da,
+        input_core_dims=[["time"]],
+        output_core_dims=[[gr_dim, "time"]],
+        exclude_dims={"time"},
+        dask="parallelized",
+        output_dtypes=[da.dtype],
+        dask_gufunc_kwargs={
+            "output_sizes": {gr_dim: indexes.shape[0], "time": indexes.shape[1]}
+        },
+        kwargs={"indexes": indexes},
+        keep_attrs=True,
+    )
+    return out.assign_coords(time=da.time[: indexes.shape[1]].values)
+
+
+def _npdft_train(
+    ref, hist, rots, quantiles, method, extrap, n_escore, standardize, indexes=None
+):
     r"""
     Npdf transform to correct a source `hist` into target `ref`.
 
@@ -163,11 +548,23 @@ def _npdft_train(ref, hist, rots, quantiles, method, extrap, n_escore, standardi
 
     Notes
     -----
-    This function expects numpy inputs. The input arrays `ref,hist` are expected to be 2-dimensional arrays with shape:
-    `(len(nfeature), len(time))`, where `nfeature` is the dimension which is mixed by the multivariate bias adjustment
-    (e.g. a `multivar` dimension), i.e. `pts_dims[0]` in :py:func:`mbcn_train`. `rots` are rotation matrices with shape
-    `(len(iterations), len(nfeature), len(nfeature))`.
+    This function expects numpy inputs. The input arrays `ref,hist` are expected to be arrays with shape:
+    `(..., len(nfeature), len(time))`, where `nfeature` is the dimension which is mixed by the multivariate bias
+    adjustment (e.g. a `multivar` dimension), i.e. `pts_dims[0]` in :py:func:`mbcn_train`. `rots` are rotation matrices
+    with shape `(len(iterations), len(nfeature), len(nfeature))`. If `indexes`, the padded time indexes of each time block
+    (see :py:func:`_time_block_indexes`), are given, each block is trained separately and a block axis is added before
+    the iterations axis of the outputs. The leading dimensions and the blocks are processed in a single call of the
+    compiled :py:func:`xsdba.nbutils._npdft_train_block`.
     """
+    if indexes is not None:
+        # (..., nfeature, time) -> (..., block, nfeature, block_time)
+        ref, hist = (
+            np.moveaxis(_gather_time_blocks(arr, indexes), -3, -2)
+            for arr in [ref, hist]
+        )
+        ntimes = (indexes >= 0).sum(axis=1)
+    else:
+        ntimes = np.array(max(ref.shape[-1], hist.shape[-1]))
     if standardize:
         ref = (ref - np.nanmean(ref, axis=-1, keepdims=True)) / (
             np.nanstd(ref, axis=-1, keepdims=True)
@@ -175,33 +572,29 @@ def _npdft_train(ref, hist, rots, quantiles, method, extrap, n_escore, standardi
         hist = (hist - np.nanmean(hist, axis=-1, keepdims=True)) / (
             np.nanstd(hist, axis=-1, keepdims=True)
         )
-    af_q = np.zeros((len(rots), ref.shape[0], len(quantiles)))
-    escores = np.zeros(len(rots)) * np.nan
-    if n_escore > 0:
-        ref_step, hist_step = (
-            int(np.ceil(arr.shape[1] / n_escore)) for arr in [ref, hist]
-        )
-    for ii, _rot in enumerate(rots):
-        rot = _rot if ii == 0 else _rot @ rots[ii - 1].T
-        ref, hist = rot @ ref, rot @ hist
-        # loop over variables
-        for iv in range(ref.shape[0]):
-            ref_q, hist_q = nbu._quantile(ref[iv], quantiles), nbu._quantile(
-                hist[iv], quantiles
-            )
-            af_q[ii, iv] = ref_q - hist_q
-            af = u._interp_on_quantiles_1D(
-                u._rank_bn(hist[iv]),
-                quantiles,
-                af_q[ii, iv],
-                method=method,
-                extrap=extrap,
-            )
-            hist[iv] = hist[iv] + af
-        if n_escore > 0:
-            escores[ii] = nbu._escore(ref[:, ::ref_step], hist[:, ::hist_step])
-    hist = rots[-1].T @ hist
-    return af_q, escores
+    # The rotations and quantiles are shared by all points
+    rots = rots.reshape(rots.shape[-3:])
+    quantiles = np.ravel(quantiles)
+    # Each rotation undoes the previous one
+    rots = np.stack(
+        [rots[0]] + [rots[ii] @ rots[ii - 1].T for ii in range(1, len(rots))]
+    ).astype(float)
+    lead = ref.shape[:-2]
+    nv = ref.shape[-2]
+    af_q, escores = nbu._npdft_train_block(
+        np.ascontiguousarray(ref, dtype=float).reshape(-1, nv, ref.shape[-1]),
+        np.ascontiguousarray(hist, dtype=float).reshape(-1, nv, hist.shape[-1]),
+        np.broadcast_to(ntimes, lead).ravel(),
+        rots,
+        quantiles.astype(float),
+        nbu.INTERP_METHODS[method],
+        nbu.EXTRAP_METHODS[extrap],
+        n_escore,
+    )
+    return (
+        af_q.reshape(lead + af_q.shape[1:]),
+        escores.reshape(lead + escores.shape[1:]),
+    )
 
 
 def mbcn_train(
@@ -252,94 +645,93 @@ def mbcn_train(
     ref = ds.ref
     hist = ds.hist
     gr_dim = gw_idxs.attrs["group_dim"]
+    indexes = _time_block_indexes(gw_idxs)
 
-    # npdf training core
-    af_q_l = []
-    escores_l = []
-
-    # loop over time blocks
-    for ib in range(gw_idxs[gr_dim].size):
-        # indices in a given time block
-        indices = gw_idxs[{gr_dim: ib}].fillna(-1).astype(int).values
-        ind = indices[indices >= 0]
-
-        # npdft training : multiple rotations on standardized datasets
-        # keep track of adjustment factors in each rotation for later use
-        af_q, escores = xr.apply_ufunc(
-            _npdft_train,
-            ref[{"time": ind}],
-            hist[{"time": ind}],
-            rot_matrices,
-            quantiles,
-            input_core_dims=[
-                [pts_dims[0], "time"],
-                [pts_dims[0], "time"],
-                ["iterations", pts_dims[1], pts_dims[0]],
-                ["quantiles"],
-            ],
-            output_core_dims=[
-                ["iterations", pts_dims[1], "quantiles"],
-                ["iterations"],
-            ],
-            dask="parallelized",
-            output_dtypes=[hist.dtype, hist.dtype],
-            kwargs={
-                "method": interp,
-                "extrap": extrapolation,
-                "n_escore": n_escore,
-                "standardize": True,
-            },
-            vectorize=True,
-        )
-        af_q_l.append(af_q.expand_dims({gr_dim: [ib]}))
-        escores_l.append(escores.expand_dims({gr_dim: [ib]}))
-    af_q = xr.concat(af_q_l, dim=gr_dim)
-    escores = xr.concat(escores_l, dim=gr_dim)
+    # npdft training : multiple rotations on standardized datasets
+    # keep track of adjustment factors in each rotation for later use
+    # all time blocks are trained at once
+    af_q, escores = xr.apply_ufunc(
+        _npdft_train,
+        ref,
+        hist,
+        rot_matrices,
+        quantiles,
+        input_core_dims=[
+            [pts_dims[0], "time"],
+            [pts_dims[0], "time"],
+            ["iterations", pts_dims[1], pts_dims[0]],
+            ["quantiles"],
+        ],
+        output_core_dims=[
+            [gr_dim, "iterations", pts_dims[1], "quantiles"],
+            [gr_dim, "iterations"],
+        ],
+        dask="parallelized",
+        output_dtypes=[hist.dtype, hist.dtype],
+        dask_gufunc_kwargs={"output_sizes": {gr_dim: indexes.shape[0]}},
+        kwargs={
+            "method": interp,
+            "extrap": extrapolation,
+            "n_escore": n_escore,
+            "standardize": True,
+            "indexes": indexes,
+        },
+    )
     out = xr.Dataset({"af_q": af_q, "escores": escores}).assign_coords(
         {"quantiles": quantiles, gr_dim: gw_idxs[gr_dim].values}
     )
     return out
 
 
-def _npdft_adjust(sim, af_q, rots, quantiles, method, extrap):
+def _npdft_adjust(sim, scen, af_q, rots, quantiles, indexes, central, method, extrap):
     """
-    Npdf transform adjusting.
+    Npdf transform adjusting and reordering of all time blocks.
 
     Adjusting factors `af_q` obtained in the training step are applied on the simulated data `sim` at each iterated
-    rotation, see :py:func:`_npdft_train`.
-
-    This function expects numpy inputs. `sim` can be a 2-d array with shape: `(len(nfeature), len(time))`, or
-    a 3-d array with shape: `(len(period), len(nfeature), len(time))`, allowing to adjust multiple climatological periods
-    all at once. `nfeature` is the dimension which is mixed by the multivariate bias adjustment
-    (e.g. a `multivar` dimension), i.e. `pts_dims[0]` in :py:func:`mbcn_train`. `rots` are rotation matrices with shape
-    `(len(iterations), len(nfeature), len(nfeature))`.
+    rotation, see :py:func:`_npdft_train`. The univariate adjustment `scen` is then reordered following the ranks
+    of the result.
+
+    This function expects numpy inputs. `sim` has shape `(..., len(nfeature), len(time))` and the univariate adjustment
+    of its time blocks `scen` has shape `(..., len(nfeature), len(block), len(block_time))`. `nfeature` is the dimension
+    which is mixed by the multivariate bias adjustment (e.g. a `multivar` dimension), i.e. `pts_dims[0]` in
+    :py:func:`mbcn_train`. `af_q` has shape `(..., len(block), len(iterations), len(nfeature), len(quantiles))` and
+    `rots` are rotation matrices with shape `(len(iterations), len(nfeature), len(nfeature))`. `indexes` are the padded time
+    indexes of each block and `central` marks the elements of each block which are written in the output.
     """
-    # add dummy dim  if period_dim absent to uniformize the function below
-    # This could be done at higher level, not sure where is best
-    if dummy_dim_added := (len(sim.shape) == 2):
-        sim = sim[:, np.newaxis, :]
+    rots = rots.reshape(rots.shape[-3:])
+    quantiles = np.ravel(quantiles)
+    ntime = sim.shape[-1]
+    # (..., nfeature, time) -> (..., nfeature, block, block_time)
+    sim = _gather_time_blocks(sim, indexes)
+    sim = (sim - np.nanmean(sim, axis=-1, keepdims=True)) / np.nanstd(
+        sim, axis=-1, keepdims=True
+    )
+    # (..., block, iterations, nfeature, quantiles) -> (iterations, ..., nfeature, block, quantiles)
+    af_q = np.moveaxis(np.moveaxis(af_q, -4, -2), -4, 0)
 
-    # adjust npdft
+    # adjust npdft, all blocks at once
     for ii, _rot in enumerate(rots):
         rot = _rot if ii == 0 else _rot @ rots[ii - 1].T
-        sim = np.einsum("ij,j...->i...", rot, sim)
-        # loop over variables
-        for iv in range(sim.shape[0]):
-            af = u._interp_on_quantiles_1D_multi(
-                u._rank_bn(sim[iv], axis=-1),
-                quantiles,
-                af_q[ii, iv],
-                method=method,
-                extrap=extrap,
-            )
-            sim[iv] = sim[iv] + af
-
-    rot = rots[-1].T
-    sim = np.einsum("ij,j...->i...", rot, sim)
-    if dummy_dim_added:
-        sim = sim[:, 0, :]
+        sim = np.einsum("ij,...jkl->...ikl", rot, sim)
+        af = u._interp_on_quantiles_1D(
+            u._rank_bn(sim, axis=-1),
+            quantiles,
+            af_q[ii],
+            method=method,
+            extrap=extrap,
+        )
+        sim = sim + af
+    sim = np.einsum("ij,...jkl->...ikl", rots[-1].T, sim)
 
-    return sim
+    # reorder scen according to npdft results, the padding stays at the end
+    reordered = np.take_along_axis(
+        np.sort(scen, axis=-1), np.argsort(np.argsort(sim, axis=-1), axis=-1), axis=-1
+    )
+    # keep central values of the windows (intersecting indices in gw_idxs and g_idxs)
+    out = np.zeros(reordered.shape[:-2] + (ntime,), dtype=reordered.dtype)
+    iblock, itime = np.nonzero(central)
+    out[..., indexes[iblock, itime]] = reordered[..., iblock, itime]
+    return out
 
 
 def mbcn_adjust(
@@ -355,7 +747,6 @@ def mbcn_adjust(
     base: Callable,
     base_kws_vars: dict,
     adj_kws: dict,
-    period_dim: str | None,
 ) -> xr.DataArray:
     """
     Perform the adjustment portion MBCn multivariate bias correction technique.
@@ -395,10 +786,6 @@ def mbcn_adjust(
         - kinds : Dict of correction kinds for each variable (e.g. {"pr":"*", "tasmax":"+"}).
     adj_kws : Dict
         Options for univariate adjust for the scenario that is reordered with the output of npdf transform.
-    period_dim : str, optional
-        Name of the period dimension used when stacking time periods of `sim`  using :py:func:`xsdba.stack_periods`.
-        If specified, the interpolation of the npdf transform is performed only once and applied on all periods simultaneously.
-        This should be more performant, but also more memory intensive. Defaults to `None`: No optimization will be attempted.
 
     Returns
     -------
@@ -410,66 +797,67 @@ def mbcn_adjust(
     af_q = ds.af_q
     quantiles = af_q.quantiles
     gr_dim = gw_idxs.attrs["group_dim"]
-    win = gw_idxs.attrs["group"][1]
-
-    # this way of handling was letting open the possibility to perform
-    # interpolation for multiple periods in the simulation all at once
-    # in principle, avoiding redundancy. Need to test this on small data
-    # to confirm it works,  and on big data to check performance.
-    dims = ["time"] if period_dim is None else [period_dim, "time"]
-
-    # mbcn core
-    scen_mbcn = xr.zeros_like(sim)
-    for ib in range(gw_idxs[gr_dim].size):
-        # indices in a given time block (with and without the window)
-        indices_gw = gw_idxs[{gr_dim: ib}].fillna(-1).astype(int).values
-        ind_gw = indices_gw[indices_gw >= 0]
-        indices_g = g_idxs[{gr_dim: ib}].fillna(-1).astype(int).values
-        ind_g = indices_g[indices_g >= 0]
-
-        # 1. univariate adjustment of sim -> scen
-        # the kind may differ depending on the variables
-        scen_block = xr.zeros_like(sim[{"time": ind_gw}])
-        for iv, v in enumerate(sim[pts_dims[0]].values):
-            sl = {"time": ind_gw, pts_dims[0]: iv}
-            with set_options(extra_output=False):
-                ADJ = base.train(
-                    ref[sl], hist[sl], **base_kws_vars[v], skip_input_checks=True
-                )
-                scen_block[{pts_dims[0]: iv}] = ADJ.adjust(
-                    sim[sl], **adj_kws, skip_input_checks=True
-                )
-
-        # 2. npdft adjustment of sim
-        npdft_block = xr.apply_ufunc(
-            _npdft_adjust,
-            standardize(sim[{"time": ind_gw}].copy(), dim="time")[0],
-            af_q[{gr_dim: ib}],
-            rot_matrices,
-            quantiles,
-            input_core_dims=[
-                [pts_dims[0]] + dims,
-                ["iterations", pts_dims[1], "quantiles"],
-                ["iterations", pts_dims[1], pts_dims[0]],
-                ["quantiles"],
-            ],
-            output_core_dims=[
-                [pts_dims[0]] + dims,
-            ],
-            dask="parallelized",
-            output_dtypes=[sim.dtype],
-            kwargs={"method": interp, "extrap": extrapolation},
-            vectorize=True,
-        )
-
-        # 3. reorder scen according to npdft results
-        reordered = reordering(ref=npdft_block, sim=scen_block)
-        if win > 1:
-            # keep  central value of window (intersecting indices in gw_idxs and g_idxs)
-            scen_mbcn[{"time": ind_g}] = reordered[{"time": np.in1d(ind_gw, ind_g)}]
-        else:
-            scen_mbcn[{"time": ind_g}] = reordered
 
+    # time indexes of the windowed blocks and position of the times of each block without the window
+    indexes = _time_block_indexes(gw_idxs)
+    g_idxs = g_idxs.transpose(gr_dim, ...).fillna(-1).astype(int).values
+    central = np.stack(
+        [
+            np.isin(ind_gw, ind_g[ind_g >= 0])
+            for ind_gw, ind_g in zip(indexes, g_idxs, strict=True)
+        ]
+    ) & (indexes >= 0)
+
+    # 1. univariate adjustment of sim -> scen
+    # the time blocks are stacked along `gr_dim`, each block is trained and adjusted separately in a single call
+    # the kind may differ depending on the variables
+    ref_b, hist_b, sim_b = (
+        _time_blocks(da, indexes, gr_dim) for da in [ref, hist, sim]
+    )
+    scen_b = []
+    for iv, v in enumerate(sim[pts_dims[0]].values):
+        sl = {pts_dims[0]: iv}
+        with set_options(extra_output=False):
+            ADJ = base.train(
+                ref_b[sl], hist_b[sl], **base_kws_vars[v], skip_input_checks=True
+            )
+            scen_b.append(ADJ.adjust(sim_b[sl], **adj_kws, skip_input_checks=True))
+    scen_b = xr.concat(scen_b, dim=pts_dims[0])
+
+    # 2. npdft adjustment of sim
+    # 3. reorder scen according to npdft results
+    scen_mbcn = xr.apply_ufunc(
+        _npdft_adjust,
+        # shallow copy: merging the coordinates would otherwise erase the attributes of those of `sim`
+        sim.copy(deep=False),
+        scen_b,
+        af_q,
+        rot_matrices,
+        quantiles,
+        input_core_dims=[
+            [pts_dims[0], "time"],
+            [pts_dims[0], gr_dim, "time"],
+            [gr_dim, "iterations", pts_dims[1], "quantiles"],
+            ["iterations", pts_dims[1], pts_dims[0]],
+            ["quantiles"],
+        ],
+        output_core_dims=[[pts_dims[0], "time"]],
+        exclude_dims={"time"},
+        dask="parallelized",
+        output_dtypes=[sim.dtype],
+        # the univariate adjustments of the variables are concatenated in separate chunks
+        dask_gufunc_kwargs={
+            "allow_rechunk": True,
+            "output_sizes": {"time": sim.time.size},
+        },
+        kwargs={
+            "indexes": indexes,
+            "central": central,
+            "method": interp,
+            "extrap": extrapolation,
+        },
+    )
+    scen_mbcn = scen_mbcn.assign_coords(time=sim.time).transpose(*sim.dims)
     return scen_mbcn.to_dataset(name="scen")
 
 
@@ -972,14 +1360,68 @@ def extremes_adjust(
     return out
 
 
-def _otc_adjust(
+def _sample_plan(plan, rows: np.ndarray, random: np.ndarray) -> np.ndarray:
+    """
+    Pick a column of a transport plan for each given row, following the probabilities of the row.
+
+    The columns are drawn by inverting the cumulative distribution of the non-zero elements of each row, all at once.
+
+    Parameters
+    ----------
+    plan : scipy.sparse.csr_array or np.ndarray
+        Plan whose rows sum to 1, as returned by :py:func:`xsdba.utils.optimal_transport`.
+    rows : np.ndarray
+        Row index of every sample.
+    random : np.ndarray
+        Uniform random numbers in [0, 1), one for each sample.
+
+    Returns
+    -------
+    np.ndarray
+        Column index of every sample.
+    """
+    if isinstance(plan, np.ndarray):
+        # A dense plan is a sparse one whose rows have an element in every column
+        data = plan.ravel()
+        indptr = np.arange(plan.shape[0] + 1) * plan.shape[1]
+    else:
+        data, indptr = plan.data, plan.indptr
+    cdf = np.cumsum(data)
+    start = indptr[rows]
+    stop = indptr[rows + 1]
+    # The cumulative probability before and at the end of each row
+    low = np.where(start > 0, cdf[start - 1], 0)
+    high = cdf[stop - 1]
+    idx = np.clip(
+        np.searchsorted(cdf, low + random * (high - low), side="right"), start, stop - 1
+    )
+    if isinstance(plan, np.ndarray):
+        return idx - start
+    return plan.indices[idx]
+
+
+def _stacked_counter(da: xr.DataArray, pts_dim: str, stacked_dim: str) -> xr.DataArray:
+    """
+    Counter of the random numbers drawn for each point of a stacked array, see :py:func:`xsdba.utils.random_counter`.
+
+    Points are identified by their position along `stacked_dim` and their coordinates along the other dimensions.
+    """
+    da = da.isel({pts_dim: 0}, drop=True).reset_index(stacked_dim, drop=True)
+    return u.random_counter(da)
+
+
+def _otc_adjust(
     X: np.ndarray,
     Y: np.ndarray,
+    counter: np.ndarray | None = None,
     bin_width: dict | float | np.ndarray | None = None,
     bin_origin: dict | float | np.ndarray | None = None,
     num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
     jitter_inside_bins: bool = True,
     normalization: str | None = "max_distance",
+    stream: str = "otc",
 ):
     """
     Optimal Transport Correction of the bias of X with respect to Y.
@@ -990,18 +1432,27 @@ def _otc_adjust(
         Historical data to be corrected.
     Y : np.ndarray
         Bias correction reference, target of optimal transport.
+    counter : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `X`, see :py:func:`xsdba.utils.counter_uniform`.
+        Defaults to the positions of the points.
     bin_width : dict or float or np.ndarray, optional
         Bin widths for specified dimensions.
     bin_origin : dict or float or np.ndarray, optional
         Bin origins for specified dimensions.
     num_iter_max : int, optional
         Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
     jitter_inside_bins : bool
         If `False`, output points are located at the center of their bin.
         If `True`, a random location is picked uniformly inside their bin. Default is `True`.
     normalization : {None, 'standardize', 'max_distance', 'max_value'}
         Per-variable transformation applied before the distances are calculated
         in the optimal transport.
+    stream : str
+        Name of the stream of the random numbers.
 
     Returns
     -------
@@ -1016,6 +1467,8 @@ def _otc_adjust(
     X_og = X.copy()
     mask = (~np.isnan(X)).all(axis=1)
     X = X[mask]
+    counter = np.arange(X_og.shape[0]) if counter is None else counter
+    counter = counter[mask]
     Y = Y[(~np.isnan(Y)).all(axis=1)]
 
     # Initialize parameters
@@ -1047,30 +1500,26 @@ def _otc_adjust(
     gridY, muY, _ = u.histogram(Y, bin_width, bin_origin)
 
     # Compute the optimal transportation plan
-    plan = u.optimal_transport(gridX, gridY, muX, muY, num_iter_max, normalization)
+    plan = u.optimal_transport(
+        gridX, gridY, muX, muY, num_iter_max, normalization, solver, solver_kws
+    )
 
-    gridX = np.floor((gridX - bin_origin) / bin_width)
     gridY = np.floor((gridY - bin_origin) / bin_width)
 
-    # regroup the indices of all the points belonging to a same bin
-    binX_sort = np.lexsort(binX[:, ::-1].T)
-    sorted_bins = binX[binX_sort]
-    _, binX_start, binX_count = np.unique(
-        sorted_bins, return_index=True, return_counts=True, axis=0
-    )
-    binX_start_sort = np.sort(binX_start)
-    binX_groups = np.split(binX_sort, binX_start_sort[1:])
+    # The source bin of every point, bins are sorted as the rows of the plan
+    _, srcX = np.unique(binX, return_inverse=True, axis=0)
 
-    out = np.empty(X.shape)
-    rng = np.random.default_rng()
-    # The plan row corresponding to a source bin indicates its probabilities to be transported to every target bin
-    for i, binX_group in enumerate(binX_groups):
-        # Pick as much target bins for this source bin as there are points in the source bin
-        choice = rng.choice(range(muY.size), p=plan[i, :], size=binX_count[i])
-        out[binX_group] = (gridY[choice] + 1 / 2) * bin_width + bin_origin
+    # Each point is transported to a target bin picked with the probabilities of the plan row of its source bin
+    seed = get_seed()
+    choice = _sample_plan(
+        plan, srcX.ravel(), u.counter_uniform(counter, stream, seed=seed)
+    )
+    out = (gridY[choice] + 1 / 2) * bin_width + bin_origin
 
     if jitter_inside_bins:
-        out += np.random.uniform(low=-bin_width / 2, high=bin_width / 2, size=out.shape)
+        for j in range(out.shape[1]):
+            jitter = u.counter_uniform(counter, f"{stream}_jitter_{j}", seed=seed)
+            out[:, j] += (jitter - 1 / 2) * bin_width[j]
 
     # reintroduce nans
     Z = X_og
@@ -1087,6 +1536,8 @@ def otc_adjust(
     bin_width: dict | float | None = None,
     bin_origin: dict | float | None = None,
     num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
     jitter_inside_bins: bool = True,
     adapt_freq_thresh: dict | None = None,
     normalization: str | None = "max_distance",
@@ -1110,6 +1561,10 @@ def otc_adjust(
         Bin origins for specified dimensions.
     num_iter_max : int, optional
         Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
     jitter_inside_bins : bool
         If `False`, output points are located at the center of their bin.
         If `True`, a random location is picked uniformly inside their bin. Default is `True`.
@@ -1139,7 +1594,12 @@ def otc_adjust(
     ref_map = {d: f"ref_{d}" for d in dim}
     ref = ref.rename(ref_map).stack(dim_ref=ref_map.values()).dropna(dim="dim_ref")
 
-    hist = hist.stack(dim_hist=dim).dropna(dim="dim_hist")
+    hist = hist.stack(dim_hist=dim)
+    # The counters are computed before dropping the missing points, they identify the points of the group
+    counter = _stacked_counter(hist, pts_dim, "dim_hist")
+    valid = hist.notnull().all([d for d in hist.dims if d != "dim_hist"]).values
+    hist = hist.isel(dim_hist=valid)
+    counter = counter.isel(dim_hist=valid)
 
     if isinstance(bin_width, dict):
         bin_width = {
@@ -1156,14 +1616,17 @@ def otc_adjust(
         _otc_adjust,
         hist,
         ref,
+        counter,
         kwargs={
             "bin_width": bin_width,
             "bin_origin": bin_origin,
             "num_iter_max": num_iter_max,
+            "solver": solver,
+            "solver_kws": solver_kws,
             "jitter_inside_bins": jitter_inside_bins,
             "normalization": normalization,
         },
-        input_core_dims=[["dim_hist", pts_dim], ["dim_ref", pts_dim]],
+        input_core_dims=[["dim_hist", pts_dim], ["dim_ref", pts_dim], ["dim_hist"]],
         output_core_dims=[["dim_hist", pts_dim]],
         keep_attrs=True,
         vectorize=True,
@@ -1174,13 +1637,115 @@ def otc_adjust(
     return scen.to_dataset()
 
 
+def _dotc_evolution(
+    X1: np.ndarray,
+    Y0: np.ndarray,
+    X0: np.ndarray,
+    yX0: np.ndarray,
+    bin_width: np.ndarray | list | None = None,
+    bin_origin: np.ndarray | list | None = None,
+    num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
+    cov_factor: str | None = "std",
+    kind: dict | None = None,
+    normalization: str | None = "max_distance",
+    counter: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Evolution of the reference following the evolution of the model from `X0` to `X1`.
+
+    Parameters
+    ----------
+    X1 : np.ndarray
+        Simulation data to adjust, without missing values.
+    Y0 : np.ndarray
+        Bias correction reference, without missing values.
+    X0 : np.ndarray
+        Historical simulation data, without missing values.
+    yX0 : np.ndarray
+        The points of `Y0` mapped to `X0` by optimal transport.
+    bin_width : array-like, optional
+        Bin widths of all dimensions.
+    bin_origin : array-like, optional
+        Bin origins of all dimensions.
+    num_iter_max : int, optional
+        Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
+    cov_factor : str, optional
+        Rescaling factor.
+    kind : dict, optional
+        Keys are variable indexes and values are adjustment kinds, either additive or multiplicative.
+        Unspecified dimensions are treated as "+".
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated
+        in the optimal transport.
+    counter : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `Y0`, see :py:func:`xsdba.utils.counter_uniform`.
+
+    Returns
+    -------
+    np.ndarray
+        The evolution of `Y0`, the target of the transport of `X1`.
+    """
+    # Map hist to sim
+    yX1 = _otc_adjust(
+        yX0,
+        X1,
+        counter,
+        bin_width=bin_width,
+        bin_origin=bin_origin,
+        num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
+        jitter_inside_bins=False,
+        normalization=normalization,
+        stream="dotc_evolution",
+    )
+
+    # Temporal evolution
+    motion = np.empty(yX0.shape)
+    for j in range(yX0.shape[1]):
+        if kind is not None and j in kind.keys() and kind[j] == "*":
+            motion[:, j] = yX1[:, j] / yX0[:, j]
+        else:
+            motion[:, j] = yX1[:, j] - yX0[:, j]
+
+    # Apply a variance dependent rescaling factor
+    if cov_factor == "cholesky":
+        fact0 = u.eps_cholesky(np.cov(Y0, rowvar=False))
+        fact1 = u.eps_cholesky(np.cov(X0, rowvar=False))
+        motion = (fact0 @ np.linalg.inv(fact1) @ motion.T).T
+    elif cov_factor == "std":
+        fact0 = np.std(Y0, axis=0)
+        fact1 = np.std(X0, axis=0)
+        motion = motion @ np.diag(fact0 / fact1)
+
+    # Apply the evolution to ref
+    Y1 = np.empty(yX0.shape)
+    for j in range(yX0.shape[1]):
+        if kind is not None and j in kind.keys() and kind[j] == "*":
+            Y1[:, j] = Y0[:, j] * motion[:, j]
+        else:
+            Y1[:, j] = Y0[:, j] + motion[:, j]
+
+    return Y1
+
+
 def _dotc_adjust(
     X1: np.ndarray,
     Y0: np.ndarray,
     X0: np.ndarray,
+    counter_X1: np.ndarray | None = None,
+    counter_Y0: np.ndarray | None = None,
     bin_width: dict | float | None = None,
     bin_origin: dict | float | None = None,
     num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
     cov_factor: str | None = "std",
     jitter_inside_bins: bool = True,
     kind: dict | None = None,
@@ -1197,12 +1762,21 @@ def _dotc_adjust(
         Bias correction reference.
     X0 : np.ndarray
         Historical simulation data.
+    counter_X1 : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `X1`, see :py:func:`xsdba.utils.counter_uniform`.
+        Defaults to the positions of the points.
+    counter_Y0 : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `Y0`. Defaults to the positions of the points.
     bin_width : dict or float, optional
         Bin widths for specified dimensions.
     bin_origin : dict or float, optional
         Bin origins for specified dimensions.
     num_iter_max : int, optional
         Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
     cov_factor : str, optional
         Rescaling factor.
     jitter_inside_bins : bool
@@ -1224,12 +1798,20 @@ def _dotc_adjust(
     ----------
     :cite:cts:`robin_2021`
     """
+    if counter_X1 is None:
+        counter_X1 = np.arange(X1.shape[0])
+    if counter_Y0 is None:
+        counter_Y0 = np.arange(Y0.shape[0])
+
     # nans are removed and put back in place at the end
     X1_og = X1.copy()
     mask = ~np.isnan(X1).any(axis=1)
     X1 = X1[mask]
+    counter_X1 = counter_X1[mask]
     X0 = X0[~np.isnan(X0).any(axis=1)]
-    Y0 = Y0[~np.isnan(Y0).any(axis=1)]
+    valid = ~np.isnan(Y0).any(axis=1)
+    Y0 = Y0[valid]
+    counter_Y0 = counter_Y0[valid]
     # Initialize parameters
     if isinstance(bin_width, dict):
         _bin_width = u.bin_width_estimator([Y0, X0, X1])
@@ -1251,59 +1833,251 @@ def _dotc_adjust(
     yX0 = _otc_adjust(
         Y0,
         X0,
+        counter_Y0,
         bin_width=bin_width,
         bin_origin=bin_origin,
         num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
         jitter_inside_bins=False,
         normalization=normalization,
+        stream="dotc_ref",
     )
 
-    # Map hist to sim
-    yX1 = _otc_adjust(
+    # Evolution of ref following the evolution of hist to sim
+    Y1 = _dotc_evolution(
+        X1,
+        Y0,
+        X0,
         yX0,
+        bin_width=bin_width,
+        bin_origin=bin_origin,
+        num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
+        cov_factor=cov_factor,
+        kind=kind,
+        normalization=normalization,
+        counter=counter_Y0,
+    )
+
+    # Map sim to the evolution of ref
+    out = _otc_adjust(
         X1,
+        Y1,
+        counter_X1,
         bin_width=bin_width,
         bin_origin=bin_origin,
         num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
+        jitter_inside_bins=jitter_inside_bins,
+        normalization=normalization,
+        stream="dotc",
+    )
+    # reintroduce nans
+    Z1 = X1_og
+    Z1[mask] = out
+    Z1[~mask] = np.nan
+
+    return Z1
+
+
+def _dotc_train(
+    Y0: np.ndarray,
+    X0: np.ndarray,
+    counter_Y0: np.ndarray | None = None,
+    bin_width: dict | float | None = None,
+    bin_origin: dict | float | None = None,
+    num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
+    normalization: str | None = "max_distance",
+):
+    """
+    Training step of the dynamical OTC : optimal transport of the reference to the historical simulation.
+
+    Parameters
+    ----------
+    Y0 : np.ndarray
+        Bias correction reference.
+    X0 : np.ndarray
+        Historical simulation data.
+    counter_Y0 : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `Y0`, see :py:func:`xsdba.utils.counter_uniform`.
+        Defaults to the positions of the points.
+    bin_width : dict or float, optional
+        Bin widths for specified dimensions.
+    bin_origin : dict or float, optional
+        Bin origins for specified dimensions.
+    num_iter_max : int, optional
+        Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated
+        in the optimal transport.
+
+    Returns
+    -------
+    yX0 : np.ndarray
+        The points of `Y0` mapped to the center of the bins of `X0`, NaN where `Y0` has missing values.
+    bin_width : np.ndarray
+        Bin widths of all dimensions, estimated from `Y0` and `X0` when unspecified.
+    bin_origin : np.ndarray
+        Bin origins of all dimensions.
+    """
+    mask = ~np.isnan(Y0).any(axis=1)
+    X0 = X0[~np.isnan(X0).any(axis=1)]
+
+    # Initialize parameters
+    if bin_width is None or isinstance(bin_width, dict):
+        _bin_width = u.bin_width_estimator([Y0[mask], X0])
+        for v, k in (bin_width or {}).items():
+            _bin_width[v] = k
+        bin_width = _bin_width
+    elif isinstance(bin_width, float | int):
+        bin_width = np.ones(X0.shape[1]) * bin_width
+
+    if bin_origin is None or isinstance(bin_origin, dict):
+        _bin_origin = np.zeros(X0.shape[1])
+        for v, k in (bin_origin or {}).items():
+            _bin_origin[v] = k
+        bin_origin = _bin_origin
+    elif isinstance(bin_origin, float | int):
+        bin_origin = np.ones(X0.shape[1]) * bin_origin
+
+    bin_width = np.asarray(bin_width, dtype=float)
+    bin_origin = np.asarray(bin_origin, dtype=float)
+
+    # Map ref to hist
+    yX0 = np.full(Y0.shape, np.nan)
+    yX0[mask] = _otc_adjust(
+        Y0[mask],
+        X0,
+        None if counter_Y0 is None else counter_Y0[mask],
+        bin_width=bin_width,
+        bin_origin=bin_origin,
+        num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
         jitter_inside_bins=False,
         normalization=normalization,
+        stream="dotc_ref",
     )
+    return yX0, bin_width, bin_origin
 
-    # Temporal evolution
-    motion = np.empty(yX0.shape)
-    for j in range(yX0.shape[1]):
-        if kind is not None and j in kind.keys() and kind[j] == "*":
-            motion[:, j] = yX1[:, j] / yX0[:, j]
-        else:
-            motion[:, j] = yX1[:, j] - yX0[:, j]
 
-    # Apply a variance dependent rescaling factor
-    if cov_factor == "cholesky":
-        fact0 = u.eps_cholesky(np.cov(Y0, rowvar=False))
-        fact1 = u.eps_cholesky(np.cov(X0, rowvar=False))
-        motion = (fact0 @ np.linalg.inv(fact1) @ motion.T).T
-    elif cov_factor == "std":
-        fact0 = np.std(Y0, axis=0)
-        fact1 = np.std(X0, axis=0)
-        motion = motion @ np.diag(fact0 / fact1)
+def _dotc_adjust_trained(
+    X1: np.ndarray,
+    Y0: np.ndarray,
+    X0: np.ndarray,
+    yX0: np.ndarray,
+    bin_width: np.ndarray,
+    bin_origin: np.ndarray,
+    counter_X1: np.ndarray | None = None,
+    counter_Y0: np.ndarray | None = None,
+    num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
+    cov_factor: str | None = "std",
+    jitter_inside_bins: bool = True,
+    kind: dict | None = None,
+    normalization: str | None = "max_distance",
+):
+    """
+    Adjustment step of the dynamical OTC, reusing the transport of the reference computed by :py:func:`_dotc_train`.
 
-    # Apply the evolution to ref
-    Y1 = np.empty(yX0.shape)
-    for j in range(yX0.shape[1]):
-        if kind is not None and j in kind.keys() and kind[j] == "*":
-            Y1[:, j] = Y0[:, j] * motion[:, j]
-        else:
-            Y1[:, j] = Y0[:, j] + motion[:, j]
+    Parameters
+    ----------
+    X1 : np.ndarray
+        Simulation data to adjust.
+    Y0 : np.ndarray
+        Bias correction reference.
+    X0 : np.ndarray
+        Historical simulation data.
+    yX0 : np.ndarray
+        The points of `Y0` mapped to `X0`, as returned by :py:func:`_dotc_train`.
+    bin_width : np.ndarray
+        Bin widths of all dimensions.
+    bin_origin : np.ndarray
+        Bin origins of all dimensions.
+    counter_X1 : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `X1`, see :py:func:`xsdba.utils.counter_uniform`.
+        Defaults to the positions of the points.
+    counter_Y0 : np.ndarray, optional
+        Counter of the random numbers drawn for each point of `Y0`. Defaults to the positions of the points.
+    num_iter_max : int, optional
+        Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
+    cov_factor : str, optional
+        Rescaling factor.
+    jitter_inside_bins : bool
+        If `False`, output points are located at the center of their bin.
+        If `True`, a random location is picked uniformly inside their bin. Default is `True`.
+    kind : dict, optional
+        Keys are variable indexes and values are adjustment kinds, either additive or multiplicative.
+        Unspecified dimensions are treated as "+".
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated
+        in the optimal transport.
+
+    Returns
+    -------
+    np.ndarray
+        Adjusted data.
+    """
+    if counter_X1 is None:
+        counter_X1 = np.arange(X1.shape[0])
+    if counter_Y0 is None:
+        counter_Y0 = np.arange(Y0.shape[0])
+
+    # nans are removed and put back in place at the end
+    X1_og = X1.copy()
+    mask = ~np.isnan(X1).any(axis=1)
+    X1 = X1[mask]
+    counter_X1 = counter_X1[mask]
+    X0 = X0[~np.isnan(X0).any(axis=1)]
+    valid = ~np.isnan(Y0).any(axis=1)
+    Y0 = Y0[valid]
+    yX0 = yX0[valid]
+    counter_Y0 = counter_Y0[valid]
+
+    # Evolution of ref following the evolution of hist to sim
+    Y1 = _dotc_evolution(
+        X1,
+        Y0,
+        X0,
+        yX0,
+        bin_width=bin_width,
+        bin_origin=bin_origin,
+        num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
+        cov_factor=cov_factor,
+        kind=kind,
+        normalization=normalization,
+        counter=counter_Y0,
+    )
 
     # Map sim to the evolution of ref
     out = _otc_adjust(
         X1,
         Y1,
+        counter_X1,
         bin_width=bin_width,
         bin_origin=bin_origin,
         num_iter_max=num_iter_max,
+        solver=solver,
+        solver_kws=solver_kws,
         jitter_inside_bins=jitter_inside_bins,
         normalization=normalization,
+        stream="dotc",
     )
     # reintroduce nans
     Z1 = X1_og
@@ -1321,6 +2095,8 @@ def dotc_adjust(
     bin_width: dict | float | None = None,
     bin_origin: dict | float | None = None,
     num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
     cov_factor: str | None = "std",
     jitter_inside_bins: bool = True,
     kind: dict | None = None,
@@ -1347,6 +2123,10 @@ def dotc_adjust(
         Bin origins for specified dimensions.
     num_iter_max : int, optional
         Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
     cov_factor : str, optional
         Rescaling factor.
     jitter_inside_bins : bool
@@ -1408,10 +2188,243 @@ def dotc_adjust(
         sim,
         ref,
         hist,
+        _stacked_counter(sim, pts_dim, "dim_sim"),
+        _stacked_counter(ref, pts_dim, "dim_ref"),
+        kwargs={
+            "bin_width": bin_width,
+            "bin_origin": bin_origin,
+            "num_iter_max": num_iter_max,
+            "solver": solver,
+            "solver_kws": solver_kws,
+            "cov_factor": cov_factor,
+            "jitter_inside_bins": jitter_inside_bins,
+            "kind": kind,
+            "normalization": normalization,
+        },
+        input_core_dims=[
+            ["dim_sim", pts_dim],
+            ["dim_ref", pts_dim],
+            ["dim_hist", pts_dim],
+            ["dim_sim"],
+            ["dim_ref"],
+        ],
+        output_core_dims=[["dim_sim", pts_dim]],
+        keep_attrs=True,
+        vectorize=True,
+    )
+
+    scen = scen.unstack().rename("scen")
+
+    return scen.to_dataset()
+
+
+@map_groups(
+    hist=[Grouper.DIM, Grouper.ADD_DIMS],
+    ref_to_hist=[Grouper.DIM, Grouper.ADD_DIMS],
+    bin_width=[Grouper.PROP],
+    bin_origin=[Grouper.PROP],
+)
+def dotc_train(
+    ds: xr.Dataset,
+    dim: list,
+    pts_dim: str,
+    bin_width: dict | float | None = None,
+    bin_origin: dict | float | None = None,
+    num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
+    adapt_freq_thresh: dict | None = None,
+    normalization: str | None = "max_distance",
+):
+    """
+    Dynamical Optimal Transport Correction training step on one group.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data
+    dim : list
+        The dimensions defining the distribution on which optimal transport is performed.
+    pts_dim : str
+        The dimension defining the multivariate components of the distribution.
+    bin_width : dict or float, optional
+        Bin widths for specified dimensions.
+    bin_origin : dict or float, optional
+        Bin origins for specified dimensions.
+    num_iter_max : int, optional
+        Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
+    adapt_freq_thresh : dict, optional
+        Threshold for frequency adaptation per variable.
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated
+        in the optimal transport.
+
+    Returns
+    -------
+    xr.Dataset
+        The variables:
+            hist : training data, after the frequency adaptation
+            ref_to_hist : the points of `ref` transported to the bins of `hist`
+            bin_width : bin widths of the histograms
+            bin_origin : bin origins of the histograms
+    """
+    hist = ds.hist
+    ref = ds.ref
+
+    if adapt_freq_thresh is not None:
+        for var, thresh in adapt_freq_thresh.items():
+            hist.loc[var] = _adapt_freq_hist(
+                xr.Dataset(
+                    {"ref": ref.sel({pts_dim: var}), "hist": hist.sel({pts_dim: var})}
+                ),
+                thresh,
+            )
+
+    hist_map = {d: f"hist_{d}" for d in dim}
+    hist_stk = hist.rename(hist_map).stack(dim_hist=hist_map.values())
+
+    ref_map = {d: f"ref_{d}" for d in dim}
+    ref_stk = ref.rename(ref_map).stack(dim_ref=ref_map.values())
+
+    if isinstance(bin_width, dict):
+        bin_width = {
+            np.where(ref[pts_dim].values == var)[0][0]: op
+            for var, op in bin_width.items()
+        }
+    if isinstance(bin_origin, dict):
+        bin_origin = {
+            np.where(ref[pts_dim].values == var)[0][0]: op
+            for var, op in bin_origin.items()
+        }
+
+    ref_to_hist, bin_width, bin_origin = xr.apply_ufunc(
+        _dotc_train,
+        ref_stk,
+        hist_stk,
+        _stacked_counter(ref_stk, pts_dim, "dim_ref"),
         kwargs={
             "bin_width": bin_width,
             "bin_origin": bin_origin,
             "num_iter_max": num_iter_max,
+            "solver": solver,
+            "solver_kws": solver_kws,
+            "normalization": normalization,
+        },
+        input_core_dims=[["dim_ref", pts_dim], ["dim_hist", pts_dim], ["dim_ref"]],
+        output_core_dims=[["dim_ref", pts_dim], [pts_dim], [pts_dim]],
+        keep_attrs=True,
+        vectorize=True,
+    )
+    ref_to_hist = ref_to_hist.unstack().rename({v: k for k, v in ref_map.items()})
+    # Only these are reduced by the grouping
+    bin_width.attrs["_group_apply_reshape"] = True
+    bin_origin.attrs["_group_apply_reshape"] = True
+
+    return xr.Dataset(
+        {
+            "hist": hist,
+            "ref_to_hist": ref_to_hist,
+            "bin_width": bin_width,
+            "bin_origin": bin_origin,
+        }
+    )
+
+
+@map_groups(
+    reduces=[Grouper.DIM, Grouper.ADD_DIMS, Grouper.PROP],
+    scen=[Grouper.DIM, Grouper.ADD_DIMS],
+)
+def dotc_adjust_trained(
+    ds: xr.Dataset,
+    dim: list,
+    pts_dim: str,
+    num_iter_max: int | None = 100_000_000,
+    solver: str = "emd",
+    solver_kws: dict | None = None,
+    cov_factor: str | None = "std",
+    jitter_inside_bins: bool = True,
+    kind: dict | None = None,
+    normalization: str | None = "max_distance",
+):
+    """
+    Dynamical Optimal Transport Correction adjustment step on one group, with the training of :py:func:`dotc_train`.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset variables:
+            ref : training target
+            hist : training data, after the frequency adaptation
+            ref_to_hist : the points of `ref` transported to the bins of `hist`
+            bin_width : bin widths of the histograms
+            bin_origin : bin origins of the histograms
+            sim : simulated data
+    dim : list
+        The dimensions defining the distribution on which optimal transport is performed.
+    pts_dim : str
+        The dimension defining the multivariate components of the distribution.
+    num_iter_max : int, optional
+        Maximum number of iterations used in the earth mover distance algorithm.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        Algorithm used to find the optimal transport plans, see :py:func:`xsdba.utils.optimal_transport`.
+    solver_kws : dict, optional
+        Arguments of the solver.
+    cov_factor : str, optional
+        Rescaling factor.
+    jitter_inside_bins : bool
+        If `False`, output points are located at the center of their bin.
+        If `True`, a random location is picked uniformly inside their bin. Default is `True`.
+    kind : dict, optional
+        Keys are variable names and values are adjustment kinds, either additive or multiplicative.
+        Unspecified dimensions are treated as "+".
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated
+        in the optimal transport.
+
+    Returns
+    -------
+    xr.Dataset
+        Adjusted data.
+    """
+    hist_map = {d: f"hist_{d}" for d in dim}
+    hist = ds.hist.rename(hist_map).stack(dim_hist=hist_map.values())
+
+    ref_map = {d: f"ref_{d}" for d in dim}
+    ref = ds.ref.rename(ref_map).stack(dim_ref=ref_map.values())
+    ref_to_hist = ds.ref_to_hist.rename(ref_map).stack(dim_ref=ref_map.values())
+
+    sim = ds.sim.stack(dim_sim=dim)
+
+    # The bins may have been broadcast along the grouped dimensions, they are constant within the group.
+    bin_dims = [d for d in dim if d in ds.bin_width.dims]
+    bin_width = ds.bin_width.mean(bin_dims)
+    bin_origin = ds.bin_origin.mean(bin_dims)
+
+    if kind is not None:
+        kind = {
+            np.where(ref[pts_dim].values == var)[0][0]: op for var, op in kind.items()
+        }
+
+    scen = xr.apply_ufunc(
+        _dotc_adjust_trained,
+        sim,
+        ref,
+        hist,
+        ref_to_hist,
+        bin_width,
+        bin_origin,
+        _stacked_counter(sim, pts_dim, "dim_sim"),
+        _stacked_counter(ref, pts_dim, "dim_ref"),
+        kwargs={
+            "num_iter_max": num_iter_max,
+            "solver": solver,
+            "solver_kws": solver_kws,
             "cov_factor": cov_factor,
             "jitter_inside_bins": jitter_inside_bins,
             "kind": kind,
@@ -1421,6 +2434,11 @@ def dotc_adjust(
             ["dim_sim", pts_dim],
             ["dim_ref", pts_dim],
             ["dim_hist", pts_dim],
+            ["dim_ref", pts_dim],
+            [pts_dim],
+            [pts_dim],
+            ["dim_sim"],
+            ["dim_ref"],
         ],
         output_core_dims=[["dim_sim", pts_dim]],
         keep_attrs=True,
@@ -16,22 +16,29 @@ import xarray as xr
 
 from xsdba import nbutils as nbu
 from xsdba.base import Grouper, map_groups
-from xsdba.utils import ADDITIVE, apply_correction, ecdf, invert, rank
+from xsdba.utils import (
+    ADDITIVE,
+    apply_correction,
+    broadcast,
+    ecdf,
+    invert,
+    random_uniform,
+    rank,
+)
 
 
-@map_groups(
-    sim_ad=[Grouper.ADD_DIMS, Grouper.DIM], pth=[Grouper.PROP], dP0=[Grouper.PROP]
-)
-def _adapt_freq(
+def _adapt_freq_group(
     ds: xr.Dataset,
     *,
     dim: Sequence[str],
     thresh: float = 0,
+    key: str | None = None,
 ) -> xr.Dataset:
     r"""
-    Adapt frequency of values under thresh of `sim`, in order to match ref.
+    Adapt frequency of values under thresh of `sim`, in order to match ref, on a single group.
 
-    This is the compute function, see :py:func:`xsdba.processing.adapt_freq` for the user-facing function.
+    This is the same as :py:func:`_adapt_freq`, but for data that was already grouped,
+    as in a function passed to :py:meth:`xsdba.base.Grouper.apply`.
 
     Parameters
     ----------
@@ -41,20 +48,17 @@ def _adapt_freq(
         Dimension name(s).
         If more than one, the probabilities and quantiles are computed within all the dimensions.
         If `window` is in the names, it is removed before the correction and the final timeseries is corrected along dim[0] only.
-    group : Union[str, Grouper]
-        Grouping information, see base.Grouper.
     thresh : float
         Threshold below which values are considered zero.
+    key : str, optional
+        Key of the random values given to `sim`, see :py:func:`xsdba.utils.random_uniform`.
 
     Returns
     -------
     xr.Dataset, with the following variables:
       - `sim_adj`: Simulated data with the same frequency of values under threshold than ref.
-        Adjustment is made group-wise.
-      - `pth` : For each group, the smallest value of sim that was not frequency-adjusted.
-        All values smaller were either left as zero values or given a random value between thresh and pth.
-        NaN where frequency adaptation wasn't needed.
-      - `dP0` : For each group, the percentage of values that were corrected in sim.
+      - `pth` : The smallest value of sim that was not frequency-adjusted.
+      - `dP0` : The percentage of values that were corrected in sim.
     """
     # Compute the probability of finding a value <= thresh
     # This is the "dry-day frequency" in the precipitation case
@@ -86,26 +90,107 @@ def _adapt_freq(
                 (rnk < P0_ref) | (rnk > P0_sim),  # Preserve current values
                 # Generate random numbers ~ U[T0, Pth]
                 (pth.broadcast_like(sim) - thresh)
-                * np.random.random_sample(size=sim.shape)
+                * random_uniform(sim, "adapt_freq", key=key)
                 + thresh,
             ),
         )
+    return xr.Dataset(data_vars={"pth": pth, "dP0": dP0, "sim_ad": sim_ad})
+
+
+@map_groups(
+    sim_ad=[Grouper.ADD_DIMS, Grouper.DIM],
+    pth=[Grouper.PROP],
+    dP0=[Grouper.PROP],
+    indexed=True,
+)
+def _adapt_freq(
+    ds: xr.Dataset,
+    *,
+    dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
+    thresh: float = 0,
+    key: str | None = None,
+) -> xr.Dataset:
+    r"""
+    Adapt frequency of values under thresh of `sim`, in order to match ref.
+
+    This is the compute function, see :py:func:`xsdba.processing.adapt_freq` for the user-facing function.
 
-    # Tell group_apply that these will need reshaping (regrouping)
-    # This is needed since if any variable comes out a `groupby` with the original group axis,
-    # the whole output is broadcasted back to the original dims.
-    pth.attrs["_group_apply_reshape"] = True
-    dP0.attrs["_group_apply_reshape"] = True
+    Parameters
+    ----------
+    ds : xr.Dataset
+        With variables : "ref", Target/reference data, usually observed data and "sim", Simulated data.
+    dim : sequence of strings
+        Dimension name(s). If more than one, the probabilities and quantiles are computed within all the dimensions.
+        The correction is applied on each element of the main dimension (dim[0]), with the statistics of its group.
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group, including the window.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        Grouping information, see base.Grouper.
+    thresh : float
+        Threshold below which values are considered zero.
+    key : str, optional
+        Key of the random values given to `sim`, see :py:func:`xsdba.utils.random_uniform`.
+
+    Returns
+    -------
+    xr.Dataset, with the following variables:
+      - `sim_adj`: Simulated data with the same frequency of values under threshold than ref.
+        Adjustment is made group-wise.
+      - `pth` : For each group, the smallest value of sim that was not frequency-adjusted.
+        All values smaller were either left as zero values or given a random value between thresh and pth.
+        NaN where frequency adaptation wasn't needed.
+      - `dP0` : For each group, the percentage of values that were corrected in sim.
+    """
+    sim = ds.sim
+    # Compute the probability of finding a value <= thresh
+    # This is the "dry-day frequency" in the precipitation case
+    P0_sim = nbu.grouped_mean((sim <= thresh).where(sim.notnull()), indexes, dim)
+    P0_ref = nbu.grouped_mean((ds.ref <= thresh).where(ds.ref.notnull()), indexes, dim)
+
+    # The proportion of values <= thresh in sim that need to be corrected, compared to ref
+    dP0 = (P0_sim - P0_ref) / P0_sim
+
+    # Compute : ecdf_ref^-1( ecdf_sim( thresh ) )
+    # The value in ref with the same rank as the first non-zero value in sim.
+    # pth is meaningless when freq. adaptation is not needed
+    pth = nbu.grouped_vecquantiles(ds.ref, P0_sim, indexes, dim).where(dP0 > 0)
+
+    # Get the percentile rank of each value in sim, among the samples of its group (including the window)
+    rnk = nbu.grouped_rank(
+        sim, indexes, group.get_group_indexes(ds, main_only=True), dim
+    )
+
+    def _bcast(grouped):
+        return broadcast(grouped, sim, group=group, interp="nearest")
+
+    # Frequency-adapted sim
+    sim_ad = sim.where(
+        _bcast(dP0) < 0,  # dP0 < 0 means no-adaptation.
+        sim.where(
+            (rnk < _bcast(P0_ref)) | (rnk > _bcast(P0_sim)),  # Preserve current values
+            # Generate random numbers ~ U[T0, Pth]
+            (_bcast(pth) - thresh) * random_uniform(sim, "adapt_freq", key=key)
+            + thresh,
+        ),
+    )
     return xr.Dataset(data_vars={"pth": pth, "dP0": dP0, "sim_ad": sim_ad})
 
 
 @map_groups(
-    reduces=[Grouper.DIM, Grouper.PROP], data=[Grouper.DIM], norm=[Grouper.PROP]
+    reduces=[Grouper.DIM, Grouper.PROP],
+    data=[Grouper.DIM],
+    norm=[Grouper.PROP],
+    indexed=True,
 )
 def _normalize(
     ds: xr.Dataset,
     *,
     dim: Sequence[str],
+    indexes: xr.DataArray,
+    group: Grouper,
     kind: str = ADDITIVE,
 ) -> xr.Dataset:
     """
@@ -116,10 +201,13 @@ def _normalize(
     ds : xr.Dataset
         The variable `data` is normalized.
         If a `norm` variable is present, is uses this one instead of computing the norm again.
-    group : Union[str, Grouper]
-        Grouping information. See :py:class:`xsdba.base.Grouper` for details.
     dim : sequence of strings
         Dimension name(s).
+    indexes : xr.DataArray
+        The positions along the main dimension of the elements of each group, including the window.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    group : Grouper
+        Grouping information. See :py:class:`xsdba.base.Grouper` for details.
     kind : {'+', '*'}
         How to apply the adjustment, using either additive or multiplicative methods.
 
@@ -135,12 +223,14 @@ def _normalize(
     if "norm" in ds:
         norm = ds.norm
     else:
-        norm = ds.data.mean(dim=dim)
-    norm.attrs["_group_apply_reshape"] = True
+        norm = nbu.grouped_mean(ds.data, indexes, dim)
 
-    return xr.Dataset(
-        {"data": apply_correction(ds.data, invert(norm, kind), kind), "norm": norm}
+    data = apply_correction(
+        ds.data,
+        broadcast(invert(norm, kind), ds.data, group=group, interp="nearest"),
+        kind,
     )
+    return xr.Dataset({"data": data, "norm": norm})
 
 
 @map_groups(reordered=[Grouper.DIM], main_only=False)
@@ -6,8 +6,10 @@ Base Classes and Developer Tools
 
 from __future__ import annotations
 
+import threading
 from collections import UserDict
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
 from inspect import _empty, signature
 
 import cftime
@@ -19,7 +21,8 @@ import xarray as xr
 from boltons.funcutils import wraps
 from xarray.core import dtypes
 
-from xsdba.options import OPTIONS
+from xsdba.options import OPTIONS, OT_PLAN_CACHE, RANDOM_SEED
+from xsdba.profiling import profiled, stage
 
 # TODO : Redistributes some functions in existing/new scripts
 
@@ -222,6 +225,7 @@ class Grouper(Parametrizable):
         # TODO: woups what happens when there is no group? (prop is None)
         raise NotImplementedError("No grouping found.")
 
+    @profiled("Grouper.group")
     def group(
         self,
         da: xr.DataArray | xr.Dataset | None = None,
@@ -359,11 +363,103 @@ class Grouper(Parametrizable):
         xi.name = self.prop
         return xi
 
+    @profiled("Grouper.get_group_indexes")
+    def get_group_indexes(
+        self,
+        da: xr.DataArray | xr.Dataset,
+        main_only: bool = False,
+    ) -> xr.DataArray:
+        """
+        Return the positions along the main dimension of the elements of each group.
+
+        This is an alternative to :py:meth:`Grouper.group` for functions that can reduce the groups
+        from an index table, without creating one xarray object per group nor a copied `window` dimension.
+
+        Parameters
+        ----------
+        da : xr.DataArray or xr.Dataset
+            The input array/dataset. It must have `Grouper.dim` as a coordinate.
+        main_only : bool
+            If True, the rolling window is ignored, as in :py:meth:`Grouper.group`.
+
+        Returns
+        -------
+        xr.DataArray
+            Integer array with dimensions (`Grouper.prop`, "group_member") and the group coordinate given by
+            :py:meth:`Grouper.get_coordinate`. For each group, the positions along `Grouper.dim` of the elements that
+            :py:meth:`Grouper.group` would put in this group, over the main and `window` dimensions.
+            Positions falling outside the array (the padding of the rolling window) and the padding of
+            groups with fewer elements are set to -1.
+        """
+        crd = self.get_coordinate(ds=da)
+        if self.prop == "group":
+            codes = np.zeros(da[self.dim].size, dtype=int)
+        elif self.prop == "season":
+            codes = self.get_index(da).values
+        else:
+            codes = self.get_index(da).values - crd.values[0]
+
+        if self.window > 1 and not main_only:
+            offsets = np.arange(self.window) - self.window // 2
+        else:
+            offsets = np.array([0])
+
+        n = codes.size
+        counts = np.bincount(codes, minlength=crd.size)
+        # Elements of each group, in order along the main dimension
+        order = np.argsort(codes, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        rank_in_group = np.arange(n) - starts[codes[order]]
+
+        pos = order[:, np.newaxis] + offsets
+        pos = np.where((pos >= 0) & (pos < n), pos, -1)
+        members = np.full((crd.size, counts.max(initial=0) * offsets.size), -1)
+        members[
+            codes[order][:, np.newaxis],
+            rank_in_group[:, np.newaxis] * offsets.size + np.arange(offsets.size),
+        ] = pos
+        return xr.DataArray(
+            members,
+            dims=(self.prop, "group_member"),
+            coords={self.prop: crd},
+            name="group_indexes",
+        )
+
+    def _call(
+        self,
+        func: Callable | str,
+        da: xr.DataArray | dict[str, xr.DataArray] | xr.Dataset,
+        dims: str | list[str],
+        main_only: bool,
+        indexed: bool,
+        **kwargs,
+    ) -> xr.DataArray | xr.Dataset:
+        """Group the data and call the function on the groups, or call it once with the group indexes if `indexed`."""
+        if indexed:
+            if isinstance(da, dict):
+                da = xr.Dataset(da)
+            return func(
+                da,
+                dim=dims if main_only else [d for d in dims if d in da.dims],
+                indexes=self.get_group_indexes(da, main_only=main_only),
+                group=self,
+                **kwargs,
+            )
+        if isinstance(da, dict | xr.Dataset):
+            grpd = self.group(main_only=main_only, **da)
+        else:
+            grpd = self.group(da, main_only=main_only)
+        if isinstance(func, str):
+            return getattr(grpd, func)(dim=dims, **kwargs)
+        return grpd.map(func, dim=dims, **kwargs)
+
+    @profiled("Grouper.apply")
     def apply(
         self,
         func: Callable | str,
         da: xr.DataArray | dict[str, xr.DataArray] | xr.Dataset,
         main_only: bool = False,
+        indexed: bool = False,
         **kwargs,
     ) -> xr.DataArray | xr.Dataset:
         r"""
@@ -382,6 +478,12 @@ class Grouper(Parametrizable):
             (if False, default) (including the window and dimensions given through `add_dims`).
             The dimensions used are also written in the "group_compute_dims" attribute.
             If all the input arrays are missing one of the 'add_dims', it is silently omitted.
+        indexed : bool
+            If True, the data is not grouped. Instead, the function is called once on the whole input as
+            `func(da, dim=dims, indexes=indexes, group=self, **kwargs)`, where `indexes` is the output of
+            :py:meth:`Grouper.get_group_indexes`. The function must then return outputs with the group dimension
+            (`Grouper.prop`) or with the main dimension. No `window` dimension is constructed, which avoids
+            copying the data `window` times.
         \*\*kwargs
             Other keyword arguments to pass to the function.
 
@@ -410,7 +512,6 @@ class Grouper(Parametrizable):
         these will be re-grouped by calling `da.groupby(self.name).first()`.
         """
         if isinstance(da, dict | xr.Dataset):
-            grpd = self.group(main_only=main_only, **da)
             dim_chunks = min(  # Get smallest chunking to rechunk if the operation is non-grouping
                 [
                     d.chunks[d.get_axis_num(self.dim)]
@@ -421,7 +522,6 @@ class Grouper(Parametrizable):
                 key=len,
             )
         else:
-            grpd = self.group(da, main_only=main_only)
             # Get chunking to rechunk is the operation is non-grouping
             # To match the behaviour of the case above, an empty list signifies that dask is not used for the input.
             dim_chunks = (
@@ -435,10 +535,7 @@ class Grouper(Parametrizable):
             if self.window > 1:
                 dims += ["window"]
 
-        if isinstance(func, str):
-            out = getattr(grpd, func)(dim=dims, **kwargs)
-        else:
-            out = grpd.map(func, dim=dims, **kwargs)
+        out = self._call(func, da, dims, main_only, indexed, **kwargs)
 
         # Case where the function wants to return more than one variable.
         # and that some have grouped dims and other have the same dimensions as the input.
@@ -547,6 +644,50 @@ def _decode_cf_coords(ds: xr.Dataset):
             del ds[crdname].encoding["dtype"]
 
 
+# The options of the block computed by the current thread, see `map_blocks`.
+_BLOCK_OPTIONS = threading.local()
+# The options read in the blocks, with their default values
+_BLOCK_OPTION_DEFAULTS = {RANDOM_SEED: None, OT_PLAN_CACHE: 0}
+
+
+def _block_option(name: str):
+    """The value of an option in the current block if in one, otherwise its current value."""
+    options = getattr(_BLOCK_OPTIONS, "options", None)
+    if options is None:
+        return OPTIONS[name]
+    return options.get(name, _BLOCK_OPTION_DEFAULTS[name])
+
+
+@contextmanager
+def _block_options(options: dict) -> Iterator[None]:
+    """Set the options read by the current thread, while it computes a block."""
+    previous = getattr(_BLOCK_OPTIONS, "options", None)
+    _BLOCK_OPTIONS.options = options
+    try:
+        yield
+    finally:
+        _BLOCK_OPTIONS.options = previous
+
+
+def get_seed() -> int:
+    """
+    Get the seed of the random numbers drawn by xsdba.
+
+    This is the ``random_seed`` option of :py:class:`xsdba.set_options`. In the blocks of a function wrapped by
+    :py:func:`map_blocks`, it is the value of the option when the function was called, even if the blocks are
+    computed later by dask. If the option is not set, a new seed is drawn on each call.
+
+    Returns
+    -------
+    int
+        A seed of 64 bits.
+    """
+    seed = _block_option(RANDOM_SEED)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return seed % 2**64
+
+
 def map_blocks(  # noqa: C901
     reduces: Sequence[str] | None = None, **out_vars
 ) -> Callable:
@@ -714,7 +855,8 @@ def map_blocks(  # noqa: C901
                 """Call the decorated func and transpose to ensure the same dim order as on the template."""
                 try:
                     _decode_cf_coords(dsblock)
-                    func_out = func(dsblock, **f_kwargs).transpose(*all_dims)
+                    with _block_options(f_kwargs.pop("_block_options", {})):
+                        func_out = func(dsblock, **f_kwargs).transpose(*all_dims)
                 except Exception as err:
                     raise ValueError(
                         f"{func.__name__} failed on block with coords : {dsblock.coords}."
@@ -732,10 +874,27 @@ def map_blocks(  # noqa: C901
             # Coords not sharing dims with `all_dims` (like scalar aux coord on reduced 1D input) are absent from tmpl
             tmpl = tmpl.drop_vars(extra_coords.keys(), errors="ignore")
 
+            def _ntasks():
+                # Tasks added by this call, with dask
+                if not uses_dask(out):
+                    return 0
+                return len(out.__dask_graph__()) - len(ds.__dask_graph__() or ())
+
+            # The blocks read the options set now, like the seed of their random numbers, whenever they are
+            # computed. Being in the arguments, those that are not the default are part of the names of the tasks.
+            options = {
+                name: _block_option(name)
+                for name, default in _BLOCK_OPTION_DEFAULTS.items()
+                if _block_option(name) != default
+            }
+            if options:
+                kwargs = {**kwargs, "_block_options": options}
+
             # Call
-            out = ds.map_blocks(
-                _call_and_transpose_on_exit, template=tmpl, kwargs=kwargs
-            )
+            with stage(_call_and_transpose_on_exit.__name__, tasks=_ntasks):
+                out = ds.map_blocks(
+                    _call_and_transpose_on_exit, template=tmpl, kwargs=kwargs
+                )
             # Add back the extra coords, but only those which have compatible dimensions (like xarray would have done)
             out = out.assign_coords(
                 {
@@ -756,7 +915,10 @@ def map_blocks(  # noqa: C901
 
 
 def map_groups(
-    reduces: Sequence[str] | None = None, main_only: bool = False, **out_vars
+    reduces: Sequence[str] | None = None,
+    main_only: bool = False,
+    indexed: bool = False,
+    **out_vars,
 ) -> Callable:
     r"""
     Decorator for declaring functions acting only on groups and wrapping them into a map_blocks.
@@ -775,6 +937,9 @@ def map_groups(
         if main_only is False, and [Grouper.DIM] if main_only is True. See :py:func:`map_blocks`.
     main_only : bool
         Same as for :py:meth:`Grouper.apply`.
+    indexed : bool
+        Same as for :py:meth:`Grouper.apply`. If True, the decorated function must have the signature
+        ``func(ds, dim, indexes, group, **kwargs)``.
     \*\*out_vars
         Mapping from variable names in the output to their *new* dimensions.
         The placeholders ``Grouper.PROP``, ``Grouper.DIM`` and ``Grouper.ADD_DIMS`` can be used to signify
@@ -796,7 +961,9 @@ def map_groups(
 
         def _apply_on_group(dsblock, **kwargs):
             group = kwargs.pop("group")
-            return group.apply(func, dsblock, main_only=main_only, **kwargs)
+            return group.apply(
+                func, dsblock, main_only=main_only, indexed=indexed, **kwargs
+            )
 
         # Fancy patching for explicit dask task names
         _apply_on_group.__name__ = f"group_{func.__name__}"
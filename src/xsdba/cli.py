@@ -2,20 +2,166 @@
 
 from __future__ import annotations
 
+import time
+import warnings
+from pathlib import Path
+from typing import Annotated
+
+import dask
+import numpy as np
 import typer
+import xarray as xr
 from rich.console import Console
 
-app = typer.Typer()
+app = typer.Typer(no_args_is_help=True)
 console = Console()
 
 
-@app.command()  # type: ignore[misc]
+@app.callback()  # type: ignore[misc]
 def main() -> None:
-    """Console script for xsdba."""
+    """Statistical correction and bias adjustment tools for xarray."""
+
+
+def _warmup_data(dtype: str, use_dask: bool) -> dict[str, xr.Dataset]:
+    """Synthetic daily temperature and precipitation at two locations, for `ref`, `hist` and `sim`."""
+    rng = np.random.default_rng(0)
+    times = xr.date_range(
+        "2000-01-01", periods=365 * 2, freq="D", calendar="noleap", use_cftime=True
+    )
+    season = np.sin(2 * np.pi * np.arange(times.size) / 365)
+    out = {}
+    for i, name in enumerate(["ref", "hist", "sim"]):
+        shape = (2, times.size)
+        tas = 280 + i + 10 * season + rng.normal(size=shape)
+        pr = np.where(rng.random(shape) < 0.6, 0, rng.gamma(0.8, 4 + i, size=shape))
+        ds = xr.Dataset(
+            {
+                "tas": (("location", "time"), tas.astype(dtype), {"units": "K"}),
+                "pr": (("location", "time"), pr.astype(dtype), {"units": "mm/d"}),
+            },
+            coords={"time": times},
+        )
+        out[name] = ds.chunk(location=1) if use_dask else ds
+    return out
+
+
+def _warmup_workload(dtype: str, use_dask: bool) -> None:
+    """
+    Call the main methods once on small inputs, which compiles the kernels for these inputs.
+
+    Each step reaches kernels that the others don't. The interpolation method is a runtime argument of the
+    kernels, so a single one is used. Within dask blocks, the serial versions of the parallel kernels are used.
+    """
+    from xsdba import adjustment as adj
+    from xsdba import detrending, nbutils, processing
+    from xsdba.base import Grouper
+    from xsdba.processing import stack_variables
+
+    data = _warmup_data(dtype, use_dask)
+    ref, hist, sim = data["ref"], data["hist"], data["sim"]
+
+    # Interpolations on the quantiles in 1D and on the grid of the groups
+    for group in ["time", Grouper("time.dayofyear", window=31)]:
+        adj.EmpiricalQuantileMapping.train(
+            ref.tas, hist.tas, nquantiles=15, group=group
+        ).adjust(sim.tas, interp="cubic").load()
+        adj.QuantileDeltaMapping.train(
+            ref.pr, hist.pr, nquantiles=15, group=group, kind="*"
+        ).adjust(sim.pr, interp="linear").load()
+        processing.normalize(ref.tas, group=group)[0].load()
+
+    # The groupby path of the quantile mappings, with frequency adaptation
+    adj.EmpiricalQuantileMapping.train(
+        ref.pr,
+        hist.pr,
+        nquantiles=15,
+        group="time.month",
+        kind="*",
+        adapt_freq_thresh="0.1 mm/d",
+        jitter_under_thresh_value="0.01 mm/d",
+    ).ds.load()
+    processing.adapt_freq(ref.pr, sim.pr, group="time.month", thresh="0.1 mm/d")[
+        0
+    ].load()
+
+    for detrend in [
+        detrending.LoessDetrend(f=0.2, niter=1),
+        detrending.LoessDetrend(f=0.2, niter=1, weights="gaussian"),
+        detrending.MeanDetrend(),
+        detrending.RollingMeanDetrend(win=31),
+    ]:
+        detrend.fit(sim.tas).detrend(sim.tas).load()
+
+    if use_dask:
+        # Inputs chunked along time : exact quantiles and quantile sketches
+        chunked = {name: ds.chunk(time=365) for name, ds in data.items()}
+        q = np.linspace(0.05, 0.95, 19)
+        nbutils.quantile(chunked["ref"].tas, q, "time").load()
+        adj.EmpiricalQuantileMapping.train(
+            chunked["ref"].tas,
+            chunked["hist"].tas,
+            group="time.month",
+            sketch_error=0.02,
+        ).ds.load()
+
+    sref, shist, ssim = (stack_variables(ds) for ds in [ref, hist, sim])
+    adj.MBCn.train(
+        sref,
+        shist,
+        base_kws={"nquantiles": 15, "group": "time"},
+        adj_kws={"interp": "linear"},
+        n_iter=2,
+    ).adjust(sim=ssim, ref=sref, hist=shist).load()
+    processing.escore(sref, shist, dims=("multivar", "time"), N=50).load()
+
+
+@app.command()  # type: ignore[misc]
+def warmup(
+    cache_dir: Annotated[
+        Path,
+        typer.Option(
+            help="Directory where the compiled kernels are stored, to be given to the numba_cache_dir option."
+        ),
+    ],
+    dtypes: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--dtype",
+            help="Data types to compile the kernels for. Defaults to float32 and float64.",
+        ),
+    ] = None,
+) -> None:
+    """
+    Compile the numba kernels of xsdba ahead of time, and store them in the on-disk cache.
+
+    The kernels are compiled for the inputs of a small synthetic training and adjustment of the main methods,
+    both in memory and with dask. Later sessions setting the ``numba_cache_dir`` option of
+    :py:func:`xsdba.set_options` to the same directory then load the compiled kernels instead of compiling them
+    again. The directory should be dedicated to this cache and not be written to by several processes at once.
+    """
+    from xsdba.options import _numba_kernels, set_options
+
+    def _nsignatures():
+        return sum(len(kernel.overloads) for kernel in _numba_kernels())
+
+    dtypes = dtypes or ["float32", "float64"]
+    start, before = time.perf_counter(), _nsignatures()
+    with (
+        set_options(numba_cache_dir=cache_dir),
+        dask.config.set(scheduler="synchronous"),
+        warnings.catch_warnings(),
+    ):
+        warnings.simplefilter("ignore")
+        for dtype in dtypes:
+            for use_dask in [False, True]:
+                console.print(
+                    f"Compiling kernels for {dtype} ({'dask' if use_dask else 'in memory'})."
+                )
+                _warmup_workload(dtype, use_dask)
     console.print(
-        "Replace this message by putting your code into xsdba.cli.main",
+        f"{_nsignatures() - before} signatures of {len(list(_numba_kernels()))} kernels "
+        f"compiled or loaded in {time.perf_counter() - start:.1f} s."
     )
-    console.print("See Typer documentation at https://typer.tiangolo.com/")
 
 
 if __name__ == "__main__":
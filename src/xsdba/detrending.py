@@ -6,12 +6,22 @@ Detrending Objects Utilities
 
 from __future__ import annotations
 
+import numpy as np
+import pandas as pd
 import xarray as xr
-
-from xsdba.base import Grouper, ParametrizableWithDataset, map_groups, parse_group
+from dask import array as dsk
+
+from xsdba.base import (
+    Grouper,
+    ParametrizableWithDataset,
+    map_groups,
+    parse_group,
+    uses_dask,
+)
 from xsdba.loess import loess_smoothing
+from xsdba.nbutils import _local_group_indexes
 from xsdba.units import harmonize_units
-from xsdba.utils import ADDITIVE, apply_correction, invert
+from xsdba.utils import ADDITIVE, _ArrayCache, apply_correction, invert
 
 
 class BaseDetrend(ParametrizableWithDataset):
@@ -137,14 +147,91 @@ class NoDetrend(BaseDetrend):
         return da
 
 
+def _chunked_along(da: xr.DataArray, dim: str) -> bool:
+    """Whether `da` is a dask array with more than one chunk along `dim`."""
+    return uses_dask(da) and len(da.chunks[da.get_axis_num(dim)]) > 1
+
+
 class MeanDetrend(BaseDetrend):
-    """Simple detrending removing only the mean from the data, quite similar to normalizing."""
+    """
+    Simple detrending removing only the mean from the data, quite similar to normalizing.
+
+    Notes
+    -----
+    If the data is chunked along the main dimension of the group, the sums and counts of valid values of each group
+    are computed chunk by chunk and summed, and the means are broadcast back on the chunks of the data. With a
+    rolling window, only the window of each chunk is gathered, so the whole time series is never loaded at once.
+    """
 
     def _get_trend(self, da):
         """Trend."""
+        if _chunked_along(da, self.group.dim):
+            return _group_mean_chunked(da, self.group)
         return _meandetrend_get_trend(da, **self).trend
 
 
+def _group_sums_chunk(arr, indexes, nreduce):
+    """Sums and counts of the valid values of each group of a chunk, over the last `nreduce` axes of `arr`."""
+    vals = arr[..., indexes]
+    valid = ~np.isnan(vals) & (indexes >= 0)
+    axes = tuple(range(arr.ndim - nreduce, arr.ndim - 1)) + (-1,)
+    sums = np.where(valid, vals, 0).sum(axis=axes)
+    counts = valid.sum(axis=axes)
+    return np.stack([sums, counts], axis=-2)
+
+
+def _group_mean_chunked(da: xr.DataArray, group: Grouper) -> xr.DataArray:
+    """Mean of each group of `da`, reduced chunk by chunk along the main dimension and broadcast back on `da`."""
+    adds = [d for d in group.add_dims if d in da.dims]
+    keep = [d for d in da.dims if d != group.dim and d not in adds]
+    nkeep = len(keep)
+    arr = da.transpose(*keep, *adds, group.dim).data
+    if adds:
+        # The additional dimensions are reduced together with each chunk of the main one
+        arr = arr.rechunk({ax: -1 for ax in range(nkeep, arr.ndim - 1)})
+
+    indexes = group.get_group_indexes(da).values
+    bounds = np.cumsum((0,) + arr.chunks[-1])
+    parts = [
+        arr[..., start:stop].map_blocks(
+            _group_sums_chunk,
+            indexes=_local_group_indexes(indexes, start, stop),
+            nreduce=len(adds) + 1,
+            drop_axis=list(range(nkeep, arr.ndim)),
+            new_axis=[nkeep, nkeep + 1],
+            chunks=arr.chunks[:nkeep] + ((2,), (indexes.shape[0],)),
+            dtype=float,
+        )
+        for start, stop in zip(bounds[:-1], bounds[1:], strict=False)
+    ]
+    sums = dsk.stack(parts).sum(axis=0)
+    mean = sums[..., 0, :] / dsk.where(sums[..., 1, :] > 0, sums[..., 1, :], np.nan)
+
+    # Group of each element along the main dimension
+    main = group.get_group_indexes(da, main_only=True).values
+    codes = np.empty(da[group.dim].size, dtype=int)
+    grp, member = np.nonzero(main >= 0)
+    codes[main[grp, member]] = grp
+    ind = tuple(f"k{i}" for i in range(nkeep))
+    trend = dsk.blockwise(
+        lambda m, c: m[..., c],
+        ind + ("t",),
+        mean,
+        ind + ("g",),
+        dsk.from_array(codes, chunks=(arr.chunks[-1],)),
+        ("t",),
+        concatenate=True,
+        dtype=float,
+    )
+    trend = (
+        da.isel({d: 0 for d in adds}, drop=True)
+        .transpose(*keep, group.dim)
+        .copy(data=trend)
+    )
+    trend = trend.broadcast_like(da).transpose(*da.dims)
+    return trend.chunk(dict(zip(da.dims, da.chunks, strict=False))).rename("trend")
+
+
 @map_groups(trend=[Grouper.DIM])
 def _meandetrend_get_trend(da, *, dim, kind):
     """Mean detrend."""
@@ -183,14 +270,105 @@ class PolyDetrend(BaseDetrend):
         return trend.trend
 
 
+# Matrices of the polynomial fits, kept in memory for each coordinate and degree
+_POLY_PROJECTIONS = _ArrayCache()
+_POLY_PROJECTIONS_SIZE = 16
+
+
+def _numeric_coord(da: xr.DataArray, dim: str) -> np.ndarray:
+    """
+    Coordinate of `da` along `dim` as floats.
+
+    Times are converted to nanoseconds since 1970-01-01. Without a coordinate, the positions are used.
+    """
+    if dim not in da.indexes:
+        return np.arange(da[dim].size, dtype=float)
+    index = da.indexes[dim]
+    if isinstance(index, xr.CFTimeIndex):
+        # asi8 is in microseconds
+        return index.asi8.astype(float) * 1e3
+    if isinstance(index, pd.DatetimeIndex):
+        return index.values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return np.asarray(index, dtype=float)
+
+
+def _poly_matrices(x: np.ndarray, degree: int) -> tuple[np.ndarray, np.ndarray]:
+    """Vandermonde matrix of `x`, centered and scaled, and its pseudo-inverse."""
+    xs = x - x.mean()
+    scale = np.abs(xs).max()
+    vander = np.vander(xs / (scale if scale > 0 else 1), int(degree) + 1)
+    return vander, np.linalg.pinv(vander)
+
+
+def _poly_projection(x: np.ndarray, degree: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vandermonde matrix of `x` and its pseudo-inverse, for a polynomial fit of order `degree`.
+
+    The coordinates are centered and scaled before the matrices are computed. The last computed matrices are
+    cached, so that the fits on the same coordinates reuse them. They are read-only.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The coordinates, 1D.
+    degree : int
+        The order of the polynomial.
+
+    Returns
+    -------
+    np.ndarray
+        The Vandermonde matrix, (x.size, degree + 1).
+    np.ndarray
+        Its pseudo-inverse, (degree + 1, x.size).
+    """
+    return _POLY_PROJECTIONS.get(
+        (x, degree), lambda: _poly_matrices(x, degree), size=_POLY_PROJECTIONS_SIZE
+    )
+
+
+def _polyfit_trend(y: np.ndarray, x: np.ndarray, degree: int) -> np.ndarray:
+    """
+    Polynomial trend along the last axis of `y`, evaluated at `x`.
+
+    The series without missing values are all fitted with the same matrix products. Those with missing values
+    are fitted one by one on their valid values.
+    """
+    vander, pinv = _poly_projection(x, degree)
+    shape = y.shape
+    y = y.reshape(-1, shape[-1]).astype(float, copy=False)
+    nan = np.isnan(y).any(axis=1)
+    if not nan.any():
+        return ((y @ pinv.T) @ vander.T).reshape(shape)
+    trend = np.empty_like(y)
+    trend[~nan] = (y[~nan] @ pinv.T) @ vander.T
+    for i in np.where(nan)[0]:
+        valid = ~np.isnan(y[i])
+        if valid.any():
+            coeffs = np.linalg.lstsq(vander[valid], y[i, valid], rcond=None)[0]
+            trend[i] = vander @ coeffs
+        else:
+            trend[i] = np.nan
+    return trend.reshape(shape)
+
+
 @map_groups(trend=[Grouper.DIM])
 def _polydetrend_get_trend(da, *, dim, degree, preserve_mean, kind):
     """Polydetrend, atomic func on 1 group."""
     if len(dim) > 1:
         da = da.mean(dim[1:])
     dim = dim[0]
-    pfc = da.polyfit(dim=dim, deg=degree)
-    trend = xr.polyval(coord=da[dim], coeffs=pfc.polyfit_coefficients)
+    trend = xr.apply_ufunc(
+        _polyfit_trend,
+        da,
+        input_core_dims=[[dim]],
+        output_core_dims=[[dim]],
+        kwargs={
+            "x": _numeric_coord(da, dim),
+            "degree": degree,
+        },
+        dask="parallelized",
+        output_dtypes=[float],
+    ).transpose(*da.dims)
 
     if preserve_mean:
         trend = apply_correction(trend, invert(trend.mean(dim=dim), kind), kind)
@@ -229,8 +407,8 @@ class LoessDetrend(BaseDetrend):
 
     Notes
     -----
-    LOESS smoothing is computationally expensive. As it relies on a loop on gridpoints, it can be useful to use
-    smaller than usual chunks. Moreover, it suffers from heavy boundary effects. As a rule of thumb, the outermost
+    LOESS smoothing is computationally expensive. All gridpoints of a chunk are smoothed in a single compiled call,
+    in parallel, see :py:func:`xsdba.loess.loess_smoothing`. Moreover, it suffers from heavy boundary effects. As a rule of thumb, the outermost
     N * f/2 points should be considered dubious. (N is the number of points along each group)
     """
 
@@ -311,6 +489,10 @@ class RollingMeanDetrend(BaseDetrend):
     Notes
     -----
     As for the :py:class:`LoessDetrend` detrending, important boundary effects are to be expected.
+
+    With `group='time'`, the data can be chunked along the time dimension. Each chunk is then processed with an
+    overlap of `win // 2` elements from its neighbours and the rolling mean is computed from cumulative sums, so
+    the whole time series is never loaded at once.
     """
 
     def __init__(
@@ -330,11 +512,89 @@ class RollingMeanDetrend(BaseDetrend):
 
     def _get_trend(self, da):
         """Trend."""
+        group = self.group
+        if (
+            _chunked_along(da, group.dim)
+            and group.prop == "group"
+            and group.window == 1
+        ):
+            if group.add_dims:
+                da = da.mean(group.add_dims)
+            trend = xr.apply_ufunc(
+                _rolling_mean_dask,
+                da,
+                input_core_dims=[[group.dim]],
+                output_core_dims=[[group.dim]],
+                kwargs={
+                    "win": self.win,
+                    "weights": None if self.weights is None else self.weights.values,
+                    "min_periods": self.min_periods,
+                },
+                dask="allowed",
+            ).transpose(*da.dims)
+            return trend.rename("trend")
         # Estimate trend over da
         trend = _rollingmean_get_trend(da, **self)
         return trend.trend
 
 
+def _rolling_mean_block(
+    arr: np.ndarray,
+    win: int,
+    weights: np.ndarray | None = None,
+    min_periods: int | None = None,
+) -> np.ndarray:
+    """
+    Centered rolling mean along the last axis, same as :py:meth:`xarray.DataArray.rolling` with `center=True`.
+
+    The sums and counts of valid values over each window are differences of cumulative sums. With `weights`, the
+    result is NaN as soon as a value is missing in the window.
+    """
+    before = win // 2
+    after = win - 1 - before
+    n = arr.shape[-1]
+    out = np.full(arr.shape, np.nan)
+    if weights is not None:
+        if n >= win:
+            windows = np.lib.stride_tricks.sliding_window_view(arr, win, axis=-1)
+            out[..., before : n - after] = windows @ weights
+        return out
+
+    valid = ~np.isnan(arr)
+    count = valid.sum(axis=-1, keepdims=True)
+    # Centering the values limits the rounding errors of the cumulative sums
+    ref = np.where(valid, arr, 0).sum(axis=-1, keepdims=True) / np.maximum(count, 1)
+    csum = np.zeros(arr.shape[:-1] + (n + 1,))
+    csum[..., 1:] = np.cumsum(np.where(valid, arr - ref, 0), axis=-1)
+    ccount = np.zeros(arr.shape[:-1] + (n + 1,), dtype=int)
+    ccount[..., 1:] = np.cumsum(valid, axis=-1)
+
+    i = np.arange(n)
+    lo = np.clip(i - before, 0, n)
+    hi = np.clip(i + after + 1, 0, n)
+    wsum = csum[..., hi] - csum[..., lo]
+    wcount = ccount[..., hi] - ccount[..., lo]
+    mask = wcount >= (win if min_periods is None else min_periods)
+    out[mask] = (wsum[mask] / wcount[mask]) + np.broadcast_to(ref, arr.shape)[mask]
+    return out
+
+
+def _rolling_mean_dask(
+    arr, win: int, weights: np.ndarray | None, min_periods: int | None
+):
+    """Apply :py:func:`_rolling_mean_block` on a dask array chunked along its last axis."""
+    return arr.astype(float).map_overlap(
+        _rolling_mean_block,
+        depth={arr.ndim - 1: win // 2},
+        boundary=np.nan,
+        dtype=float,
+        meta=np.array((), dtype=float),
+        win=win,
+        weights=weights,
+        min_periods=min_periods,
+    )
+
+
 @map_groups(trend=[Grouper.DIM])
 def _rollingmean_get_trend(da, *, dim, kind, win, weights, min_periods):
     """Rollingmean trend."""
@@ -13,6 +13,9 @@ import numba
 import numpy as np
 import xarray as xr
 
+from xsdba.base import uses_dask
+from xsdba.nbutils import _serial_twin
+
 
 @numba.njit
 def _gaussian_weighting(x):  # pragma: no cover
@@ -34,6 +37,22 @@ def _tricube_weighting(x):  # pragma: no cover
     return w
 
 
+# Codes of the builtin weighting functions. These are chosen inside the compiled functions, as passing them as
+# arguments makes the types of the latter depend on the function's address, which defeats the on-disk cache.
+TRICUBE = 0
+GAUSSIAN = 1
+
+
+@numba.njit
+def _weighting(weight_func, kernel, x):  # pragma: no cover
+    """Apply `weight_func`, or the builtin weighting function of code `kernel` if it is None."""
+    if weight_func is None:
+        if kernel == GAUSSIAN:
+            return _gaussian_weighting(x)
+        return _tricube_weighting(x)
+    return weight_func(x)
+
+
 @numba.njit
 def _constant_regression(xi, x, y, w):  # pragma: no cover
     return (w * y).sum() / w.sum()
@@ -177,6 +196,424 @@ def _loess_nb(
     return yest
 
 
+# Coefficients of the tricube kernel (1 - v^3)^3 as a polynomial of v = |x - xi| / h.
+_TRICUBE_COEFFS = np.array([1.0, 0, 0, -3, 0, 0, 3, 0, 0, -1])
+# Number of moments of each half window needed for the linear regression with the tricube kernel.
+_NMOM = _TRICUBE_COEFFS.size + 2
+
+
+@numba.njit
+def _weighted_fit(s0, s1, s2, t0, t1, d):  # pragma: no cover
+    """Value at the origin of the weighted regression given the weighted moments of x and y."""
+    if d == 0:
+        return t0 / s0
+    return (s2 * t0 - s1 * t1) / (s0 * s2 - s1 * s1)
+
+
+@numba.njit
+def _window_fit(x, y, w, xi, d):  # pragma: no cover
+    """Weighted regression of y on x, evaluated at xi."""
+    s0 = s1 = s2 = t0 = t1 = 0.0
+    for j in range(x.size):
+        xd = x[j] - xi
+        s0 += w[j]
+        s1 += w[j] * xd
+        s2 += w[j] * xd * xd
+        t0 += w[j] * y[j]
+        t1 += w[j] * y[j] * xd
+    return _weighted_fit(s0, s1, s2, t0, t1, d)
+
+
+@numba.njit
+def _half_moments(z, i, lo, hi, s, M):  # pragma: no cover
+    """
+    Compute the moments of z on each side of i, in a window going from lo to hi (excluded).
+
+    The right half ([i, hi[) is stored in M[0] and the left half ([lo, i[) in M[1], the k-th moment being the
+    sum of z times ``(abs(j - i) / s) ** k``.
+    """
+    M[:] = 0
+    for j in range(lo, hi):
+        v = abs(j - i) / s
+        side = 0 if j >= i else 1
+        vk = 1.0
+        for k in range(M.shape[1]):
+            M[side, k] += z[j] * vk
+            vk *= v
+
+
+@numba.njit
+def _shift_moments(z, i, s, add, drop, B, M, tmp):  # pragma: no cover
+    """
+    Shift the moments of :py:func:`_half_moments` from the center i - 1 to the center i.
+
+    Point i - 1 goes from the right to the left half. If above -1, point `add` is added to the right half and
+    point `drop` is removed from the left half. `B` are the binomial coefficients of the shift of 1 / s.
+    """
+    nmom = M.shape[1]
+    tmp[:] = M[0]
+    tmp[0] -= z[i - 1]
+    for k in range(nmom):
+        acc = 0.0
+        neg = 1.0
+        for m in range(k, -1, -1):
+            acc += B[k, m] * neg * tmp[m]
+            neg = -neg
+        M[0, k] = acc
+    tmp[:] = M[1]
+    tmp[0] += z[i - 1]
+    for k in range(nmom):
+        acc = 0.0
+        for m in range(k + 1):
+            acc += B[k, m] * tmp[m]
+        M[1, k] = acc
+    if add >= 0:
+        v = (add - i) / s
+        vk = 1.0
+        for k in range(nmom):
+            M[0, k] += z[add] * vk
+            vk *= v
+    if drop >= 0:
+        v = (i - drop) / s
+        vk = 1.0
+        for k in range(nmom):
+            M[1, k] -= z[drop] * vk
+            vk *= v
+
+
+@numba.njit
+def _tricube_fit(Mw, My, g, d):  # pragma: no cover
+    """
+    Weighted regression with the tricube kernel, from the moments of the weights and the weighted values.
+
+    The moments are computed with a scale s and the kernel has a half width of h = s / g.
+    """
+    s0 = s1 = s2 = t0 = t1 = 0.0
+    gk = 1.0
+    for k in range(_TRICUBE_COEFFS.size):
+        c = _TRICUBE_COEFFS[k] * gk
+        if c != 0:
+            s0 += c * (Mw[0, k] + Mw[1, k])
+            s1 += c * g * (Mw[0, k + 1] - Mw[1, k + 1])
+            s2 += c * g * g * (Mw[0, k + 2] + Mw[1, k + 2])
+            t0 += c * (My[0, k] + My[1, k])
+            t1 += c * g * (My[0, k + 1] - My[1, k + 1])
+        gk *= g
+    return _weighted_fit(s0, s1, s2, t0, t1, d)
+
+
+@numba.njit
+def _binomial_shift(nmom, a):  # pragma: no cover
+    """Compute the coefficients such that (v + a) ** k = sum_m B[k, m] * v ** m."""
+    B = np.zeros((nmom, nmom))
+    for k in range(nmom):
+        c = 1.0
+        for m in range(k, -1, -1):
+            B[k, m] = c * a ** (k - m)
+            c = c * m / (k - m + 1)
+    return B
+
+
+@numba.njit
+def _tricube_edge(w, wy, r, m, d, yest, step):  # pragma: no cover
+    """
+    Tricube LOESS of the first m points, where the kernel extends to the r-th point.
+
+    The kernel of point i has a half width of r - i. The moments are computed with a scale of r, the left half
+    grows and the right half shrinks as i increases. If step is -1, the arrays are read and written in reverse,
+    which gives the last m points.
+    """
+    n = w.size
+    if step == -1:
+        w = w[::-1]
+        wy = wy[::-1]
+    hi = min(r, n)
+    B = _binomial_shift(_NMOM, 1 / r)
+    Mw = np.zeros((2, _NMOM))
+    My = np.zeros((2, _NMOM))
+    tmp = np.zeros(_NMOM)
+    resync = max(r // 8, 1)
+    for i in range(m):
+        if i % resync == 0:
+            _half_moments(w, i, 0, hi, r, Mw)
+            _half_moments(wy, i, 0, hi, r, My)
+        else:
+            _shift_moments(w, i, r, -1, -1, B, Mw, tmp)
+            _shift_moments(wy, i, r, -1, -1, B, My, tmp)
+        out = _tricube_fit(Mw, My, r / (r - i), d)
+        if step == -1:
+            yest[n - 1 - i] = out
+        else:
+            yest[i] = out
+
+
+@numba.njit
+def _tricube_interior(w, wy, h, start, stop, d, yest):  # pragma: no cover
+    """Tricube LOESS of the points from start to stop (excluded), with a kernel of half width h."""
+    B = _binomial_shift(_NMOM, 1 / h)
+    Mw = np.zeros((2, _NMOM))
+    My = np.zeros((2, _NMOM))
+    tmp = np.zeros(_NMOM)
+    resync = max(h // 4, 1)
+    for i in range(start, stop):
+        if (i - start) % resync == 0:
+            _half_moments(w, i, i - h + 1, i + h, h, Mw)
+            _half_moments(wy, i, i - h + 1, i + h, h, My)
+        else:
+            _shift_moments(w, i, h, i + h - 1, i - h, B, Mw, tmp)
+            _shift_moments(wy, i, h, i + h - 1, i - h, B, My, tmp)
+        yest[i] = _tricube_fit(Mw, My, 1.0, d)
+
+
+@numba.njit
+def _loess_equal_1d(
+    x, y, f, niter, weight_func, kernel, d, dx, tricube, skipna
+):  # pragma: no cover
+    """
+    LOESS of a single series with equally spaced x coordinates.
+
+    Same as :py:func:`_loess_nb` with `dx > 0`, but the interior weights are computed only once.
+
+    With the tricube kernel, the weights are a polynomial of the distance on each side of the point. The
+    weighted sums are then combinations of the moments of each half window, which are updated incrementally
+    from one point to the next, in constant time. They are recomputed from scratch at regular intervals, which
+    prevents the accumulation of rounding errors.
+    """
+    out = np.full(x.size, np.nan)
+    if skipna:
+        nan = np.isnan(y)
+        y = y[~nan]
+        x = x[~nan]
+        if x.size == 0:
+            return out
+        # The incremental moments assume that there is no gap in the series.
+        tricube = tricube and not nan.any()
+
+    n = x.size
+    yest = np.zeros(n)
+    delta = np.ones(n)
+
+    # Same windows as _loess_nb
+    r = int(2 * (f * n // 2) + 1)
+    hw = int((r - 1) / 2)
+    R = min(r + 4, n)
+    HW = hw + 2
+    # Distance, in number of points, at which the interior weights fall to 0.
+    h = hw + 1
+    # For small windows, computing the sums directly is faster.
+    tricube = tricube and h >= 16
+
+    if not tricube and HW <= n - HW - 1:
+        # The weights of all interior points
+        weights = _weighting(
+            weight_func, kernel, np.abs(x[: 2 * HW + 1] - x[HW]) / (h * dx)
+        )
+
+    for iteration in range(niter):
+        if tricube:
+            dy = delta * y
+            # Both edges, the left one has the precedence if they overlap
+            _tricube_edge(delta, dy, r, min(hw, n), d, yest, 1)
+            _tricube_edge(delta, dy, r, min(hw, n - hw), d, yest, -1)
+            _tricube_interior(delta, dy, h, hw, n - hw, d, yest)
+        else:
+            for i in range(n):
+                if HW <= i < n - HW:
+                    # Interior, the weights have the same shape
+                    w = weights * delta[i - HW : i + HW + 1]
+                    yest[i] = _window_fit(
+                        x[i - HW : i + HW + 1], y[i - HW : i + HW + 1], w, x[i], d
+                    )
+                    continue
+                # Near the edges, the weights change shape
+                if i < HW:
+                    start, stop = 0, R
+                else:
+                    start, stop = n - R, n
+                if i < hw:
+                    hi = (r - i) * dx
+                elif i >= n - hw:
+                    hi = (i - (n - r) + 1) * dx
+                else:
+                    hi = h * dx
+                w = delta[start:stop] * _weighting(
+                    weight_func, kernel, np.abs(x[start:stop] - x[i]) / hi
+                )
+                yest[i] = _window_fit(x[start:stop], y[start:stop], w, x[i], d)
+
+        if iteration < niter - 1:
+            residuals = y - yest
+            s = np.median(np.abs(residuals))
+            xres = residuals / (6.0 * s)
+            delta = (1 - xres**2) ** 2
+            delta[np.abs(xres) >= 1] = 0
+
+    if skipna:
+        out[~nan] = yest
+        return out
+    return yest
+
+
+@numba.njit
+def _unequal_windows(x, f):  # pragma: no cover
+    """
+    Compute the windows and kernel half widths of :py:func:`_loess_nb` with unequally spaced x coordinates.
+
+    These only depend on x, they can be shared by all series with the same coordinates and no missing values.
+
+    Returns
+    -------
+    start : np.ndarray
+        Index of the first point of the window of each point.
+    stop : np.ndarray
+        Index after the last point of the window of each point.
+    h : np.ndarray
+        Distance of the rth closest point of each point.
+    """
+    n = x.size
+    r = int(np.round(f * n))
+    # With unequal spacing, the rth closest point could be up to r points on either size.
+    HW = min(r + 2, n)
+    R = min(2 * HW, n)
+    start = np.empty(n, dtype=np.int64)
+    stop = np.empty(n, dtype=np.int64)
+    h = np.empty(n)
+    for i in range(n):
+        if i < HW:
+            start[i], stop[i] = 0, R
+        elif i >= n - HW - 1:
+            start[i], stop[i] = n - R, n
+        else:
+            start[i], stop[i] = i - HW, i + HW + 1
+        h[i] = np.sort(np.abs(x[start[i] : stop[i]] - x[i]))[r]
+    return start, stop, h
+
+
+@numba.njit
+def _loess_unequal_1d(
+    x, y, f, niter, weight_func, kernel, d, skipna, start, stop, h
+):  # pragma: no cover
+    """
+    LOESS of a single series, with the windows of :py:func:`_unequal_windows`.
+
+    Same as :py:func:`_loess_nb` with `dx = 0`. The windows are recomputed if the series has missing values.
+    """
+    out = np.full(x.size, np.nan)
+    if skipna:
+        nan = np.isnan(y)
+        if nan.any():
+            y = y[~nan]
+            x = x[~nan]
+            if x.size == 0:
+                return out
+            start, stop, h = _unequal_windows(x, f)
+
+    n = x.size
+    yest = np.zeros(n)
+    delta = np.ones(n)
+
+    for iteration in range(niter):
+        for i in range(n):
+            s, e = start[i], stop[i]
+            # The weights will be 0 everywhere diffs > h.
+            w = delta[s:e] * _weighting(
+                weight_func, kernel, np.abs(x[s:e] - x[i]) / h[i]
+            )
+            yest[i] = _window_fit(x[s:e], y[s:e], w, x[i], d)
+
+        if iteration < niter - 1:
+            residuals = y - yest
+            s = np.median(np.abs(residuals))
+            xres = residuals / (6.0 * s)
+            delta = (1 - xres**2) ** 2
+            delta[np.abs(xres) >= 1] = 0
+
+    if skipna:
+        out[~nan] = yest
+        return out
+    return yest
+
+
+def _loess_2d(
+    x,
+    y,
+    f=0.5,
+    niter=2,
+    weight_func=None,
+    kernel=TRICUBE,
+    d=1,
+    dx=0,
+    tricube=False,
+    skipna=True,
+):  # pragma: no cover
+    """
+    Locally weighted regression of a batch of series sharing the same x coordinates.
+
+    Same as :py:func:`_loess_nb`, but all series are processed in a single call. The windows and weights
+    derived from `x` are computed only once. Compiled as :py:func:`_loess_2d_nb`, which processes the series in
+    parallel, and :py:func:`_loess_2d_serial_nb`.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        X-coordinates of the points, 1D.
+    y : np.ndarray
+        Y-coordinates of the points, 2D (npoints, ntime), the last axis is the same as `x`.
+    f : float
+        Parameter controlling the shape of the weight curve. Behavior depends on the weighting function.
+    niter : int
+        Number of robustness iterations to execute.
+    weight_func : numba func, optional
+        Numba function giving the weights when passed abs(x - xi) / hi. If None, the builtin function of code `kernel`.
+    kernel : {TRICUBE, GAUSSIAN}
+        Code of the builtin weighting function, used if `weight_func` is None.
+    d : {0, 1}
+        Degree of the local regression.
+    dx : float
+        The spacing of the x coordinates. If above 0, this enables the optimization for equally spaced x coordinates.
+        Must be 0 if spacing is unequal (default).
+    tricube : bool
+        Whether the weights are those of the tricube kernel, which enables the incremental computation of the weighted sums
+        with equally spaced x coordinates.
+    skipna : bool
+        If True (default), remove NaN values before computing the loess. The output has the
+        same missing values as the input.
+
+    Returns
+    -------
+    np.ndarray
+        The smoothed series, same shape as `y`.
+    """
+    out = np.empty_like(y)
+    if dx > 0:
+        for b in numba.prange(y.shape[0]):
+            out[b] = _loess_equal_1d(
+                x, y[b], f, niter, weight_func, kernel, d, dx, tricube, skipna
+            )
+    else:
+        start, stop, h = _unequal_windows(x, f)
+        for b in numba.prange(y.shape[0]):
+            out[b] = _loess_unequal_1d(
+                x, y[b], f, niter, weight_func, kernel, d, skipna, start, stop, h
+            )
+    return out
+
+
+_loess_2d_nb = numba.njit(parallel=True)(_loess_2d)
+# Dask already processes the chunks in parallel threads, from which numba's parallel kernels should not be launched.
+_loess_2d_serial_nb = numba.njit(_serial_twin(_loess_2d))
+
+
+def _loess_batch(x, y, parallel=True, **kwargs):
+    """Apply :py:func:`_loess_2d_nb` on an array with any number of leading dimensions."""
+    shape = y.shape
+    func = _loess_2d_nb if parallel else _loess_2d_serial_nb
+    out = func(
+        x.ravel().astype(float), y.reshape(-1, shape[-1]).astype(float), **kwargs
+    )
+    return out.reshape(shape)
+
+
 def loess_smoothing(
     da: xr.DataArray,
     dim: str = "time",
@@ -233,6 +670,12 @@ def loess_smoothing(
     function going from 1 to 0 to 1 around :math:`x_i`, for all values where :math:`x - x_i < h_i` with
     :math:`h_i` the distance of the rth nearest neighbor of  :math:`x_i`, :math:`r = f * size(x)`.
 
+    All series are processed in a single compiled call, in parallel, and what only depends on the x-coordinates
+    is computed once : the windows of each point or, with the equal spacing optimization, the weights of the points
+    away from the edges. With equal spacing and the "tricube" weights, the weighted sums of each point are moreover
+    updated from those of the previous point, so the cost no longer depends on `f`. This incremental update requires
+    series without missing values, series with NaNs are processed point by point.
+
     References
     ----------
     :cite:cts:`cleveland_robust_1979`
@@ -242,11 +685,14 @@ def loess_smoothing(
     x = da[dim]
     x = ((x - x[0]) / (x[-1] - x[0])).astype(float)
 
-    weight_func = {"tricube": _tricube_weighting, "gaussian": _gaussian_weighting}.get(
-        weights, weights
-    )
+    # Builtin weighting functions are given by their code
+    if isinstance(weights, str):
+        kernel, weight_func = {"tricube": TRICUBE, "gaussian": GAUSSIAN}[weights], None
+    else:
+        kernel, weight_func = TRICUBE, weights
 
-    reg_func = {0: _constant_regression, 1: _linear_regression}[d]
+    if d not in [0, 1]:
+        raise ValueError(f"The degree of the local regression must be 0 or 1, got {d}.")
 
     diffx = np.diff(da[dim])
     if np.all(diffx == diffx[0]):
@@ -262,18 +708,20 @@ def loess_smoothing(
         dx = 0
 
     return xr.apply_ufunc(
-        _loess_nb,
+        _loess_batch,
         x,
         da,
         input_core_dims=[[dim], [dim]],
         output_core_dims=[[dim]],
-        vectorize=True,
         kwargs={
+            "parallel": not uses_dask(da),
             "f": f,
             "weight_func": weight_func,
+            "kernel": kernel,
             "niter": niter,
-            "reg_func": reg_func,
+            "d": d,
             "dx": dx,
+            "tricube": weights == "tricube",
             "skipna": skipna,
         },
         dask="parallelized",
@@ -7,13 +7,27 @@ Numba-accelerated Utilities
 
 from __future__ import annotations
 
+import types
 from collections.abc import Hashable, Sequence
 
+import dask
+import dask.array as dsk
 import numpy as np
-from numba import boolean, float32, float64, guvectorize, njit
+from numba import (
+    boolean,
+    float32,
+    float64,
+    get_num_threads,
+    guvectorize,
+    int64,
+    njit,
+    prange,
+)
 from xarray import DataArray, apply_ufunc
 from xarray.core import utils
 
+from xsdba.profiling import profiled
+
 try:
     from fastnanquantile.xrcompat import xr_apply_nanquantile
 
@@ -129,32 +143,197 @@ def _nan_quantile_1d(
     By default, `alpha == beta == 1` which performs the 7th method of :cite:t:`hyndman_sample_1996`.
     with `alpha == beta == 1/3` we get the 8th method. alpha == beta == 1 reproduces the behaviour of `np.nanquantile`.
     """
+    # Sorting
+    arr.sort()
+    return _nan_quantile_sorted_1d(arr, quantiles, alpha, beta)
+
+
+@njit(
+    fastmath={"arcp", "contract", "reassoc", "nsz", "afn"},
+    nogil=True,
+    cache=False,
+)
+def _nan_quantile_sorted_1d(
+    arr: np.array,
+    quantiles: np.array,
+    alpha: float = 1.0,
+    beta: float = 1.0,
+) -> float | np.array:
+    """
+    Get the quantiles of the sorted 1-dimensional array.
+
+    Same as `_nan_quantile_1d`, but the array must already be sorted, with NaNs at the end.
+    """
     # We need at least two values to do an interpolation
     valid_values_count = (~np.isnan(arr)).sum()
 
     # Computation of indexes
-    virtual_indexes = (
-        valid_values_count * quantiles + (alpha + quantiles * (1 - alpha - beta)) - 1
-    )
-    virtual_indexes = np.asarray(virtual_indexes)
+    virtual_indexes = _virtual_indexes(valid_values_count, quantiles, alpha, beta)
     previous_indexes, next_indexes = _get_indexes(
         arr, virtual_indexes, valid_values_count
     )
-    # Sorting
-    arr.sort()
 
-    previous = arr[previous_indexes]
-    next_elements = arr[next_indexes]
+    return _interpolate_quantiles(
+        arr[previous_indexes],
+        arr[next_indexes],
+        virtual_indexes,
+        previous_indexes,
+        arr[np.intp(valid_values_count) - 1],
+    )
+
+
+@njit(
+    fastmath={"arcp", "contract", "reassoc", "nsz", "afn"},
+    nogil=True,
+    cache=False,
+)
+def _virtual_indexes(
+    valid_values_count: int, quantiles: np.array, alpha: float, beta: float
+) -> np.array:
+    """Get the positions of the quantiles among the sorted valid values, as in `_nan_quantile_sorted_1d`."""
+    return np.asarray(
+        valid_values_count * quantiles + (alpha + quantiles * (1 - alpha - beta)) - 1
+    )
+
+
+@njit(
+    fastmath={"arcp", "contract", "reassoc", "nsz", "afn"},
+    nogil=True,
+    cache=False,
+)
+def _interpolate_quantiles(
+    previous: np.array,
+    next_elements: np.array,
+    virtual_indexes: np.array,
+    previous_indexes: np.array,
+    max_value: float,
+) -> np.array:
+    """
+    Interpolate the quantiles between the sorted values found at the indexes given by `_get_indexes`.
 
+    This is the final step of `_nan_quantile_sorted_1d`.
+    """
     # Linear interpolation
-    gamma = np.asarray(virtual_indexes - previous_indexes, dtype=arr.dtype)
+    gamma = np.asarray(virtual_indexes - previous_indexes, dtype=previous.dtype)
     interpolation = _linear_interpolation(previous, next_elements, gamma)
     # When an interpolation is in Nan range, (near the end of the sorted array) it means
     # we can clip to the array max value.
-    result = np.where(
-        np.isnan(interpolation), arr[np.intp(valid_values_count) - 1], interpolation
+    return np.where(np.isnan(interpolation), max_value, interpolation)
+
+
+@njit(nogil=True, cache=False)
+def _push_segment(stack, index, lo, hi, rlo, rhi, depth):
+    stack[index, 0] = lo
+    stack[index, 1] = hi
+    stack[index, 2] = rlo
+    stack[index, 3] = rhi
+    stack[index, 4] = depth
+
+
+@njit(nogil=True, cache=False)
+def _multi_select(arr: np.array, ranks: np.array) -> None:
+    """
+    Partially sort `arr` in-place, so that the elements at the sorted positions `ranks` are those of the sorted array.
+
+    The segments of `arr` holding at least one of the ranks are partitioned around a median-of-three pivot, as in a
+    quickselect applied to all ranks at once. Segments that are too small or too deep are sorted.
+
+    Parameters
+    ----------
+    arr : array-like
+        The values to partition, without NaNs.
+    ranks : array-like
+        The sorted and unique positions to select, between 0 and `arr.size - 1`.
+    """
+    n = arr.size
+    max_depth = 2 * np.intp(np.log2(n + 1)) + 2
+    # Segments left to partition : start, stop, first rank, last rank + 1, depth
+    stack = np.empty((max_depth + 2, 5), dtype=np.intp)
+    stack[0, :] = 0
+    stack[0, 1] = n
+    stack[0, 3] = ranks.size
+    nstack = 1 if ranks.size > 0 else 0
+    while nstack > 0:
+        nstack -= 1
+        lo, hi = stack[nstack, 0], stack[nstack, 1]
+        rlo, rhi, depth = stack[nstack, 2], stack[nstack, 3], stack[nstack, 4]
+        if hi - lo <= 16 or depth >= max_depth:
+            arr[lo:hi].sort()
+            continue
+        a, b, c = arr[lo], arr[(lo + hi) // 2], arr[hi - 1]
+        if a < b:
+            pivot = b if b < c else (c if a < c else a)
+        else:
+            pivot = a if a < c else (c if b < c else b)
+        # Three-way partition : [lo, lt) < pivot, [lt, gt) == pivot, [gt, hi) > pivot
+        lt, i, gt = lo, lo, hi
+        while i < gt:
+            val = arr[i]
+            if val < pivot:
+                arr[i] = arr[lt]
+                arr[lt] = val
+                lt += 1
+                i += 1
+            elif val > pivot:
+                gt -= 1
+                arr[i] = arr[gt]
+                arr[gt] = val
+            else:
+                i += 1
+        rmid = rlo + np.searchsorted(ranks[rlo:rhi], lt)
+        rhigh = rlo + np.searchsorted(ranks[rlo:rhi], gt)
+        if rhigh < rhi:
+            _push_segment(stack, nstack, gt, hi, rhigh, rhi, depth + 1)
+            nstack += 1
+        if rlo < rmid:
+            _push_segment(stack, nstack, lo, lt, rlo, rmid, depth + 1)
+            nstack += 1
+
+
+@njit(nogil=True, cache=False)
+def _nan_quantile_select_1d(
+    arr: np.array,
+    quantiles: np.array,
+    buf: np.array,
+    alpha: float = 1.0,
+    beta: float = 1.0,
+) -> float | np.array:
+    """
+    Get the quantiles of the 1-dimensional array, using a selection instead of a sort.
+
+    Same as `_nan_quantile_1d`, but `arr` is left untouched : the values are copied to the scratch buffer `buf`,
+    which must be at least as long as `arr`, and only the sorted values needed by the interpolation are selected.
+    This is in O(n log q) instead of O(n log n) for n values and q quantiles.
+    """
+    n = arr.size
+    work = buf[:n]
+    # Valid values first, NaNs at the end, as after a sort
+    valid_values_count = 0
+    for i in range(n):
+        if not np.isnan(arr[i]):
+            work[valid_values_count] = arr[i]
+            valid_values_count += 1
+    work[valid_values_count:] = np.nan
+
+    virtual_indexes = _virtual_indexes(valid_values_count, quantiles, alpha, beta)
+    previous_indexes, next_indexes = _get_indexes(
+        work, virtual_indexes, valid_values_count
+    )
+    if valid_values_count > 0:
+        # The maximum is needed for the last index (-1) and the clipping of the interpolation
+        ranks = np.concatenate(
+            (previous_indexes, next_indexes, np.array([-1], dtype=np.intp))
+        )
+        ranks = np.unique(np.where(ranks < 0, valid_values_count - 1, ranks))
+        _multi_select(work[:valid_values_count], ranks)
+
+    return _interpolate_quantiles(
+        work[previous_indexes],
+        work[next_indexes],
+        virtual_indexes,
+        previous_indexes,
+        work[np.intp(valid_values_count) - 1],
     )
-    return result
 
 
 @guvectorize(
@@ -206,33 +385,513 @@ def vecquantiles(
     return res
 
 
-@njit
-def _wrapper_quantile1d(arr, q):
-    out = np.empty((arr.shape[0], q.size), dtype=arr.dtype)
-    for index in range(out.shape[0]):
-        out[index] = _nan_quantile_1d(arr[index], q)
+def _serial_twin(func):
+    """
+    Copy of `func` to be compiled without `parallel=True`.
+
+    The file of numba's on-disk cache is named after the function and its key doesn't include the compilation flags,
+    so the serial and parallel versions of a kernel must be compiled from different functions.
+    """
+    twin = types.FunctionType(
+        func.__code__, func.__globals__, f"{func.__name__}_serial", func.__defaults__
+    )
+    twin.__qualname__ = f"{func.__qualname__}_serial"
+    twin.__doc__ = func.__doc__
+    return twin
+
+
+def _quantile_2d(arr, q, nblocks):  # pragma: no cover
+    """
+    Compute the quantiles of each row of a 2D array, which can have any strides.
+
+    The rows are split in `nblocks` blocks, usually one per thread, each block using a single scratch buffer. Compiled as
+    :py:func:`_wrapper_quantile1d`, which processes the blocks in parallel, and :py:func:`_wrapper_quantile1d_serial`.
+    """
+    nrows = arr.shape[0]
+    out = np.empty((nrows, q.size), dtype=arr.dtype)
+    nblocks = min(nblocks, nrows)
+    for block in prange(nblocks):
+        buf = np.empty(arr.shape[1], dtype=arr.dtype)
+        for index in range(block * nrows // nblocks, (block + 1) * nrows // nblocks):
+            out[index] = _nan_quantile_select_1d(arr[index], q, buf)
     return out
 
 
-def _quantile(arr, q, nreduce=None):
+_wrapper_quantile1d = njit(parallel=True, nogil=True, cache=False)(_quantile_2d)
+# Dask already processes the chunks in parallel threads, from which numba's parallel kernels should not be launched.
+_wrapper_quantile1d_serial = njit(nogil=True, cache=False)(_serial_twin(_quantile_2d))
+
+
+def _merged_stride(shape, strides):
+    """Stride of the flattened dimensions, None if they can't be flattened without a copy."""
+    dims = [(n, st) for n, st in zip(shape, strides, strict=True) if n != 1]
+    for (_, st), (n_next, st_next) in zip(dims[:-1], dims[1:], strict=True):
+        if st != n_next * st_next:
+            return None
+    return dims[-1][1] if dims else 0
+
+
+def _as_2d(arr, nreduce):
+    """View of `arr` as (kept dimensions, reduced dimensions), only copied if one of the two can't be flattened."""
+    keep_shape = arr.shape[: arr.ndim - nreduce]
+    shape = (int(np.prod(keep_shape)), int(np.prod(arr.shape[arr.ndim - nreduce :])))
+    strides = (
+        _merged_stride(keep_shape, arr.strides[: arr.ndim - nreduce]),
+        _merged_stride(
+            arr.shape[arr.ndim - nreduce :], arr.strides[arr.ndim - nreduce :]
+        ),
+    )
+    if None in strides or 0 in shape:
+        return np.ascontiguousarray(arr).reshape(shape), keep_shape
+    return (
+        np.lib.stride_tricks.as_strided(arr, shape, strides, writeable=False),
+        keep_shape,
+    )
+
+
+def _quantile(arr, q, nreduce=None, parallel=False):
     nreduce = nreduce or arr.ndim
-    if arr.ndim == nreduce:
-        out = _nan_quantile_1d(arr.flatten(), q)
+    # reshape as (keep_dims, red_dims), without copying the data, compute, reshape back
+    arr, keep_shape = _as_2d(arr, nreduce)
+    if parallel:
+        out = _wrapper_quantile1d(arr, q, get_num_threads())
+    else:
+        out = _wrapper_quantile1d_serial(arr, q, 1)
+    return out.reshape(keep_shape + (q.size,))
+
+
+# Number of values of each target rank gathered by `_chunked_quantile`, the histograms being refined until then.
+_QUANTILE_GATHER_SIZE = 16
+# Number of bits of the keys found by each refinement of `_chunked_quantile`, each histogram has 2**bits bins.
+_QUANTILE_DIGIT_BITS = 4
+
+
+def _sortable_keys(arr):
+    """Map floats to unsigned integers sorted in the same order, the keys of NaNs are meaningless."""
+    if arr.dtype == np.float32:
+        bits = arr.view(np.uint32).astype(np.uint64)
+        sign, mask = np.uint64(1 << 31), np.uint64((1 << 32) - 1)
     else:
-        # dimensions that are reduced by quantile
-        red_axis = np.arange(len(arr.shape) - nreduce, len(arr.shape))
-        reduction_dim_size = np.prod([arr.shape[idx] for idx in red_axis])
-        # kept dimensions
-        keep_axis = np.arange(len(arr.shape) - nreduce)
-        final_shape = [arr.shape[idx] for idx in keep_axis] + [len(q)]
-        # reshape as (keep_dims, red_dims), compute, reshape back
-        arr = arr.reshape(-1, reduction_dim_size)
-        out = _wrapper_quantile1d(arr, q)
-        out = out.reshape(final_shape)
+        bits = arr.view(np.uint64)
+        sign, mask = np.uint64(1 << 63), np.uint64((1 << 64) - 1)
+    return np.where(bits & sign, ~bits & mask, bits | sign)
+
+
+def _keys_to_floats(keys, dtype):
+    """Inverse of `_sortable_keys`."""
+    if dtype == np.float32:
+        sign, mask, uint = np.uint64(1 << 31), np.uint64((1 << 32) - 1), np.uint32
+    else:
+        sign, mask, uint = np.uint64(1 << 63), np.uint64((1 << 64) - 1), np.uint64
+    return np.where(keys & sign, keys ^ sign, ~keys & mask).astype(uint).view(dtype)
+
+
+@njit(nogil=True, cache=False)
+def _quantile_ranks(counts, quantiles, dtype_arr):
+    """The indexes of the sorted values interpolated by `_nan_quantile_sorted_1d`, given the number of valid values."""
+    previous = np.empty((counts.size, quantiles.size), dtype=np.intp)
+    following = np.empty((counts.size, quantiles.size), dtype=np.intp)
+    for index in range(counts.size):
+        virtual_indexes = _virtual_indexes(counts[index], quantiles, 1.0, 1.0)
+        previous[index], following[index] = _get_indexes(
+            dtype_arr, virtual_indexes, counts[index]
+        )
+    return previous, following
+
+
+@njit(nogil=True, cache=False)
+def _quantile_from_ranks(previous, following, counts, max_values, quantiles):
+    """Same as `_nan_quantile_sorted_1d`, from the sorted values at the indexes given by `_quantile_ranks`."""
+    out = np.full((counts.size, quantiles.size), np.nan, dtype=previous.dtype)
+    for index in range(counts.size):
+        if counts[index] == 0:
+            continue
+        virtual_indexes = _virtual_indexes(counts[index], quantiles, 1.0, 1.0)
+        previous_indexes, _ = _get_indexes(
+            previous[index], virtual_indexes, counts[index]
+        )
+        out[index] = _interpolate_quantiles(
+            previous[index],
+            following[index],
+            virtual_indexes,
+            previous_indexes,
+            max_values[index],
+        )
     return out
 
 
-def quantile(da: DataArray, q: np.ndarray, dim: str | Sequence[Hashable]) -> DataArray:
+@njit(nogil=True, cache=False)
+def _unique_prefixes(prefix):
+    """Sorted unique values of `prefix` and the position of each element among them."""
+    order = np.argsort(prefix)
+    unique = np.empty(prefix.size, dtype=prefix.dtype)
+    position = np.empty(prefix.size, dtype=np.intp)
+    nunique = 0
+    for i in order:
+        if nunique == 0 or prefix[i] != unique[nunique - 1]:
+            unique[nunique] = prefix[i]
+            nunique += 1
+        position[i] = nunique - 1
+    return unique[:nunique], position
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_key_histogram(high, digits, valid, prefix, nbins, out):
+    npts, ntargets = prefix.shape
+    for index in range(npts):
+        # Targets sharing a prefix share the same histogram
+        unique, position = _unique_prefixes(prefix[index])
+        hist = np.zeros((unique.size, nbins), dtype=out.dtype)
+        for i in range(high.shape[1]):
+            if valid[index, i]:
+                j = np.searchsorted(unique, high[index, i])
+                if j < unique.size and unique[j] == high[index, i]:
+                    hist[j, digits[index, i]] += 1
+        for it in range(ntargets):
+            out[index, it] = hist[position[it]]
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_key_gather(high, keys, valid, gather, prefix, size):
+    npts, ntargets = prefix.shape
+    # The last value is the smallest key above the prefix
+    out = np.full((npts, ntargets, size + 1), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for index in range(npts):
+        unique, position = _unique_prefixes(prefix[index])
+        gathered = np.full((unique.size, size + 1), np.iinfo(np.uint64).max, np.uint64)
+        counts = np.zeros(unique.size, dtype=np.intp)
+        for i in range(high.shape[1]):
+            if valid[index, i]:
+                # Number of prefixes below the key
+                j = np.searchsorted(unique, high[index, i])
+                if gather[index] and j < unique.size and unique[j] == high[index, i]:
+                    gathered[j, counts[j]] = keys[index, i]
+                    counts[j] += 1
+                if j > 0:
+                    gathered[j - 1, size] = min(gathered[j - 1, size], keys[index, i])
+        for j in range(unique.size - 2, -1, -1):
+            gathered[j, size] = min(gathered[j, size], gathered[j + 1, size])
+        for it in range(ntargets):
+            out[index, it] = gathered[position[it]]
+    return out
+
+
+def _bit_length(x):
+    """Compute the number of bits of the unsigned integers of `x`."""
+    shifts = np.arange(64, dtype=np.uint64)
+    return ((x[..., np.newaxis] >> shifts) > 0).sum(axis=-1).astype(np.uint64)
+
+
+def _block_ranks(counts, q, kind):
+    """
+    Get the ranks of the lower sorted values interpolated for the quantiles, given the number of valid values.
+
+    The upper value is the same or the next one, the latter is not refined on its own but found from the gathered keys.
+    """
+    previous, _ = _quantile_ranks(counts.ravel(), q, np.empty(0, dtype=kind))
+    ranks = np.where(previous < 0, counts.reshape(-1, 1) - 1, previous).clip(0)
+    return ranks.reshape(counts.shape + (-1,))
+
+
+def _block_steps(counts, q, kind):
+    """Check whether the upper sorted value interpolated for each quantile is the next one, rather than the same."""
+    previous, following = _quantile_ranks(counts.ravel(), q, np.empty(0, dtype=kind))
+    return (following != previous).reshape(counts.shape + (-1,))
+
+
+def _block_state(counts, ntargets):
+    """
+    Initialize the state of the refinement of each target rank.
+
+    The last axis holds the known bits of the key at the rank (its prefix), the number of values below the
+    candidates sharing this prefix and the number of these candidates.
+    """
+    state = np.zeros(counts.shape + (ntargets, 3), dtype=np.uint64)
+    state[..., 2] = counts[..., np.newaxis]
+    return state
+
+
+def _series_active(unknown, state):
+    """Check which series still have target ranks with too many candidates to be gathered."""
+    return (unknown > 0) & (state[..., 2] > _QUANTILE_GATHER_SIZE).any(axis=-1)
+
+
+def _block_keys(block, kmin, unknown):
+    """Get the keys of a block as (series, values), with their bits above `unknown`, counted from `kmin`."""
+    block = block.reshape(kmin.size, -1)
+    keys = _sortable_keys(block)
+    high = (keys - kmin.reshape(-1, 1)) >> unknown.reshape(-1, 1)
+    return keys, high, ~np.isnan(block)
+
+
+def _block_histogram(block, kmin, unknown, state, count_dtype):
+    nbins, nreduce = 1 << _QUANTILE_DIGIT_BITS, block.ndim - kmin.ndim
+    prefix = state[..., 0].reshape(kmin.size, -1)
+    out = np.zeros(prefix.shape + (nbins,), dtype=count_dtype)
+    # Only the keys of the active series are computed and counted
+    active = _series_active(unknown, state).ravel()
+    if active.any():
+        kmin, unknown = kmin.ravel()[active], unknown.ravel()[active]
+        keys, high, valid = _block_keys(
+            block.reshape(active.size, -1)[active], kmin, unknown
+        )
+        width = np.minimum(unknown, _QUANTILE_DIGIT_BITS).reshape(-1, 1)
+        digits = (
+            ((keys - kmin.reshape(-1, 1)) >> (unknown.reshape(-1, 1) - width))
+            & ((np.uint64(1) << width) - np.uint64(1))
+        ).astype(np.intp)
+        hist = np.zeros((active.sum(),) + out.shape[1:], dtype=count_dtype)
+        _wrapper_key_histogram(high, digits, valid, prefix[active], nbins, hist)
+        out[active] = hist
+    return out.reshape(state.shape[:-1] + (nbins,) + (1,) * nreduce)
+
+
+def _block_unknown(unknown, state):
+    """Remove the bits found by a refinement from the unknown bits of the active series."""
+    width = np.minimum(unknown, _QUANTILE_DIGIT_BITS)
+    return np.where(_series_active(unknown, state), unknown - width, unknown)
+
+
+def _block_refine(hist, ranks, unknown, state):
+    """Find the next bits of the keys at the target ranks of the active series, from their global histograms."""
+    prefix, below = state[..., 0], state[..., 1].astype(np.int64)
+    width = np.minimum(unknown, _QUANTILE_DIGIT_BITS)[..., np.newaxis]
+    cum = hist.cumsum(axis=-1)
+    digits = (cum <= (ranks - below)[..., np.newaxis]).sum(axis=-1)
+    # Empty series have no bin
+    digits = np.minimum(digits, hist.shape[-1] - 1)[..., np.newaxis]
+    below = below + np.take_along_axis(cum - hist, digits, axis=-1)[..., 0]
+    candidates = np.take_along_axis(hist, digits, axis=-1)[..., 0]
+    prefix = (prefix << width) | digits[..., 0].astype(np.uint64)
+    # Stacked as unsigned integers, a float64 promotion of the mixed types would round the long prefixes
+    out = np.stack(
+        [prefix, below.astype(np.uint64), candidates.astype(np.uint64)], axis=-1
+    )
+    return np.where(
+        _series_active(unknown, state)[..., np.newaxis, np.newaxis], out, state
+    )
+
+
+def _block_gather(block, kmin, unknown, state, size):
+    keys, high, valid = _block_keys(block, kmin, unknown)
+    # The keys of series without unknown bits are already known, only the smallest keys above them are needed
+    out = _wrapper_key_gather(
+        high,
+        keys,
+        valid,
+        (unknown > 0).ravel(),
+        state[..., 0].reshape(kmin.size, -1),
+        size,
+    )
+    return out.reshape(state.shape[:-1] + (size + 1,) + (1,) * (block.ndim - kmin.ndim))
+
+
+def _keep_gathered(x, axis, keepdims):
+    """The gathered keys of a block are already reduced along the chunked axes."""
+    return x
+
+
+def _merge_gathered(x, axis, keepdims):
+    """Merge the gathered keys and the smallest keys above them of several blocks, the reduced axes being the last ones."""
+    size = x.shape[-len(axis) - 1] - 1
+    x = x.reshape(x.shape[: -len(axis)] + (-1,))
+    gathered = np.sort(x[..., :size, :].reshape(x.shape[:-2] + (-1,)), axis=-1)
+    out = np.concatenate([gathered[..., :size], x[..., size:, :].min(axis=-1)], axis=-1)
+    return out.reshape(out.shape + (1,) * len(axis)) if keepdims else out
+
+
+def _block_final(gathered, ranks, step, unknown, state, kmin, counts, max_values, q):
+    """
+    Compute the quantiles from the gathered sorted keys, or from the keys at the target ranks if all bits are known.
+
+    The upper value of a quantile is the next gathered key, or the smallest key above them if the lower value is the
+    last one sharing its prefix.
+    """
+    size = gathered.shape[-1] - 1
+    known = (unknown == 0)[..., np.newaxis]
+    position = ranks - state[..., 1].astype(np.int64)
+    lower = np.take_along_axis(
+        gathered, np.where(known, 0, position)[..., np.newaxis], axis=-1
+    )[..., 0]
+    lower = np.where(known, kmin[..., np.newaxis] + state[..., 0], lower)
+    following = np.take_along_axis(
+        gathered, np.minimum(position + 1, size - 1)[..., np.newaxis], axis=-1
+    )[..., 0]
+    following = np.where(known, lower, following)
+    upper = np.where(
+        position + 1 < state[..., 2].astype(np.int64), following, gathered[..., size]
+    )
+    upper = np.where(step, upper, lower)
+    dtype = max_values.dtype
+    out = _quantile_from_ranks(
+        _keys_to_floats(lower, dtype).reshape(counts.size, q.size),
+        _keys_to_floats(upper, dtype).reshape(counts.size, q.size),
+        counts.ravel(),
+        max_values.ravel(),
+        q,
+    )
+    return out.reshape(counts.shape + (q.size,))
+
+
+def _chunked_quantile(arr, q, nreduce):
+    """
+    Exact quantiles of a dask array along its `nreduce` last axes, which can be chunked.
+
+    The values are mapped to sortable integer keys. For each series, the ranks of the lower sorted values
+    interpolated by `_nan_quantile_sorted_1d` are found from the number of valid values. The bits of the keys at
+    these ranks are then found `_QUANTILE_DIGIT_BITS` at a time, from global histograms of the keys sharing the
+    bits already known, summed over the chunks. When there are no more than `_QUANTILE_GATHER_SIZE` candidates for
+    each rank, they are gathered and sorted to get the exact values, along with the smallest key above them, which
+    gives the upper values. All steps are lazy : the graph holds a fixed number of refinements, the series already
+    resolved being left out of the histograms of the later ones.
+    """
+    if arr.dtype not in [np.float32, np.float64]:
+        arr = arr.astype(np.float64)
+    nkeep = arr.ndim - nreduce
+    squeeze = nkeep == 0
+    if squeeze:
+        arr = arr[np.newaxis]
+        nkeep = 1
+    red = tuple(range(nkeep, arr.ndim))
+    kidx = tuple(f"k{i}" for i in range(nkeep))
+    ridx = tuple(f"r{i}" for i in range(nreduce))
+    state_idx = kidx + ("t", "s")
+    ntargets = q.size
+    # The counts of the histograms can not exceed the number of values of a series
+    count_dtype = np.int32 if np.prod(arr.shape[nkeep:]) < 2**31 else np.int64
+
+    valid = ~dsk.isnan(arr)
+    keys = arr.map_blocks(_sortable_keys, dtype=np.uint64)
+    counts = valid.sum(axis=red)
+    kmin = dsk.where(valid, keys, np.iinfo(np.uint64).max).min(axis=red)
+    kmin = dsk.where(counts > 0, kmin, np.uint64(0))
+    kmax = dsk.where(valid, keys, np.uint64(0)).max(axis=red)
+    max_values = kmax.map_blocks(_keys_to_floats, arr.dtype, dtype=arr.dtype)
+
+    ranks, steps = (
+        dsk.blockwise(
+            func,
+            kidx + ("t",),
+            counts,
+            kidx,
+            new_axes={"t": ntargets},
+            dtype=dtype,
+            q=q,
+            kind=arr.dtype,
+        )
+        for func, dtype in [(_block_ranks, np.intp), (_block_steps, bool)]
+    )
+    state = dsk.blockwise(
+        _block_state,
+        state_idx,
+        counts,
+        kidx,
+        new_axes={"t": ntargets, "s": 3},
+        dtype=np.uint64,
+        ntargets=ntargets,
+    )
+    # The bits of the keys, from the highest one in which the keys of a series differ
+    unknown = (kmax - kmin).map_blocks(_bit_length, dtype=np.uint64)
+    for _ in range(arr.dtype.itemsize * 8 // _QUANTILE_DIGIT_BITS):
+        hist = dsk.blockwise(
+            _block_histogram,
+            kidx + ("t", "b") + ridx,
+            arr,
+            kidx + ridx,
+            kmin,
+            kidx,
+            unknown,
+            kidx,
+            state,
+            state_idx,
+            new_axes={"b": 1 << _QUANTILE_DIGIT_BITS},
+            adjust_chunks={r: 1 for r in ridx},
+            concatenate=True,
+            dtype=count_dtype,
+            count_dtype=count_dtype,
+        )
+        hist = hist.sum(
+            axis=tuple(range(nkeep + 2, nkeep + 2 + nreduce)), dtype=count_dtype
+        )
+        args = (unknown, kidx, state, state_idx)
+        state, unknown = (
+            dsk.blockwise(
+                _block_refine,
+                state_idx,
+                hist,
+                kidx + ("t", "b"),
+                ranks,
+                kidx + ("t",),
+                *args,
+                concatenate=True,
+                dtype=np.uint64,
+            ),
+            dsk.blockwise(
+                _block_unknown, kidx, *args, concatenate=True, dtype=np.uint64
+            ),
+        )
+
+    gathered = dsk.blockwise(
+        _block_gather,
+        kidx + ("t", "m") + ridx,
+        arr,
+        kidx + ridx,
+        kmin,
+        kidx,
+        unknown,
+        kidx,
+        state,
+        state_idx,
+        new_axes={"m": _QUANTILE_GATHER_SIZE + 1},
+        adjust_chunks={r: 1 for r in ridx},
+        concatenate=True,
+        dtype=np.uint64,
+        size=_QUANTILE_GATHER_SIZE,
+    )
+    gathered = dsk.reduction(
+        gathered,
+        chunk=_keep_gathered,
+        combine=_merge_gathered,
+        aggregate=_merge_gathered,
+        axis=tuple(range(nkeep + 2, nkeep + 2 + nreduce)),
+        dtype=np.uint64,
+        concatenate=True,
+    )
+
+    out = dsk.blockwise(
+        _block_final,
+        kidx + ("q",),
+        gathered,
+        kidx + ("t", "m"),
+        ranks,
+        kidx + ("t",),
+        steps,
+        kidx + ("t",),
+        unknown,
+        kidx,
+        state,
+        state_idx,
+        kmin,
+        kidx,
+        counts,
+        kidx,
+        max_values,
+        kidx,
+        new_axes={"q": q.size},
+        concatenate=True,
+        dtype=arr.dtype,
+        q=q,
+    )
+    return out[0] if squeeze else out
+
+
+@profiled("quantile")
+def quantile(
+    da: DataArray,
+    q: np.ndarray,
+    dim: str | Sequence[Hashable],
+    parallel: bool | None = None,
+) -> DataArray:
     """
     Compute the quantiles from a fixed list `q`.
 
@@ -244,18 +903,53 @@ def quantile(da: DataArray, q: np.ndarray, dim: str | Sequence[Hashable]) -> Dat
         The quantiles to compute.
     dim : str or sequence of str
         The dimension along which to compute the quantiles.
+    parallel : bool, optional
+        Whether to process the series in parallel with `numba`. Ignored for `dask` arrays, whose chunks are
+        already processed in parallel. Defaults to True for other arrays.
 
     Returns
     -------
     xarray.DataArray
         The quantiles computed along the `dim` dimension.
+
+    Notes
+    -----
+    `dask` arrays can be chunked along `dim`. The quantiles are then computed exactly, without gathering the
+    series in one chunk, by a multi-pass algorithm : the bins of a histogram holding the sorted values needed
+    for each quantile are refined until they hold few enough values to be gathered. The computation is lazy,
+    with one refinement for each 4 bits of the values (8 for float32, 16 for float64), which skip the series
+    already resolved. Each chunk of `da` yields, for each series and quantile, a histogram of 16 bins and at most
+    17 gathered values. The results are the same as with a single chunk.
+
+    Every refinement reads the chunks of `da` again, so `dask` keeps them all in memory until the last one. If `da`
+    is the result of a computation, it should be persisted first (``da.persist()``), so that this memory is
+    explicit and can be spilled to disk by a distributed scheduler.
     """
     if USE_FASTNANQUANTILE is True:
         return xr_apply_nanquantile(da, dim=dim, q=q).rename({"quantile": "quantiles"})
 
     qc = np.array(q, dtype=da.dtype)
     dims = [dim] if isinstance(dim, str) else dim
-    kwargs = {"nreduce": len(dims), "q": qc}
+    if isinstance(da.data, dsk.Array) and any(
+        len(da.chunks[da.get_axis_num(d)]) > 1 for d in dims
+    ):
+        res = apply_ufunc(
+            _chunked_quantile,
+            da,
+            input_core_dims=[dims],
+            exclude_dims=set(dims),
+            output_core_dims=[["quantiles"]],
+            dask="allowed",
+            kwargs={"nreduce": len(dims), "q": qc},
+        )
+        return res.assign_coords(quantiles=q).assign_attrs(da.attrs)
+
+    kwargs = {
+        "nreduce": len(dims),
+        "q": qc,
+        "parallel": not isinstance(da.data, dsk.Array) and parallel is not False,
+    }
+
     res = (
         apply_ufunc(
             _quantile,
@@ -274,6 +968,744 @@ def quantile(da: DataArray, q: np.ndarray, dim: str | Sequence[Hashable]) -> Dat
     return res
 
 
+@njit(nogil=True, cache=False)
+def _radix_sort(arr: np.array, n: int, buf: np.array, nbits: int):
+    """
+    Sort in-place the `n` first elements of an array of non-negative integers smaller than `2**nbits`.
+
+    A LSD radix sort with 8 bits digits, `buf` must be at least as large as `n`.
+    """
+    counts = np.empty(256, dtype=np.intp)
+    src, dst = arr, buf
+    npass = 0
+    for shift in range(0, nbits, 8):
+        counts[:] = 0
+        for i in range(n):
+            counts[(src[i] >> shift) & 255] += 1
+        total = 0
+        for b in range(256):
+            c = counts[b]
+            counts[b] = total
+            total += c
+        for i in range(n):
+            b = (src[i] >> shift) & 255
+            dst[counts[b]] = src[i]
+            counts[b] += 1
+        src, dst = dst, src
+        npass += 1
+    if npass % 2 == 1:
+        arr[:n] = buf[:n]
+
+
+@njit(nogil=True, cache=False)
+def _grouped_quantile_1d(
+    arr: np.array,
+    indexes: np.array,
+    quantiles: np.array,
+    scale: np.array,
+    shift: np.array,
+) -> np.array:
+    """
+    Get the quantiles of each group of the 1-dimensional array.
+
+    The array is sorted only once, the members of each group are then put in order by sorting their ranks,
+    which is faster than sorting the values themselves. The values of group `g` are transformed as
+    `x * scale[g] + shift[g]` before the computation.
+
+    Notes
+    -----
+    The quantiles are computed as in `_nan_quantile_1d`, on the same values as the ones of a window-constructed group
+    (out-of-bounds members are NaNs), so the results are the same.
+    """
+    order = np.argsort(arr)
+    ranks = np.empty(arr.size, dtype=np.intp)
+    ranks[order] = np.arange(arr.size)
+    sorted_arr = arr[order]
+
+    nvalid = (~np.isnan(arr)).sum()
+    nbits = np.intp(np.log2(max(arr.size, 1))) + 1
+
+    ngroups, nmembers = indexes.shape
+    grp_ranks = np.empty(nmembers, dtype=np.intp)
+    buf = np.empty(nmembers, dtype=np.intp)
+    grp = np.empty(nmembers, dtype=arr.dtype)
+    out = np.empty((ngroups, quantiles.size), dtype=arr.dtype)
+    for ig in range(ngroups):
+        k = 0
+        for im in range(nmembers):
+            if indexes[ig, im] >= 0:
+                grp_ranks[k] = ranks[indexes[ig, im]]
+                k += 1
+        _radix_sort(grp_ranks, k, buf, nbits)
+        if scale[ig] < 0:
+            # The order of the valid values is reversed, NaNs stay at the end.
+            nv = np.searchsorted(grp_ranks[:k], nvalid)
+            grp_ranks[:nv] = grp_ranks[:nv][::-1].copy()
+        grp[:k] = sorted_arr[grp_ranks[:k]] * scale[ig] + shift[ig]
+        grp[k:] = np.nan
+        out[ig] = _nan_quantile_sorted_1d(grp, quantiles)
+    return out
+
+
+def _grouped_quantile_2d(arr, indexes, q, scale, shift):  # pragma: no cover
+    out = np.empty((arr.shape[0], indexes.shape[0], q.size), dtype=arr.dtype)
+    for index in prange(out.shape[0]):
+        out[index] = _grouped_quantile_1d(
+            arr[index], indexes, q, scale[index], shift[index]
+        )
+    return out
+
+
+_wrapper_grouped_quantile1d = njit(parallel=True, nogil=True, cache=False)(
+    _grouped_quantile_2d
+)
+_wrapper_grouped_quantile1d_serial = njit(nogil=True, cache=False)(
+    _serial_twin(_grouped_quantile_2d)
+)
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_grouped_mean1d(arr, indexes):
+    out = np.empty((arr.shape[0], indexes.shape[0]), dtype=arr.dtype)
+    for index in range(out.shape[0]):
+        for ig in range(indexes.shape[0]):
+            total = 0.0
+            count = 0
+            for im in range(indexes.shape[1]):
+                if indexes[ig, im] >= 0 and not np.isnan(arr[index, indexes[ig, im]]):
+                    total += arr[index, indexes[ig, im]]
+                    count += 1
+            out[index, ig] = total / count if count > 0 else np.nan
+    return out
+
+
+def _flatten_groups(arr, indexes, nreduce):
+    """Reshape as (keep_dims, red_dims) and translate indexes of the last axis to positions along the flat reduced axis."""
+    keep_shape = arr.shape[: arr.ndim - nreduce]
+    red_shape = arr.shape[arr.ndim - nreduce :]
+    if nreduce > 1:
+        # Additional reduced dimensions : the same positions are taken along each of their elements.
+        nlast = red_shape[-1]
+        indexes = np.concatenate(
+            [
+                np.where(indexes >= 0, indexes + i * nlast, -1)
+                for i in range(int(np.prod(red_shape[:-1])))
+            ],
+            axis=1,
+        )
+    arr = np.ascontiguousarray(arr).reshape(-1, int(np.prod(red_shape)))
+    return arr, indexes, keep_shape
+
+
+def _grouped_quantile(arr, indexes, scale, shift, q, nreduce=1, parallel=False):
+    # scale and shift have the group dimension last and are broadcast against the kept dimensions of arr
+    norm_shape = arr.shape[: arr.ndim - nreduce] + (indexes.shape[0],)
+    scale = np.broadcast_to(scale, norm_shape).reshape(-1, indexes.shape[0])
+    shift = np.broadcast_to(shift, norm_shape).reshape(-1, indexes.shape[0])
+    arr, indexes, keep_shape = _flatten_groups(arr, indexes, nreduce)
+    func = (
+        _wrapper_grouped_quantile1d if parallel else _wrapper_grouped_quantile1d_serial
+    )
+    out = func(arr, indexes, q, scale.astype(arr.dtype), shift.astype(arr.dtype))
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+def _grouped_mean(arr, indexes, nreduce=1):
+    arr, indexes, keep_shape = _flatten_groups(arr, indexes, nreduce)
+    out = _wrapper_grouped_mean1d(arr, indexes)
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+@profiled("grouped_quantile")
+def grouped_quantile(
+    da: DataArray,
+    q: np.ndarray,
+    indexes: DataArray,
+    dim: str | Sequence[Hashable],
+    scale: DataArray | None = None,
+    shift: DataArray | None = None,
+    parallel: bool | None = None,
+) -> DataArray:
+    """
+    Compute the quantiles from a fixed list `q`, for each group of an index table.
+
+    This gives the same results as computing :py:func:`quantile` on each group of a `Grouper`,
+    but each series is sorted only once and all groups are computed in a single numba call.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+        The data to compute the quantiles on.
+    q : array-like
+        The quantiles to compute.
+    indexes : xarray.DataArray
+        The positions along the main dimension of the elements of each group, -1 for missing elements.
+        Two dimensions : the group and the group members. See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    dim : str or sequence of str
+        The dimension(s) along which to compute the quantiles. The first one is the main dimension,
+        the one referred to by `indexes`. All elements along the other ones are included in the groups.
+    scale : xarray.DataArray, optional
+        Factors by which the values of each group are multiplied before computing the quantiles.
+        Can have the group dimension and any of the dimensions of `da` that are not in `dim`.
+    shift : xarray.DataArray, optional
+        Values added to the values of each group before computing the quantiles, after `scale`.
+        Can have the group dimension and any of the dimensions of `da` that are not in `dim`.
+    parallel : bool, optional
+        Whether to process the series in parallel with `numba`. Ignored for `dask` arrays, whose chunks are
+        already processed in parallel. Defaults to True for other arrays.
+
+    Returns
+    -------
+    xarray.DataArray
+        The quantiles computed for each group, along the `dim` dimension(s).
+    """
+    qc = np.array(q, dtype=da.dtype)
+    dims = [dim] if isinstance(dim, str) else list(dim)
+    # The main dimension must be the last one
+    dims = dims[1:] + dims[:1]
+    gdim = indexes.dims[0]
+    scale, shift = (
+        norm.expand_dims({gdim: indexes[gdim].size}) if gdim not in norm.dims else norm
+        for norm in [
+            DataArray(1.0) if scale is None else scale,
+            DataArray(0.0) if shift is None else shift,
+        ]
+    )
+    kwargs = {
+        "nreduce": len(dims),
+        "q": qc,
+        "parallel": not isinstance(da.data, dsk.Array) and parallel is not False,
+    }
+    res = (
+        apply_ufunc(
+            _grouped_quantile,
+            da,
+            indexes,
+            scale,
+            shift,
+            input_core_dims=[dims, list(indexes.dims), [gdim], [gdim]],
+            exclude_dims=set(dims),
+            output_core_dims=[[gdim, "quantiles"]],
+            output_dtypes=[da.dtype],
+            dask_gufunc_kwargs={"output_sizes": {"quantiles": len(q)}},
+            dask="parallelized",
+            kwargs=kwargs,
+        )
+        .assign_coords(quantiles=q)
+        .assign_attrs(da.attrs)
+    )
+    return res
+
+
+def grouped_mean(
+    da: DataArray, indexes: DataArray, dim: str | Sequence[Hashable]
+) -> DataArray:
+    """
+    Compute the mean of each group of an index table, skipping NaNs.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+        The data to compute the mean on.
+    indexes : xarray.DataArray
+        The positions along the main dimension of the elements of each group, -1 for missing elements.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    dim : str or sequence of str
+        The dimension(s) along which to compute the mean. The first one is the main dimension,
+        the one referred to by `indexes`.
+
+    Returns
+    -------
+    xarray.DataArray
+        The mean of each group.
+    """
+    dims = [dim] if isinstance(dim, str) else list(dim)
+    dims = dims[1:] + dims[:1]
+    return apply_ufunc(
+        _grouped_mean,
+        da,
+        indexes,
+        input_core_dims=[dims, list(indexes.dims)],
+        exclude_dims=set(dims),
+        output_core_dims=[[indexes.dims[0]]],
+        output_dtypes=[da.dtype],
+        dask="parallelized",
+        kwargs={"nreduce": len(dims)},
+    )
+
+
+# Number of sketches merged together at each level of the reduction tree of `grouped_sketch`.
+_SKETCH_SPLIT = 8
+
+
+@njit(nogil=True, cache=False)
+def _sketch_compress(vals, wts, n, out_v, out_w):
+    """
+    Compress `n` weighted values, sorted in ascending order, into the points `out_v` with weights `out_w`.
+
+    If there are more values than points, each point takes the value found at the middle of an equal slice
+    of the total weight, with the weight of the slice. Otherwise, the values are copied and the unused points
+    have a weight of 0.
+    """
+    npoints = out_v.size
+    if n <= npoints:
+        out_v[:n] = vals[:n]
+        out_w[:n] = wts[:n]
+        out_v[n:] = np.nan
+        out_w[n:] = 0
+        return
+    step = wts[:n].sum() / npoints
+    cum = wts[0]
+    i = 0
+    for j in range(npoints):
+        target = (j + 0.5) * step
+        while cum < target and i < n - 1:
+            i += 1
+            cum += wts[i]
+        out_v[j] = vals[i]
+        out_w[j] = step
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_sketch_chunk1d(arr, indexes, npoints):
+    ngroups, nmembers = indexes.shape
+    out = np.zeros((arr.shape[0], ngroups, 2, npoints + 2), dtype=arr.dtype)
+    grp = np.empty(nmembers, dtype=arr.dtype)
+    ones = np.ones(nmembers, dtype=arr.dtype)
+    for index in range(arr.shape[0]):
+        for ig in range(ngroups):
+            sk = out[index, ig]
+            sk[0, :] = np.nan
+            n = 0
+            total = 0.0
+            for im in range(nmembers):
+                i = indexes[ig, im]
+                if i >= 0 and not np.isnan(arr[index, i]):
+                    grp[n] = arr[index, i]
+                    total += grp[n]
+                    n += 1
+            if n == 0:
+                continue
+            vals = np.sort(grp[:n])
+            sk[0, 0] = vals[0]
+            sk[0, -1] = vals[n - 1]
+            sk[1, 0] = total
+            sk[1, -1] = n
+            _sketch_compress(vals, ones, n, sk[0, 1:-1], sk[1, 1:-1])
+    return out
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_sketch_merge1d(parts):
+    npts, nparts, _, nslots = parts.shape
+    out = np.zeros((npts, 2, nslots), dtype=parts.dtype)
+    vals = np.empty(nparts * (nslots - 2), dtype=parts.dtype)
+    wts = np.empty(nparts * (nslots - 2), dtype=parts.dtype)
+    for index in range(npts):
+        sk = out[index]
+        sk[0, :] = np.nan
+        n = 0
+        for ip in range(nparts):
+            part = parts[index, ip]
+            if part[1, -1] == 0:
+                continue
+            if sk[1, -1] == 0:
+                sk[0, 0] = part[0, 0]
+                sk[0, -1] = part[0, -1]
+            else:
+                sk[0, 0] = min(sk[0, 0], part[0, 0])
+                sk[0, -1] = max(sk[0, -1], part[0, -1])
+            sk[1, 0] += part[1, 0]
+            sk[1, -1] += part[1, -1]
+            for j in range(1, nslots - 1):
+                if part[1, j] > 0:
+                    vals[n] = part[0, j]
+                    wts[n] = part[1, j]
+                    n += 1
+        if n == 0:
+            continue
+        order = np.argsort(vals[:n])
+        _sketch_compress(vals[order], wts[order], n, sk[0, 1:-1], sk[1, 1:-1])
+    return out
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_sketch_quantile1d(sketches, q):
+    npts, _, nslots = sketches.shape
+    out = np.full((npts, q.size), np.nan, dtype=sketches.dtype)
+    pos = np.empty(nslots, dtype=sketches.dtype)
+    vals = np.empty(nslots, dtype=sketches.dtype)
+    for index in range(npts):
+        sk = sketches[index]
+        count = sk[1, -1]
+        if count == 0:
+            continue
+        # Each point is placed at the center of the ranks it stands for, the extremes at the first and last ranks.
+        pos[0] = 0
+        vals[0] = sk[0, 0]
+        n = 1
+        cum = 0.0
+        for j in range(1, nslots - 1):
+            if sk[1, j] > 0:
+                pos[n] = cum + (sk[1, j] - 1) / 2
+                vals[n] = sk[0, j]
+                cum += sk[1, j]
+                n += 1
+        pos[n] = count - 1
+        vals[n] = sk[0, -1]
+        out[index] = np.interp(q * (count - 1), pos[: n + 1], vals[: n + 1])
+    return out
+
+
+def _local_group_indexes(indexes, start, stop):
+    """Get the positions relative to `start` of the members of each group within [start, stop), the valid ones first."""
+    local = np.where((indexes >= start) & (indexes < stop), indexes - start, -1)
+    order = np.argsort(local < 0, axis=1, kind="stable")
+    local = np.take_along_axis(local, order, axis=1)
+    return local[:, : max((local >= 0).sum(axis=1).max(initial=0), 1)]
+
+
+def _sketch_chunk(arr, indexes, npoints, nreduce=1):
+    arr, indexes, keep_shape = _flatten_groups(arr, indexes, nreduce)
+    out = _wrapper_sketch_chunk1d(arr, indexes, npoints)
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+def _sketch_merge(*parts):
+    parts = np.stack(parts, axis=-3)
+    keep_shape = parts.shape[:-3]
+    out = _wrapper_sketch_merge1d(
+        np.ascontiguousarray(parts.reshape((-1,) + parts.shape[-3:]))
+    )
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+def _sketch_quantile(sketches, q):
+    keep_shape = sketches.shape[:-2]
+    out = _wrapper_sketch_quantile1d(
+        np.ascontiguousarray(sketches.reshape((-1,) + sketches.shape[-2:])), q
+    )
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+def _grouped_sketch(arr, indexes, error, nreduce=1):
+    use_dask = isinstance(arr, dsk.Array)
+    nkeep = arr.ndim - nreduce
+    chunks = arr.chunks[-1] if use_dask else (arr.shape[-1],)
+    if use_dask and nreduce > 1:
+        # Additional reduced dimensions are sketched together with each chunk of the main one
+        arr = arr.rechunk({ax: -1 for ax in range(nkeep, arr.ndim - 1)})
+
+    nlevels, nparts = 0, len(chunks)
+    while nparts > 1:
+        nparts = -(-nparts // _SKETCH_SPLIT)
+        nlevels += 1
+    # Each compression adds a rank error of at most half a point, the interpolation between points another one.
+    # A sketch never needs more points than the elements of the largest group.
+    npoints = int(
+        min(
+            np.ceil((nlevels + 2) / error),
+            indexes.shape[1] * np.prod(arr.shape[nkeep:-1], dtype=int),
+        )
+    )
+
+    bounds = np.cumsum((0,) + tuple(chunks))
+    parts = []
+    for start, stop in zip(bounds[:-1], bounds[1:], strict=False):
+        local = _local_group_indexes(indexes, start, stop)
+        if use_dask:
+            part = arr[..., start:stop].map_blocks(
+                _sketch_chunk,
+                indexes=local,
+                npoints=npoints,
+                nreduce=nreduce,
+                drop_axis=list(range(nkeep, arr.ndim)),
+                new_axis=list(range(nkeep, nkeep + 3)),
+                chunks=arr.chunks[:nkeep] + ((indexes.shape[0],), (2,), (npoints + 2,)),
+                dtype=arr.dtype,
+            )
+        else:
+            part = _sketch_chunk(arr[..., start:stop], local, npoints, nreduce)
+        parts.append(part)
+
+    while len(parts) > 1:
+        parts = [
+            (
+                dsk.map_blocks(
+                    _sketch_merge, *parts[i : i + _SKETCH_SPLIT], dtype=arr.dtype
+                )
+                if use_dask
+                else _sketch_merge(*parts[i : i + _SKETCH_SPLIT])
+            )
+            for i in range(0, len(parts), _SKETCH_SPLIT)
+        ]
+    return parts[0]
+
+
+def grouped_sketch(
+    da: DataArray,
+    indexes: DataArray,
+    dim: str | Sequence[Hashable],
+    error: float = 0.01,
+) -> DataArray:
+    """
+    Compute mergeable quantile sketches of each group of an index table, chunk by chunk.
+
+    Each chunk of `da` along the main dimension is summarized independently, then the summaries are merged
+    by groups of 8, recursively, as in a tree reduction. With `dask`, the main dimension thus does not need to
+    be rechunked and only the small summaries are gathered. Quantiles and means of the groups are then obtained
+    with :py:func:`sketch_quantile` and :py:func:`sketch_mean`.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+        The data to summarize. Can be chunked along any dimension.
+    indexes : xarray.DataArray
+        The positions along the main dimension of the elements of each group, -1 for missing elements.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    dim : str or sequence of str
+        The dimension(s) along which the groups are summarized. The first one is the main dimension,
+        the one referred to by `indexes`.
+    error : float
+        The rank error bound of the sketches, as a fraction of the number of elements of the group.
+        The ranks in the group of the quantiles estimated from a sketch differ from the exact ones by less than
+        `error` times the size of the group, besides the interpolation between two consecutive elements.
+
+    Returns
+    -------
+    xarray.DataArray
+        The sketches, with the group dimension and two new dimensions, "sketch_row" and "sketch_point".
+        Along "sketch_point", the first row holds the minimum of the group, the values of the points and the maximum.
+        The second row holds the sum of the group, the weights of the points and the number of elements.
+
+    Notes
+    -----
+    A sketch summarizes a group with at most `n` points of equal weight, `n` being chosen from `error` and
+    the number of chunks. A chunk is summarized by its values found at the middle of `n` equal slices of the
+    sorted group. Two summaries are merged by sorting their points together and summarizing them again in the
+    same way. Groups with fewer elements than `n` are kept exactly, their quantiles are then the same as those
+    of :py:func:`grouped_quantile`.
+    """
+    dims = [dim] if isinstance(dim, str) else list(dim)
+    # The main dimension must be the last one
+    dims = dims[1:] + dims[:1]
+    gdim = indexes.dims[0]
+    res = apply_ufunc(
+        _grouped_sketch,
+        da,
+        input_core_dims=[dims],
+        exclude_dims=set(dims),
+        output_core_dims=[[gdim, "sketch_row", "sketch_point"]],
+        dask="allowed",
+        kwargs={"indexes": indexes.values, "error": error, "nreduce": len(dims)},
+    ).assign_coords({gdim: indexes[gdim]})
+    return res.assign_attrs(da.attrs)
+
+
+def sketch_quantile(sketch: DataArray, q: np.ndarray) -> DataArray:
+    """
+    Estimate the quantiles from a fixed list `q` of sketches computed by :py:func:`grouped_sketch`.
+
+    The quantiles are interpolated linearly between the points of the sketches, placed at the center of the
+    ranks they stand for, and the minimum and maximum, placed at the first and last ranks.
+
+    Parameters
+    ----------
+    sketch : xarray.DataArray
+        The sketches, as returned by :py:func:`grouped_sketch`.
+    q : array-like
+        The quantiles to compute.
+
+    Returns
+    -------
+    xarray.DataArray
+        The quantiles of each group.
+    """
+    qc = np.array(q, dtype=sketch.dtype)
+    res = apply_ufunc(
+        _sketch_quantile,
+        sketch,
+        input_core_dims=[["sketch_row", "sketch_point"]],
+        output_core_dims=[["quantiles"]],
+        output_dtypes=[sketch.dtype],
+        dask_gufunc_kwargs={"output_sizes": {"quantiles": len(q)}},
+        dask="parallelized",
+        kwargs={"q": qc},
+    )
+    return res.assign_coords(quantiles=q).assign_attrs(sketch.attrs)
+
+
+def sketch_mean(sketch: DataArray) -> DataArray:
+    """
+    Compute the mean of the groups summarized by sketches of :py:func:`grouped_sketch`, skipping NaNs.
+
+    Parameters
+    ----------
+    sketch : xarray.DataArray
+        The sketches, as returned by :py:func:`grouped_sketch`.
+
+    Returns
+    -------
+    xarray.DataArray
+        The mean of each group, which is exact.
+    """
+    total = sketch.isel(sketch_row=1, sketch_point=0)
+    count = sketch.isel(sketch_row=1, sketch_point=-1)
+    return total / count.where(count > 0)
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_grouped_vecquantiles1d(arr, indexes, rnk):
+    out = np.empty((arr.shape[0], indexes.shape[0]), dtype=arr.dtype)
+    grp = np.empty(indexes.shape[1], dtype=arr.dtype)
+    for index in range(out.shape[0]):
+        for ig in range(indexes.shape[0]):
+            if np.isnan(rnk[index, ig]):
+                out[index, ig] = np.nan
+                continue
+            for im in range(indexes.shape[1]):
+                grp[im] = (
+                    arr[index, indexes[ig, im]] if indexes[ig, im] >= 0 else np.nan
+                )
+            out[index, ig] = np.nanquantile(grp, rnk[index, ig])
+    return out
+
+
+def _grouped_vecquantiles(arr, indexes, rnk, nreduce=1):
+    arr, indexes, keep_shape = _flatten_groups(arr, indexes, nreduce)
+    rnk = np.broadcast_to(rnk, keep_shape + rnk.shape[-1:]).reshape(
+        -1, indexes.shape[0]
+    )
+    out = _wrapper_grouped_vecquantiles1d(arr, indexes, rnk.astype(arr.dtype))
+    return out.reshape(keep_shape + out.shape[1:])
+
+
+def grouped_vecquantiles(
+    da: DataArray, rnk: DataArray, indexes: DataArray, dim: str | Sequence[Hashable]
+) -> DataArray:
+    """
+    For when the quantile (rnk) is different for each point and each group of an index table.
+
+    Same as :py:func:`vecquantiles` on each group, the group dimension must be the one of `indexes`.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+        The data to compute the quantiles on.
+    rnk : xarray.DataArray
+        The quantiles to compute, with the group dimension.
+    indexes : xarray.DataArray
+        The positions along the main dimension of the elements of each group, -1 for missing elements.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    dim : str or sequence of str
+        The dimension(s) along which to compute the quantiles. The first one is the main dimension,
+        the one referred to by `indexes`.
+
+    Returns
+    -------
+    xarray.DataArray
+        The quantiles computed for each group.
+    """
+    dims = [dim] if isinstance(dim, str) else list(dim)
+    dims = dims[1:] + dims[:1]
+    gdim = indexes.dims[0]
+    return apply_ufunc(
+        _grouped_vecquantiles,
+        da,
+        indexes,
+        rnk,
+        input_core_dims=[dims, list(indexes.dims), [gdim]],
+        exclude_dims=set(dims),
+        output_core_dims=[[gdim]],
+        output_dtypes=[da.dtype],
+        dask="parallelized",
+        kwargs={"nreduce": len(dims)},
+    )
+
+
+@njit(nogil=True, cache=False)
+def _wrapper_grouped_rank1d(arr, indexes, centers):
+    out = np.full(arr.shape, np.nan)
+    grp = np.empty(indexes.shape[1], dtype=arr.dtype)
+    for index in range(arr.shape[0]):
+        for ig in range(indexes.shape[0]):
+            k = 0
+            for im in range(indexes.shape[1]):
+                if indexes[ig, im] >= 0 and not np.isnan(arr[index, indexes[ig, im]]):
+                    grp[k] = arr[index, indexes[ig, im]]
+                    k += 1
+            if k == 0:
+                continue
+            srtd = np.sort(grp[:k])
+            # Average ranks (starting at 1) divided by the number of valid values,
+            # then rescaled as in `xsdba.utils.rank`.
+            mn = (1 + np.searchsorted(srtd, srtd[0], side="right")) / 2 / k
+            mx = (np.searchsorted(srtd, srtd[-1], side="left") + 1 + k) / 2 / k
+            for ic in range(centers.shape[1]):
+                pos = centers[ig, ic]
+                if pos < 0 or np.isnan(arr[index, pos]):
+                    continue
+                left = np.searchsorted(srtd, arr[index, pos], side="left")
+                right = np.searchsorted(srtd, arr[index, pos], side="right")
+                pct = (left + 1 + right) / 2 / k
+                out[index, pos] = mx * (pct - mn) / (mx - mn)
+    return out
+
+
+def _grouped_rank(arr, indexes, centers, nreduce=1):
+    shape = arr.shape
+    _, centers, _ = _flatten_groups(arr, centers, nreduce)
+    arr, indexes, _ = _flatten_groups(arr, indexes, nreduce)
+    return _wrapper_grouped_rank1d(arr, indexes, centers).reshape(shape)
+
+
+def grouped_rank(
+    da: DataArray,
+    indexes: DataArray,
+    centers: DataArray,
+    dim: str | Sequence[Hashable],
+) -> DataArray:
+    """
+    Percentage rank of elements within the samples of their group.
+
+    The ranks are computed as :py:func:`xsdba.utils.rank` with `pct=True` over the samples of each group given
+    by `indexes`, but only the elements given by `centers` are ranked and returned.
+
+    Parameters
+    ----------
+    da : xarray.DataArray
+        The data to rank.
+    indexes : xarray.DataArray
+        The positions along the main dimension of the samples of each group, -1 for missing elements.
+        See :py:meth:`xsdba.base.Grouper.get_group_indexes`.
+    centers : xarray.DataArray
+        The positions along the main dimension of the elements to rank in each group, usually the indexes
+        of the same groups, without the window. Same group dimension as `indexes`.
+    dim : str or sequence of str
+        The dimension(s) over which the samples are taken. The first one is the main dimension,
+        the one referred to by `indexes`.
+
+    Returns
+    -------
+    xarray.DataArray
+        Percentage rank, same shape as `da`. Elements not included in `centers` are NaN.
+    """
+    dims = [dim] if isinstance(dim, str) else list(dim)
+    dims = dims[1:] + dims[:1]
+    centers = centers.rename({centers.dims[1]: "group_center"})
+    return apply_ufunc(
+        _grouped_rank,
+        da,
+        indexes,
+        centers,
+        input_core_dims=[dims, list(indexes.dims), list(centers.dims)],
+        output_core_dims=[dims],
+        output_dtypes=[float],
+        dask="parallelized",
+        kwargs={"nreduce": len(dims)},
+    )
+
+
 @njit(
     [
         float32[:, :](float32[:, :]),
@@ -342,6 +1774,27 @@ def _autocorrelation(X):
     return (2 * d) / X.shape[1] ** 2
 
 
+@njit(
+    fastmath=False,
+    nogil=True,
+    cache=False,
+)
+def _escore_2d(tgt, sim):
+    """E-score of two 2D arrays, see :py:func:`_escore`."""
+    sim = remove_NaNs(sim)
+    tgt = remove_NaNs(tgt)
+
+    n1 = sim.shape[1]
+    n2 = tgt.shape[1]
+
+    sXY = _correlation(tgt, sim)
+    sXX = _autocorrelation(tgt)
+    sYY = _autocorrelation(sim)
+
+    w = n1 * n2 / (n1 + n2)
+    return w * (sXY + sXY - sXX - sYY) / 2
+
+
 @guvectorize(
     [
         (float32[:, :], float32[:, :], float32[:]),
@@ -359,18 +1812,99 @@ def _escore(tgt, sim, out):
     When N > 0, only this many points of target and sim are used, taken evenly distributed in the series.
     When std is True, X and Y are standardized according to the nanmean and nanstd (ddof = 1) of X.
     """
-    sim = remove_NaNs(sim)
-    tgt = remove_NaNs(tgt)
+    out[0] = _escore_2d(tgt, sim)
 
-    n1 = sim.shape[1]
-    n2 = tgt.shape[1]
 
-    sXY = _correlation(tgt, sim)
-    sXX = _autocorrelation(tgt)
-    sYY = _autocorrelation(sim)
+@njit(nogil=True, cache=False)
+def _rank_pct_sorted_1d(arr):
+    """Percentage rank of a sorted 1D array with NaNs at the end, as :py:func:`xsdba.utils._rank_bn`."""
+    n = arr.size
+    out = np.full(n, np.nan)
+    nvalid = n
+    while nvalid > 0 and np.isnan(arr[nvalid - 1]):
+        nvalid -= 1
+    if nvalid == 0:
+        return out
+    # Average rank of ties, starting at 1
+    i = 0
+    while i < nvalid:
+        j = i + 1
+        while j < nvalid and arr[j] == arr[i]:
+            j += 1
+        out[i:j] = (i + 1 + j) / 2
+        i = j
+    mx = out[nvalid - 1]
+    mn = out[0] / mx
+    for k in range(nvalid):
+        out[k] = 1 * (out[k] / mx - mn) / (1 - mn)
+    return out
 
-    w = n1 * n2 / (n1 + n2)
-    out[0] = w * (sXY + sXY - sXX - sYY) / 2
+
+@njit(nogil=True, cache=False)
+def _npdft_train_block(ref, hist, ntimes, rots, quantiles, method, extrap, n_escore):
+    """
+    Npdf transform training on a block of points, see :py:func:`xsdba._adjustment._npdft_train`.
+
+    Parameters
+    ----------
+    ref, hist : arrays of shape (npts, nfeature, ntime)
+        The standardized target and source data. The time axis can differ between `ref` and `hist`.
+    ntimes : array of int of shape (npts,)
+        The number of times to use for each point, the rest of the time axis is padding.
+    rots : array of shape (niter, nfeature, nfeature)
+        The rotations to apply at each iteration, each one undoes the previous rotation.
+    quantiles : array
+        The quantiles to compute.
+    method, extrap : int
+        Codes from `INTERP_METHODS` and `EXTRAP_METHODS`.
+    n_escore : int
+        Number of elements to include in the e-score, only computed if positive.
+
+    Returns
+    -------
+    af_q : array of shape (npts, niter, nfeature, nquantiles)
+        Adjustment factors of each iteration.
+    escores : array of shape (npts, niter)
+        E-score after each iteration, NaN if `n_escore` is not positive.
+    """
+    npts, nv = ref.shape[:2]
+    niter = rots.shape[0]
+    af_q = np.zeros((npts, niter, nv, quantiles.size))
+    escores = np.full((npts, niter), np.nan)
+    af = np.empty(hist.shape[2])
+    buf = np.empty(ref.shape[2])
+    for ip in range(npts):
+        ref_i = np.ascontiguousarray(ref[ip, :, : ntimes[ip]])
+        hist_i = np.ascontiguousarray(hist[ip, :, : ntimes[ip]])
+        if n_escore > 0:
+            ref_step = int(np.ceil(ref_i.shape[1] / n_escore))
+            hist_step = int(np.ceil(hist_i.shape[1] / n_escore))
+        for ii in range(niter):
+            ref_i = rots[ii] @ ref_i
+            hist_i = rots[ii] @ hist_i
+            for iv in range(nv):
+                # The sorted hist gives both its quantiles and its ranks
+                order = np.argsort(hist_i[iv])
+                hist_s = hist_i[iv][order]
+                af_q[ip, ii, iv] = _nan_quantile_select_1d(
+                    ref_i[iv], quantiles, buf
+                ) - _nan_quantile_sorted_1d(hist_s, quantiles)
+                # The ranks are sorted, which makes the interpolation faster
+                _interp_1d(
+                    _rank_pct_sorted_1d(hist_s),
+                    quantiles,
+                    af_q[ip, ii, iv],
+                    method,
+                    extrap,
+                    af[: order.size],
+                )
+                for k in range(order.size):
+                    hist_i[iv, order[k]] = hist_s[k] + af[k]
+            if n_escore > 0:
+                escores[ip, ii] = _escore_2d(
+                    ref_i[:, ::ref_step], hist_i[:, ::hist_step]
+                )
+    return af_q, escores
 
 
 @njit(
@@ -417,6 +1951,331 @@ def _extrapolate_on_quantiles(interp, oldx, oldg, oldy, newx, newg, method="cons
     return interp
 
 
+@njit(nogil=True, cache=False)
+def _bisect(a, n, v, right):
+    """Same as `np.searchsorted(a[:n], v, side="right" if right else "left")`, faster for a scalar `v`."""
+    lo = 0
+    hi = n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if a[mid] < v or (right and a[mid] == v):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+@njit(nogil=True, cache=False)
+def _hermite_slope(x, y, n, k):
+    """Slope at node k of a cubic Hermite spline, the mean of the adjacent secants."""
+    total = 0.0
+    count = 0
+    if k > 0 and x[k] > x[k - 1]:
+        total += (y[k] - y[k - 1]) / (x[k] - x[k - 1])
+        count += 1
+    if k < n - 1 and x[k + 1] > x[k]:
+        total += (y[k + 1] - y[k]) / (x[k + 1] - x[k])
+        count += 1
+    return total / count if count > 0 else 0.0
+
+
+@njit(nogil=True, cache=False)
+def _interp_sorted_1d(x, y, n, v, cubic):
+    """Interpolate at v on the first n nodes of x (sorted) and y, constant outside the nodes."""
+    if v <= x[0]:
+        return y[0]
+    if v >= x[n - 1]:
+        return y[n - 1]
+    j = _bisect(x, n, v, True) - 1
+    h = x[j + 1] - x[j]
+    t = (v - x[j]) / h
+    if not cubic:
+        return y[j] + t * (y[j + 1] - y[j])
+    m0 = _hermite_slope(x, y, n, j) * h
+    m1 = _hermite_slope(x, y, n, j + 1) * h
+    t2 = t * t
+    t3 = t2 * t
+    return (
+        (2 * t3 - 3 * t2 + 1) * y[j]
+        + (t3 - 2 * t2 + t) * m0
+        + (3 * t2 - 2 * t3) * y[j + 1]
+        + (t3 - t2) * m1
+    )
+
+
+@njit(nogil=True, cache=False)
+def _interp_on_grid(xs, ys, ns, gs, nrows, v, g, cubic):
+    """Interpolate along the quantiles of the rows surrounding g, then along the group."""
+    if g <= gs[0] or nrows == 1:
+        return _interp_sorted_1d(xs[0], ys[0], ns[0], v, cubic)
+    if g >= gs[nrows - 1]:
+        r = nrows - 1
+        return _interp_sorted_1d(xs[r], ys[r], ns[r], v, cubic)
+    r = _bisect(gs, nrows, g, True) - 1
+    start = max(r - 1, 0) if cubic else r
+    stop = min(r + 3, nrows) if cubic else r + 2
+    lg = np.empty(stop - start)
+    lv = np.empty(stop - start)
+    for k in range(start, stop):
+        lg[k - start] = gs[k]
+        lv[k - start] = _interp_sorted_1d(xs[k], ys[k], ns[k], v, cubic)
+    return _interp_sorted_1d(lg, lv, stop - start, g, cubic)
+
+
+@njit(nogil=True, cache=False)
+def _nearest_on_grid(xs, ys, ns, gs, nrows, v, g):
+    """
+    Find the value of the node nearest to (v, g), in the euclidean sense.
+
+    Ties within a group go to the node with the smaller coordinate, as with the 1D nearest interpolation,
+    and ties between groups go to the first group.
+    """
+    best = np.inf
+    out = np.nan
+    for k in range(nrows):
+        n = ns[k]
+        j = _bisect(xs[k], n, v, False)
+        if j == n or (j > 0 and v - xs[k, j - 1] <= xs[k, j] - v):
+            j = j - 1
+        dist = (v - xs[k, j]) ** 2 + (g - gs[k]) ** 2
+        if dist < best:
+            best = dist
+            out = ys[k, j]
+    return out
+
+
+@njit(nogil=True, cache=False)
+def _interp_on_quantiles_grid(newx, newg, oldx, oldy, oldg, method, extrap):
+    """
+    Interpolate on quantiles with a grouping, for many points at once.
+
+    The nodes form a structured grid: each group (first axis of `oldg`) has its own sorted quantiles.
+    Linear and cubic interpolation are done along the quantiles of the groups surrounding `newg`, then
+    along the group. Nearest interpolation finds the closest node, see :py:func:`_nearest_on_grid` for ties.
+    Extrapolation is then applied with :py:func:`_extrapolate_on_quantiles`.
+    This is not the triangulation-based interpolation of :py:func:`scipy.interpolate.griddata`, whose
+    results are different for linear and cubic interpolation.
+
+    Parameters
+    ----------
+    newx : array of shape (npts, nt)
+        The values at which to interpolate.
+    newg : array of shape (1, nt) or (npts, nt)
+        The group coordinate of `newx`.
+    oldx, oldy : arrays of shape (npts, ng, nq)
+        The coordinates and values on which to interpolate.
+    oldg : array of shape (ng, nq)
+        The group coordinate of the nodes, constant along the last axis.
+    method : {'nearest', 'linear', 'cubic'}
+        The interpolation method.
+    extrap : {'constant', 'nan'}
+        The extrapolation method.
+
+    Returns
+    -------
+    array of shape (npts, nt)
+        NaN where `newx`, `newg` is NaN, or for points where all `newx` or all nodes are NaN.
+    """
+    npts, nt = newx.shape
+    ng, nq = oldx.shape[1:]
+    out = np.full((npts, nt), np.nan)
+    xs = np.empty((ng, nq))
+    ys = np.empty((ng, nq))
+    ns = np.empty(ng, dtype=np.int64)
+    gs = np.empty(ng)
+    cubic = method == "cubic"
+    for i in range(npts):
+        gi = newg[i if newg.shape[0] > 1 else 0]
+        # Sorted valid nodes of each group, groups without any are skipped
+        nrows = 0
+        for k in range(ng):
+            n = 0
+            for q in range(nq):
+                if not (np.isnan(oldx[i, k, q]) or np.isnan(oldy[i, k, q])):
+                    xs[nrows, n] = oldx[i, k, q]
+                    ys[nrows, n] = oldy[i, k, q]
+                    n += 1
+            if n == 0:
+                continue
+            if np.any(xs[nrows, 1:n] < xs[nrows, : n - 1]):
+                order = np.argsort(xs[nrows, :n])
+                xs[nrows, :n] = xs[nrows, :n][order]
+                ys[nrows, :n] = ys[nrows, :n][order]
+            ns[nrows] = n
+            gs[nrows] = oldg[k, 0]
+            nrows += 1
+        if nrows == 0 or np.all(np.isnan(newx[i])):
+            continue
+        for t in range(nt):
+            v = newx[i, t]
+            if np.isnan(v) or np.isnan(gi[t]):
+                continue
+            if method == "nearest":
+                out[i, t] = _nearest_on_grid(xs, ys, ns, gs, nrows, v, gi[t])
+            else:
+                out[i, t] = _interp_on_grid(xs, ys, ns, gs, nrows, v, gi[t], cubic)
+        out[i] = _extrapolate_on_quantiles(
+            out[i], oldx[i], oldg, oldy[i], newx[i], gi, extrap
+        )
+    return out
+
+
+# Codes of the interpolation and extrapolation methods of `_interp_on_quantiles_1d`.
+INTERP_METHODS = {"nearest": 0, "linear": 1, "cubic": 2}
+EXTRAP_METHODS = {"constant": 0, "nan": 1}
+
+
+@njit(nogil=True, cache=False)
+def _spline_slopes(x, y, n):
+    """
+    Compute the slopes at the nodes of the cubic spline with "not-a-knot" boundary conditions.
+
+    This is the spline of :py:class:`scipy.interpolate.interp1d` with `kind="cubic"`, the tridiagonal system is
+    the one of :py:class:`scipy.interpolate.CubicSpline`. There must be at least 4 nodes.
+    """
+    dx = x[1:n] - x[: n - 1]
+    slope = (y[1:n] - y[: n - 1]) / dx
+    lower = np.empty(n)
+    diag = np.empty(n)
+    upper = np.empty(n)
+    rhs = np.empty(n)
+
+    d = x[2] - x[0]
+    diag[0] = dx[1]
+    upper[0] = d
+    rhs[0] = ((dx[0] + 2 * d) * dx[1] * slope[0] + dx[0] ** 2 * slope[1]) / d
+    for i in range(1, n - 1):
+        lower[i] = dx[i]
+        diag[i] = 2 * (dx[i - 1] + dx[i])
+        upper[i] = dx[i - 1]
+        rhs[i] = 3 * (dx[i] * slope[i - 1] + dx[i - 1] * slope[i])
+    d = x[n - 1] - x[n - 3]
+    lower[n - 1] = d
+    diag[n - 1] = dx[n - 3]
+    rhs[n - 1] = (
+        dx[n - 2] ** 2 * slope[n - 3] + (2 * d + dx[n - 2]) * dx[n - 3] * slope[n - 2]
+    ) / d
+
+    # Thomas algorithm
+    for i in range(1, n):
+        w = lower[i] / diag[i - 1]
+        diag[i] = diag[i] - w * upper[i - 1]
+        rhs[i] = rhs[i] - w * rhs[i - 1]
+    out = np.empty(n)
+    out[n - 1] = rhs[n - 1] / diag[n - 1]
+    for i in range(n - 2, -1, -1):
+        out[i] = (rhs[i] - upper[i] * out[i + 1]) / diag[i]
+    return out
+
+
+@njit(nogil=True, cache=False)
+def _valid_sorted_nodes(oldx, oldy):
+    """Get the nodes where neither `oldx` nor `oldy` is NaN, sorted along `oldx`."""
+    xs = np.empty(oldx.size)
+    ys = np.empty(oldx.size)
+    n = 0
+    for q in range(oldx.size):
+        if not (np.isnan(oldx[q]) or np.isnan(oldy[q])):
+            xs[n] = oldx[q]
+            ys[n] = oldy[q]
+            n += 1
+    xs = xs[:n]
+    ys = ys[:n]
+    if np.any(xs[1:] < xs[:-1]):
+        order = np.argsort(xs)
+        return xs[order], ys[order]
+    return xs, ys
+
+
+@njit(nogil=True, cache=False)
+def _first_and_last_valid(arr):
+    """Get the first and last non-NaN elements of a 1D array, NaN if there are none."""
+    first = np.nan
+    last = np.nan
+    for q in range(arr.size):
+        if not np.isnan(arr[q]):
+            first = arr[q]
+            break
+    for q in range(arr.size - 1, -1, -1):
+        if not np.isnan(arr[q]):
+            last = arr[q]
+            break
+    return first, last
+
+
+@njit(nogil=True, cache=False)
+def _interp_nearest_1d(newx, xs, ys, out):
+    """Take the value of the node nearest to each point of `newx`, half-way points go to the left node, as in scipy."""
+    mids = (xs[1:] + xs[:-1]) / 2
+    for t in range(newx.size):
+        out[t] = ys[_bisect(mids, mids.size, newx[t], False)]
+
+
+@njit(nogil=True, cache=False)
+def _interp_piecewise_1d(newx, xs, ys, slopes, out):
+    """Interpolate linearly between the nodes, or with a cubic Hermite polynomial if the `slopes` are given."""
+    n = xs.size
+    for t in range(newx.size):
+        v = newx[t]
+        if n == 1 or v >= xs[n - 1]:
+            out[t] = ys[n - 1]
+            continue
+        j = max(_bisect(xs, n, v, True) - 1, 0)
+        dx = xs[j + 1] - xs[j]
+        slope = (ys[j + 1] - ys[j]) / dx
+        if slopes.size == 0:
+            out[t] = slope * (v - xs[j]) + ys[j]
+        else:
+            dt = v - xs[j]
+            c2 = (3 * slope - 2 * slopes[j] - slopes[j + 1]) / dx
+            c3 = (slopes[j] + slopes[j + 1] - 2 * slope) / dx**2
+            out[t] = ys[j] + dt * (slopes[j] + dt * (c2 + dt * c3))
+
+
+@njit(nogil=True, cache=False)
+def _interp_1d(newx, oldx, oldy, method, extrap, out):
+    """
+    Interpolate `oldy` on `newx`, as :py:class:`scipy.interpolate.interp1d`, the result is written in `out`.
+
+    Nodes where `oldx` or `oldy` is NaN are skipped and NaNs of `newx` are left NaN.
+    `method` and `extrap` are codes from `INTERP_METHODS` and `EXTRAP_METHODS`.
+    With a constant extrapolation, values of `newx` outside the nodes are given the first
+    or last non-NaN value of `oldy`. Cubic interpolation falls back to linear with less than 4 nodes.
+    The nodes of a cubic interpolation must be distinct, which is checked by :py:func:`xsdba.utils._interp_on_quantiles_1D`.
+    """
+    xs, ys = _valid_sorted_nodes(oldx, oldy)
+    n = xs.size
+    if n == 0:
+        out[:] = np.nan
+        return
+    if method == 0:
+        _interp_nearest_1d(newx, xs, ys, out)
+    elif method == 2 and n >= 4:
+        _interp_piecewise_1d(newx, xs, ys, _spline_slopes(xs, ys, n), out)
+    else:
+        _interp_piecewise_1d(newx, xs, ys, np.empty(0), out)
+
+    low, high = _first_and_last_valid(oldy) if extrap == 0 else (np.nan, np.nan)
+    for t in range(newx.size):
+        if np.isnan(newx[t]):
+            out[t] = np.nan
+        elif newx[t] < xs[0]:
+            out[t] = low
+        elif newx[t] > xs[n - 1]:
+            out[t] = high
+
+
+@guvectorize(
+    [(float64[:], float64[:], float64[:], int64, int64, float64[:])],
+    "(t),(q),(q),(),()->(t)",
+    nopython=True,
+    cache=False,
+)
+def _interp_on_quantiles_1d(newx, oldx, oldy, method, extrap, out):
+    """Interpolate `oldy` on `newx`, as :py:class:`scipy.interpolate.interp1d`, see :py:func:`_interp_1d`."""
+    _interp_1d(newx, oldx, oldy, method, extrap, out)
+
+
 @njit(
     fastmath=False,
     nogil=True,
@@ -450,3 +2309,53 @@ def _pairwise_haversine_and_bins(lond, latd, transpose=False):
     if transpose:
         np.fill_diagonal(dists, 0)
     return dists, mn, mx
+
+
+# Constants of the Philox4x32 counter-based generator (Salmon et al., 2011)
+_PHILOX_M0 = np.uint64(0xD2511F53)
+_PHILOX_M1 = np.uint64(0xCD9E8D57)
+_PHILOX_W0 = np.uint64(0x9E3779B9)
+_PHILOX_W1 = np.uint64(0xBB67AE85)
+_MASK32 = np.uint64(0xFFFFFFFF)
+_SHIFT32 = np.uint64(32)
+
+
+@njit(nogil=True, cache=False)
+def _philox4x32(c0, c1, c2, c3, k0, k1):
+    """The 10 rounds of Philox4x32 on a counter of four 32-bit words, with a key of two 32-bit words."""
+    for _ in range(10):
+        p0 = _PHILOX_M0 * c0
+        p1 = _PHILOX_M1 * c2
+        c0, c1, c2, c3 = (
+            (p1 >> _SHIFT32) ^ c1 ^ k0,
+            p1 & _MASK32,
+            (p0 >> _SHIFT32) ^ c3 ^ k1,
+            p0 & _MASK32,
+        )
+        k0 = (k0 + _PHILOX_W0) & _MASK32
+        k1 = (k1 + _PHILOX_W1) & _MASK32
+    return c0, c1, c2, c3
+
+
+@njit(nogil=True, cache=False)
+def _philox_uniform(counter, stream, key):
+    """
+    Uniform random numbers in [0, 1), one for each element of `counter`.
+
+    The number of an element is Philox4x32 applied to its 64-bit counter and the 64-bit `stream`, with the 64-bit
+    `key`. It only depends on these three values, not on the other elements.
+    """
+    out = np.empty(counter.size, dtype=np.float64)
+    k0 = key & _MASK32
+    k1 = key >> _SHIFT32
+    s0 = stream & _MASK32
+    s1 = stream >> _SHIFT32
+    for i in range(counter.size):
+        x0, x1, _, _ = _philox4x32(
+            counter[i] & _MASK32, counter[i] >> _SHIFT32, s0, s1, k0, k1
+        )
+        # 53 random bits, as numpy does for doubles
+        out[i] = ((x0 >> np.uint64(5)) * 67108864.0 + (x1 >> np.uint64(6))) / (
+            9007199254740992.0
+        )
+    return out
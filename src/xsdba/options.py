@@ -4,21 +4,143 @@ Global or contextual options for xsdba, similar to xarray.set_options.
 
 from __future__ import annotations
 
-from collections.abc import Callable
+import os
+import threading
+from collections.abc import Callable, Iterator
+from pathlib import Path
 
 EXTRA_OUTPUT = "extra_output"
 AS_DATASET = "as_dataset"
+OT_PLAN_CACHE = "ot_plan_cache"
+NUMBA_CACHE_DIR = "numba_cache_dir"
+TRAIN_CACHE = "train_cache"
+TRAIN_CACHE_SIZE = "train_cache_size"
+PROFILE = "profile"
+RANDOM_SEED = "random_seed"
 
 MISSING_METHODS: dict[str, Callable] = {}
 
 OPTIONS = {
     EXTRA_OUTPUT: False,
     AS_DATASET: False,
+    OT_PLAN_CACHE: 0,
+    NUMBA_CACHE_DIR: None,
+    TRAIN_CACHE: None,
+    TRAIN_CACHE_SIZE: 2**30,
+    PROFILE: False,
+    RANDOM_SEED: None,
 }
 
 _VALIDATORS = {
     EXTRA_OUTPUT: lambda opt: isinstance(opt, bool),
     AS_DATASET: lambda opt: isinstance(opt, bool),
+    OT_PLAN_CACHE: lambda opt: isinstance(opt, int) and opt >= 0,
+    NUMBA_CACHE_DIR: lambda opt: opt is None or isinstance(opt, str | os.PathLike),
+    TRAIN_CACHE: lambda opt: opt is None or isinstance(opt, str | os.PathLike),
+    TRAIN_CACHE_SIZE: lambda opt: isinstance(opt, int) and opt > 0,
+    PROFILE: lambda opt: isinstance(opt, bool),
+    RANDOM_SEED: lambda opt: opt is None or (isinstance(opt, int) and opt >= 0),
+}
+
+
+def _numba_kernels() -> Iterator:
+    """Iterate over the numba dispatchers of xsdba's kernels, including those of generalized ufuncs."""
+    from numba.core.registry import CPUDispatcher
+    from numba.np.ufunc.gufunc import GUFunc
+
+    from xsdba import loess, nbutils
+
+    for module in [nbutils, loess]:
+        for obj in vars(module).values():
+            if isinstance(obj, CPUDispatcher):
+                yield obj
+            elif isinstance(obj, GUFunc):
+                yield obj._dispatcher
+
+
+def _numba_cache_attribute(kernel) -> str:
+    """Name of the private attribute holding the on-disk cache of a numba dispatcher."""
+    from numba.core.dispatcher import Dispatcher
+
+    return "_cache" if isinstance(kernel, Dispatcher) else "cache"
+
+
+def _numba_cache_class(path: str | os.PathLike) -> type:
+    """Numba cache class storing the compiled functions in `path`, whatever numba's ``CACHE_DIR``."""
+    from numba.core import caching
+
+    class _Locator(caching.UserProvidedCacheLocator):
+        def __init__(self, py_func, py_file):
+            self._py_file = py_file
+            self._lineno = py_func.__code__.co_firstlineno
+            self._cache_path = str(
+                Path(path) / self.get_suitable_cache_subpath(py_file)
+            )
+
+        @classmethod
+        def from_function(cls, py_func, py_file):
+            # Skip the check of numba's CACHE_DIR by UserProvidedCacheLocator
+            return super(caching.UserProvidedCacheLocator, cls).from_function(
+                py_func, py_file
+            )
+
+    class _Impl(caching.CompileResultCacheImpl):
+        _locator_classes = [_Locator]
+
+    class _Cache(caching.FunctionCache):
+        _impl_class = _Impl
+
+    return _Cache
+
+
+# Serializes the changes of the caches of the kernels
+_NUMBA_CACHE_LOCK = threading.Lock()
+
+
+def _set_numba_cache_dir(path: str | os.PathLike | None):
+    """Store the compiled kernels of xsdba in `path`, or stop caching them on disk if None."""
+    import numba
+    from numba.core import caching
+
+    # The caches are private attributes of numba's dispatchers, which are checked rather than silently not caching.
+    kernels = list(_numba_kernels())
+    found = [hasattr(kernel, _numba_cache_attribute(kernel)) for kernel in kernels]
+    found += [
+        hasattr(caching, name)
+        for name in [
+            "UserProvidedCacheLocator",
+            "CompileResultCacheImpl",
+            "FunctionCache",
+        ]
+    ]
+    if not all(found):
+        raise RuntimeError(
+            f"The `numba_cache_dir` option does not support numba {numba.__version__}, whose dispatchers no longer "
+            "store their cache as expected by xsdba."
+        )
+
+    if path is None:
+        # This is the state of numba's dispatchers compiled with `cache=False`.
+        caches = [caching.NullCache() for _ in kernels]
+    else:
+        # The location of the cache is given to each kernel, numba's configuration is left unchanged.
+        cache_class = _numba_cache_class(path)
+        caches = [cache_class(kernel.py_func) for kernel in kernels]
+    with _NUMBA_CACHE_LOCK:
+        for kernel, cache in zip(kernels, caches, strict=True):
+            setattr(kernel, _numba_cache_attribute(kernel), cache)
+
+
+def _set_profile(value: bool):
+    """Start or stop recording the stages of trainings and adjustments."""
+    from xsdba import profiling
+
+    profiling._enable(value)
+
+
+_SETTERS = {
+    NUMBA_CACHE_DIR: _set_numba_cache_dir,
+    PROFILE: _set_profile,
 }
 
 
@@ -34,6 +156,40 @@ class set_options:
         docstring. When activated, `adjust` will return a Dataset with `scen` and those extra diagnostics
         For `processing` functions, see the doc, the output type might change, or not depending on the
         algorithm. Default: ``False``.
+    ot_plan_cache : int
+        Number of optimal transport plans kept in memory by :py:func:`xsdba.utils.optimal_transport`, for
+        :py:class:`xsdba.adjustment.OTC` and :py:class:`xsdba.adjustment.dOTC`. A plan is reused when the same
+        histograms are transported again, as when adjusting many simulations against the same `ref` and `hist`
+        with a fixed `bin_width`. With `dask`, the value of the option when the adjustment is called applies,
+        even if it is computed later. Default: ``0``, no plan is kept.
+    numba_cache_dir : str or os.PathLike, optional
+        Directory where the compiled `numba` kernels of xsdba are stored, and loaded from in later sessions
+        instead of being compiled again. The directory should not be shared by processes writing to it at the same
+        time, such as parallel test workers. Default: ``None``, the kernels are compiled in each process and not
+        stored on disk. Only applies to the kernels of xsdba in the current process : the configuration of numba is
+        left unchanged and the option must also be set in the workers of a distributed cluster. See also the
+        ``xsdba warmup`` command.
+    train_cache : str or os.PathLike, optional
+        Directory where the trained datasets of :py:class:`xsdba.adjustment.TrainAdjust` objects are stored. A new
+        training of the same class, with the same arguments and on the same `ref` and `hist`, is then read from
+        this directory instead of being computed. The inputs are identified by their dask token : the hash of the
+        data of in-memory arrays, or the name of the graph of dask arrays, which is cheap to compute. Requires
+        `zarr`. Default: ``None``, trainings are not cached.
+    train_cache_size : int
+        Maximal size in bytes of the ``train_cache`` directory. When it is exceeded, the least recently used
+        trainings are removed. Default: ``2**30`` (1 GiB).
+    profile : bool
+        Whether to record the wall time, the peak memory usage and the dask tasks of the stages of trainings and
+        adjustments. Each time the option is set, a new report is started, which is returned by
+        :py:func:`xsdba.profiling.get_report`. See also the :py:func:`xsdba.profiling.profile` context manager.
+        Default: ``False``.
+    random_seed : int, optional
+        Seed of the random numbers drawn by :py:func:`xsdba.processing.jitter`, :py:func:`xsdba.processing.adapt_freq`,
+        :py:func:`xsdba.processing.uniform_noise_like`, the frequency adaptation of the adjustment methods and the
+        optimal transport of :py:class:`xsdba.adjustment.OTC` and :py:class:`xsdba.adjustment.dOTC`. These numbers
+        only depend on the seed and on the coordinates of the element they are drawn for, so the results are the
+        same for any chunking and scheduling. The seed is read when the computation is defined, not when dask computes
+        it. Default: ``None``, a new seed is drawn each time.
 
     Examples
     --------
@@ -74,6 +230,9 @@ class set_options:
     @staticmethod
     def _update(kwargs):
         """Update values."""
+        for k, v in kwargs.items():
+            if k in _SETTERS and v != OPTIONS[k]:
+                _SETTERS[k](v)
         OPTIONS.update(kwargs)
 
     def __exit__(self, option_type, value, traceback):  # noqa: F841
@@ -6,12 +6,10 @@ Pre- and Post-Processing Submodule
 """
 from __future__ import annotations
 
-import types
 from collections.abc import Sequence
 from typing import cast
 
 import cftime
-import dask.array as dsk
 import numpy as np
 import xarray as xr
 from xarray.core import dtypes
@@ -22,7 +20,12 @@ from xsdba.base import Grouper, uses_dask
 from xsdba.formatting import update_xsdba_history
 from xsdba.nbutils import _escore
 from xsdba.units import harmonize_units
-from xsdba.utils import ADDITIVE, copy_all_attrs
+from xsdba.utils import (
+    ADDITIVE,
+    _default_random_key,
+    copy_all_attrs,
+    random_uniform,
+)
 
 __all__ = [
     "adapt_freq",
@@ -51,6 +54,7 @@ def adapt_freq(
     *,
     group: Grouper | str,
     thresh: str = "0 mm d-1",
+    key: str | None = None,
 ) -> tuple[xr.DataArray, xr.DataArray, xr.DataArray]:
     r"""
     Adapt frequency of values under thresh of `sim`, in order to match ref.
@@ -69,6 +73,9 @@ def adapt_freq(
         Grouping information, see base.Grouper.
     thresh : str
         Threshold below which values are considered zero, a quantity with units.
+    key : str, optional
+        Key of the random values given to `sim`, see :py:func:`xsdba.utils.random_uniform`. Defaults to the name of
+        `sim` and a token of its data.
 
     Returns
     -------
@@ -92,11 +99,18 @@ def adapt_freq(
     number between :math:`T_0` and :math:`P_{th}`, where :math:`P_{th} = F_{ref}^{-1}( F_{sim}( T_0 ) )` and
     `F(x)` is the empirical cumulative distribution function (CDF).
 
+    The random values are drawn with :py:func:`xsdba.utils.random_uniform`.
+
     References
     ----------
     :cite:cts:`themesl_empirical-statistical_2012`
     """
-    out = _adapt_freq(xr.Dataset(dict(sim=sim, ref=ref)), group=group, thresh=thresh)
+    out = _adapt_freq(
+        xr.Dataset(dict(sim=sim, ref=ref)),
+        group=group,
+        thresh=thresh,
+        key=_default_random_key(sim) if key is None else key,
+    )
 
     # Set some metadata
     copy_all_attrs(out, sim)
@@ -116,7 +130,9 @@ def adapt_freq(
     return out.sim_ad, out.pth, out.dP0
 
 
-def jitter_under_thresh(x: xr.DataArray, thresh: str) -> xr.DataArray:
+def jitter_under_thresh(
+    x: xr.DataArray, thresh: str, key: str | None = None
+) -> xr.DataArray:
     """
     Replace values smaller than threshold by a uniform random noise.
 
@@ -126,6 +142,8 @@ def jitter_under_thresh(x: xr.DataArray, thresh: str) -> xr.DataArray:
         Values.
     thresh : str
         Threshold under which to add uniform random noise to values, a quantity with units.
+    key : str, optional
+        Key of the noise, see :py:func:`jitter`. Defaults to the name of `x` and a token of its data.
 
     Returns
     -------
@@ -139,11 +157,15 @@ def jitter_under_thresh(x: xr.DataArray, thresh: str) -> xr.DataArray:
     -----
     If thresh is high, this will change the mean value of x.
     """
-    j: xr.DataArray = jitter(x, lower=thresh, upper=None, minimum=None, maximum=None)
+    j: xr.DataArray = jitter(
+        x, lower=thresh, upper=None, minimum=None, maximum=None, key=key
+    )
     return j
 
 
-def jitter_over_thresh(x: xr.DataArray, thresh: str, upper_bnd: str) -> xr.DataArray:
+def jitter_over_thresh(
+    x: xr.DataArray, thresh: str, upper_bnd: str, key: str | None = None
+) -> xr.DataArray:
     """
     Replace values greater than threshold by a uniform random noise.
 
@@ -155,6 +177,8 @@ def jitter_over_thresh(x: xr.DataArray, thresh: str, upper_bnd: str) -> xr.DataA
         Threshold over which to add uniform random noise to values, a quantity with units.
     upper_bnd : str
         Maximum possible value for the random noise, a quantity with units.
+    key : str, optional
+        Key of the noise, see :py:func:`jitter`. Defaults to the name of `x` and a token of its data.
 
     Returns
     -------
@@ -169,7 +193,7 @@ def jitter_over_thresh(x: xr.DataArray, thresh: str, upper_bnd: str) -> xr.DataA
     If thresh is low, this will change the mean value of x.
     """
     j: xr.DataArray = jitter(
-        x, lower=None, upper=thresh, minimum=None, maximum=upper_bnd
+        x, lower=None, upper=thresh, minimum=None, maximum=upper_bnd, key=key
     )
     return j
 
@@ -182,6 +206,7 @@ def jitter(
     upper: str | None = None,
     minimum: str | None = None,
     maximum: str | None = None,
+    key: str | None = None,
 ) -> xr.DataArray:
     """
     Replace values under a threshold and values above another by a uniform random noise.
@@ -202,6 +227,9 @@ def jitter(
     maximum : str, optional
         Upper limit (excluded) for the upper end random noise, a quantity with units.
         If `upper` is not None, it must be given.
+    key : str, optional
+        Key of the noise, which makes it independent of the noise of other arrays with the same coordinates, see
+        :py:func:`xsdba.utils.random_uniform`. Defaults to the name of `x` and a token of its data.
 
     Returns
     -------
@@ -213,6 +241,11 @@ def jitter(
     Warnings
     --------
     Not to be confused with R's `jitter`, which adds uniform noise instead of replacing values.
+
+    Notes
+    -----
+    The noise is drawn with :py:func:`xsdba.utils.random_uniform`, which explains when it is reproducible and
+    why `ref` and `hist` should be given different keys.
     """
     out: xr.DataArray = x
     notnull = x.notnull()
@@ -220,31 +253,18 @@ def jitter(
         jitter_lower = np.array(lower).astype(float)
         jitter_min = np.array(minimum if minimum is not None else 0).astype(float)
         jitter_min = jitter_min + np.finfo(x.dtype).eps
-        if uses_dask(x):
-            jitter_dist = dsk.random.uniform(
-                low=dsk.from_array(jitter_min),
-                high=dsk.from_array(jitter_lower),
-                size=x.shape,
-                chunks=x.chunks,
-            )
-        else:
-            jitter_dist = np.random.uniform(
-                low=jitter_min, high=jitter_lower, size=x.shape
-            )
+        jitter_dist = random_uniform(
+            x, "jitter_lower", low=jitter_min, high=jitter_lower, key=key
+        )
         out = out.where(~((x < jitter_lower) & notnull), jitter_dist.astype(x.dtype))
     if upper is not None:
         if maximum is None:
             raise ValueError("If 'upper' is given, so must 'maximum'.")
         jitter_upper = np.array(upper).astype(float)
         jitter_max = np.array(maximum).astype(float)
-        if uses_dask(x):
-            jitter_dist = dsk.random.uniform(
-                low=jitter_upper, high=jitter_max, size=x.shape, chunks=x.chunks
-            )
-        else:
-            jitter_dist = np.random.uniform(
-                low=jitter_upper, high=jitter_max, size=x.shape
-            )
+        jitter_dist = random_uniform(
+            x, "jitter_upper", low=jitter_upper, high=jitter_max, key=key
+        )
         out = out.where(~((x >= jitter_upper) & notnull), jitter_dist.astype(x.dtype))
 
     copy_all_attrs(out, x)  # copy attrs and same units
@@ -296,25 +316,17 @@ def normalize(
 
 
 def uniform_noise_like(
-    da: xr.DataArray, low: float = 1e-6, high: float = 1e-3
+    da: xr.DataArray, low: float = 1e-6, high: float = 1e-3, key: str | None = None
 ) -> xr.DataArray:
     """
     Return a uniform noise array of the same shape as da.
 
     Noise is uniformly distributed between low and high.
     Alternative method to `jitter_under_thresh` for avoiding zeroes.
+    The noise is drawn with :py:func:`xsdba.utils.random_uniform`.
     """
-    mod: types.ModuleType
-    kw: dict
-    if uses_dask(da):
-        mod = dsk
-        kw = {"chunks": da.chunks}
-    else:
-        mod = np
-        kw = {}
-
     return da.copy(
-        data=(high - low) * mod.random.random_sample(size=da.shape, **kw) + low
+        data=random_uniform(da, "uniform_noise", low=low, high=high, key=key).data
     )
 
 
@@ -0,0 +1,322 @@
+"""
+# noqa: SS01
+Profiling
+=========
+
+Record the wall time, the memory usage and the `dask` tasks of the stages of trainings and adjustments.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import NamedTuple
+
+from xsdba.options import OPTIONS, PROFILE, set_options
+
+__all__ = ["ProfileReport", "get_report", "profile", "profiled", "stage"]
+
+# Interval between two measures of the memory usage, in seconds
+_RSS_INTERVAL = 0.01
+
+
+class Event(NamedTuple):
+    """A stage or a dask task, with its times in seconds from :py:func:`time.perf_counter`."""
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread: int
+    peak_rss: int | None
+    tasks: int
+
+
+def _current_rss() -> int | None:
+    """Resident set size of the process in bytes, None if it can't be measured."""
+    try:
+        import psutil  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return None
+
+
+class ProfileReport:
+    """
+    Stages and tasks recorded while the ``profile`` option was set.
+
+    Events are of three categories :
+
+    - "stage" : a named step of xsdba, like the harmonization of units, the grouping of the data, the training
+      of a method or the computation of quantiles.
+    - "graph" : the construction of the dask graph of a function wrapped by :py:func:`xsdba.base.map_blocks`,
+      whose number of tasks is recorded. With in-memory data, it is instead the computation of the function.
+    - "task" : the execution of a dask task, named after its key. The blocks of :py:func:`xsdba.base.map_blocks`
+      are named ``block_<function>`` and those of :py:func:`xsdba.base.map_groups` ``block_group_<function>``.
+      Tasks are only recorded with the local schedulers of dask, not with `dask.distributed`.
+
+    The peak resident memory of an event is the largest memory usage of the process measured during that event.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.events: list[Event] = []
+        # Measures of the memory usage, as (time, rss) pairs
+        self.rss: list[tuple[float, int]] = []
+
+    def _sample(self) -> int | None:
+        rss = _current_rss()
+        if rss is not None:
+            self.rss.append((time.perf_counter(), rss))
+        return rss
+
+    def _record(
+        self, name: str, category: str, start: float, thread: int, tasks: int = 0
+    ):
+        end = time.perf_counter()
+        rss = self._sample()
+        first = bisect.bisect_left(self.rss, (start,))
+        peak = max((r for _, r in self.rss[first:]), default=rss)
+        self.events.append(
+            Event(name, category, start, end - start, thread, peak, tasks)
+        )
+
+    def summary(self):
+        """
+        Compute the totals of the events, by name and category.
+
+        Returns
+        -------
+        pd.DataFrame
+            The number of occurrences, the total and the mean wall time in seconds, the largest peak resident
+            memory in bytes and the number of tasks in the built graphs, sorted by decreasing total time.
+        """
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        df = pd.DataFrame(self.events, columns=Event._fields)
+        out = df.groupby(["name", "category"]).agg(
+            count=("duration", "size"),
+            total_time=("duration", "sum"),
+            mean_time=("duration", "mean"),
+            peak_rss=("peak_rss", "max"),
+            tasks=("tasks", "sum"),
+        )
+        return out.sort_values("total_time", ascending=False)
+
+    def __repr__(self) -> str:
+        """Return the summary as a table."""
+        if not self.events:
+            return f"<{self.__class__.__name__}: no events>"
+        return self.summary().to_string()
+
+    def to_chrome_trace(self, path: str | os.PathLike | None = None) -> dict:
+        """
+        Export the events in the Chrome trace format.
+
+        The trace can be opened in ``chrome://tracing`` or https://ui.perfetto.dev. Stages and tasks are shown
+        on the timeline of the thread that ran them, and the memory usage as a counter.
+
+        Parameters
+        ----------
+        path : str or os.PathLike, optional
+            If given, the trace is written to this JSON file.
+
+        Returns
+        -------
+        dict
+            The trace.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": event.name,
+                "cat": event.category,
+                "ph": "X",
+                "ts": (event.start - self.start) * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": pid,
+                "tid": event.thread,
+                "args": {"peak_rss": event.peak_rss, "tasks": event.tasks},
+            }
+            for event in self.events
+        ]
+        events.extend(
+            {
+                "name": "rss",
+                "ph": "C",
+                "ts": (t - self.start) * 1e6,
+                "pid": pid,
+                "args": {"rss": rss},
+            }
+            for t, rss in self.rss
+        )
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(trace, f)
+        return trace
+
+
+# The report of the current or last profiling, and what records it
+_REPORT: ProfileReport | None = None
+_CALLBACK = None
+_SAMPLER: tuple[threading.Thread, threading.Event] | None = None
+
+
+def _task_callback():
+    """A dask callback recording the execution of tasks in the current report."""
+    from dask.callbacks import Callback  # pylint: disable=import-outside-toplevel
+    from dask.utils import key_split  # pylint: disable=import-outside-toplevel
+
+    class _TaskCallback(Callback):
+        def __init__(self):
+            super().__init__()
+            self.starts = {}
+
+        def _pretask(self, key, dsk, state):
+            self.starts[key] = time.perf_counter()
+
+        def _posttask(self, key, result, dsk, state, worker_id):
+            start = self.starts.pop(key, None)
+            if _REPORT is not None and start is not None:
+                _REPORT._record(key_split(key), "task", start, worker_id)
+
+    return _TaskCallback()
+
+
+def _sample_rss(report: ProfileReport, stop: threading.Event):
+    while not stop.wait(_RSS_INTERVAL):
+        report._sample()
+
+
+def _enable(value: bool):
+    """Start a new report and record in it, or stop recording."""
+    global _REPORT, _CALLBACK, _SAMPLER  # pylint: disable=global-statement
+    if value:
+        _REPORT = ProfileReport()
+        _REPORT._sample()
+        _CALLBACK = _task_callback()
+        _CALLBACK.register()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=_sample_rss, args=(_REPORT, stop), name="xsdba-rss", daemon=True
+        )
+        thread.start()
+        _SAMPLER = (thread, stop)
+    else:
+        if _SAMPLER is not None:
+            thread, stop = _SAMPLER
+            stop.set()
+            thread.join()
+        if _CALLBACK is not None:
+            _CALLBACK.unregister()
+        _CALLBACK = _SAMPLER = None
+        if _REPORT is not None:
+            _REPORT._sample()
+            _REPORT.end = time.perf_counter()
+
+
+def get_report() -> ProfileReport | None:
+    """
+    Return the report of the current profiling, or of the last one.
+
+    A new report is started each time the ``profile`` option of :py:class:`xsdba.set_options` is set.
+
+    Returns
+    -------
+    ProfileReport or None
+        The report, None if nothing was profiled in this session.
+    """
+    return _REPORT
+
+
+@contextmanager
+def profile() -> Iterator[ProfileReport]:
+    """
+    Profile the trainings and adjustments done in this context.
+
+    This sets the ``profile`` option of :py:class:`xsdba.set_options`. If it was already set, the events are
+    recorded in the current report.
+
+    Yields
+    ------
+    ProfileReport
+        The report in which events are recorded.
+
+    Examples
+    --------
+    >>> from xsdba.profiling import profile
+    >>> with profile() as report:
+    ...     scen = EmpiricalQuantileMapping.train(ref, hist).adjust(sim).load()
+    ...
+    >>> report.summary()  # doctest: +SKIP
+    >>> report.to_chrome_trace("trace.json")  # doctest: +SKIP
+    """
+    with set_options(profile=True):
+        yield _REPORT
+
+
+@contextmanager
+def stage(name: str, tasks: Callable | None = None) -> Iterator[None]:
+    """
+    Record a stage in the current report, if the ``profile`` option is set.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    tasks : callable, optional
+        Called at the end of the stage, returning the number of dask tasks built during the stage. If given,
+        the event is of the "graph" category.
+
+    Yields
+    ------
+    None
+        The stage is recorded when the context exits.
+    """
+    if not OPTIONS[PROFILE]:
+        yield
+        return
+    start = time.perf_counter()
+    yield
+    if _REPORT is not None:
+        category = "stage" if tasks is None else "graph"
+        _REPORT._record(
+            name, category, start, threading.get_ident(), tasks() if tasks else 0
+        )
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorate a function so that its calls are recorded as a stage when the ``profile`` option is set.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    """
+
+    def _decorator(func):
+        @wraps(func)
+        def _profiled(*args, **kwargs):
+            if not OPTIONS[PROFILE]:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return _profiled
+
+    return _decorator
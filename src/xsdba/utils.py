@@ -2,27 +2,44 @@
 
 from __future__ import annotations
 
+import hashlib
 import itertools
+import threading
+import zlib
+from collections import OrderedDict
 from collections.abc import Callable
 from warnings import warn
 
 import bottleneck as bn
 import numpy as np
+import pandas as pd
 import xarray as xr
 from boltons.funcutils import wraps
 from dask import array as dsk
-from scipy.interpolate import griddata, interp1d
+from dask.base import tokenize
+from scipy import sparse
 from scipy.spatial import distance
 from scipy.stats import spearmanr
 from xarray.core.utils import get_temp_dimname
 
 from xsdba.base import (
     Grouper,
+    _block_option,
     _interpolate_doy_calendar,
     ensure_chunk_size,
+    get_seed,
     parse_group,
+    uses_dask,
 )
-from xsdba.nbutils import _extrapolate_on_quantiles
+from xsdba.nbutils import (
+    EXTRAP_METHODS,
+    INTERP_METHODS,
+    _interp_on_quantiles_1d,
+    _interp_on_quantiles_grid,
+    _philox_uniform,
+)
+from xsdba.options import OT_PLAN_CACHE
+from xsdba.profiling import profiled
 
 MULTIPLICATIVE = "*"
 ADDITIVE = "+"
@@ -329,88 +346,70 @@ def add_cyclic_bounds(
     return ensure_chunk_size(qmf, **{att: -1})
 
 
-def _interp_on_quantiles_1D_multi(newxs, oldx, oldy, method, extrap):  # noqa: N802
-    # Perform multiple interpolations with a single call of interp1d.
-    # This should be used when `oldx` is common for many data arrays (`newxs`)
-    # that we want to interpolate on. For instance, with QuantileDeltaMapping, we simply
-    # interpolate on quantiles that always remain the same.
-    if len(newxs.shape) == 1:
-        return _interp_on_quantiles_1D(newxs, oldx, oldy, method, extrap)
-    mask_old = np.isnan(oldy) | np.isnan(oldx)
-    if extrap == "constant":
-        fill_value = (
-            oldy[~np.isnan(oldy)][0],
-            oldy[~np.isnan(oldy)][-1],
-        )
-    else:  # extrap == 'nan'
-        fill_value = np.nan
-
-    finterp1d = interp1d(
-        oldx[~mask_old],
-        oldy[~mask_old],
-        kind=method,
-        bounds_error=False,
-        fill_value=fill_value,
-    )
-
-    out = np.zeros_like(newxs)
-    for ii in range(newxs.shape[0]):
-        mask_new = np.isnan(newxs[ii, :])
-        y1 = newxs[ii, :].copy() * np.nan
-        y1[~mask_new] = finterp1d(newxs[ii, ~mask_new])
-        out[ii, :] = y1.flatten()
-    return out
-
-
 def _interp_on_quantiles_1D(newx, oldx, oldy, method, extrap):  # noqa: N802
+    # Batched over all leading dimensions, see `nbutils._interp_on_quantiles_1d`.
+    if method not in INTERP_METHODS:
+        raise ValueError(f"Unknown interpolation method {method}.")
     mask_new = np.isnan(newx)
     mask_old = np.isnan(oldy) | np.isnan(oldx)
-    out = np.full_like(newx, np.nan, dtype=f"float{oldy.dtype.itemsize * 8}")
-    if np.all(mask_new) or np.all(mask_old):
+    if np.any(np.all(mask_new, axis=-1)) or np.any(np.all(mask_old, axis=-1)):
         warn(
             "All-nan slice encountered in interp_on_quantiles",
             category=RuntimeWarning,
         )
-        return out
-
-    if extrap == "constant":
-        fill_value = (
-            oldy[~np.isnan(oldy)][0],
-            oldy[~np.isnan(oldy)][-1],
-        )
-    else:  # extrap == 'nan'
-        fill_value = np.nan
-
-    out[~mask_new] = interp1d(
-        oldx[~mask_old],
-        oldy[~mask_old],
-        kind=method,
-        bounds_error=False,
-        fill_value=fill_value,
-    )(newx[~mask_new])
-    return out
+    if method == "cubic":
+        # The spline is undefined on repeated nodes, like those of many zero precipitation quantiles
+        nodes = np.sort(np.where(mask_old, np.nan, oldx), axis=-1)
+        if np.any(np.diff(nodes, axis=-1) == 0):
+            raise ValueError(
+                "Cubic interpolation on quantiles requires distinct nodes, but `xq` has duplicates. "
+                "Use a linear or nearest interpolation instead."
+            )
+    out = _interp_on_quantiles_1d(
+        np.asarray(newx, dtype=float),
+        np.asarray(oldx, dtype=float),
+        np.asarray(oldy, dtype=float),
+        INTERP_METHODS[method],
+        EXTRAP_METHODS[extrap],
+    )
+    return out.astype(f"float{oldy.dtype.itemsize * 8}", copy=False)
 
 
 def _interp_on_quantiles_2d(newx, newg, oldx, oldy, oldg, method, extrap):
+    # Batched over all leading dimensions, see `nbutils._interp_on_quantiles_grid`.
+    if method not in ["nearest", "linear", "cubic"]:
+        raise ValueError(f"Unknown interpolation method {method}.")
+    lead = np.broadcast_shapes(
+        newx.shape[:-1], newg.shape[:-1], oldx.shape[:-2], oldy.shape[:-2]
+    )
+    nt = newx.shape[-1]
+    ng, nq = oldx.shape[-2:]
+    newx = np.broadcast_to(newx, lead + (nt,)).reshape(-1, nt)
+    if np.prod(newg.shape[:-1], dtype=int) > 1:
+        newg = np.broadcast_to(newg, lead + (nt,)).reshape(-1, nt)
+    else:
+        newg = newg.reshape(1, nt)
+    oldx = np.broadcast_to(oldx, lead + (ng, nq)).reshape(-1, ng, nq)
+    oldy = np.broadcast_to(oldy, lead + (ng, nq)).reshape(-1, ng, nq)
+    oldg = oldg.reshape(-1, ng, nq)[0]
+
     mask_new = np.isnan(newx) | np.isnan(newg)
     mask_old = np.isnan(oldy) | np.isnan(oldx) | np.isnan(oldg)
-    out = np.full_like(newx, np.nan, dtype=f"float{oldy.dtype.itemsize * 8}")
-    if np.all(mask_new) or np.all(mask_old):
+    if np.any(np.all(mask_new, axis=-1) | np.all(mask_old, axis=(-2, -1))):
         warn(
             "All-nan slice encountered in interp_on_quantiles",
             category=RuntimeWarning,
         )
-        return out
-    out[~mask_new] = griddata(
-        (oldx[~mask_old], oldg[~mask_old]),
-        oldy[~mask_old],
-        (newx[~mask_new], newg[~mask_new]),
-        method=method,
+    out = _interp_on_quantiles_grid(
+        newx.astype(float),
+        newg.astype(float),
+        oldx.astype(float),
+        oldy.astype(float),
+        oldg.astype(float),
+        method,
+        extrap,
     )
-    if method == "nearest" or extrap != "nan":
-        # 'nan' extrapolation implicit for cubic and linear interpolation.
-        out = _extrapolate_on_quantiles(out, oldx, oldg, oldy, newx, newg, extrap)
-    return out
+    return out.astype(f"float{oldy.dtype.itemsize * 8}").reshape(lead + (nt,))
 
 
 SEASON_MAP = {"DJF": 0, "MAM": 1, "JJA": 2, "SON": 3}
@@ -419,6 +418,7 @@ map_season_to_int = np.vectorize(SEASON_MAP.get)
 
 
 @parse_group
+@profiled("interp_on_quantiles")
 def interp_on_quantiles(
     newx: xr.DataArray,
     xq: xr.DataArray,
@@ -431,8 +431,10 @@ def interp_on_quantiles(
     """
     Interpolate values of yq on new values of x.
 
-    Interpolate in 2D with :py:func:`scipy.interpolate.griddata` if grouping is used, in 1D otherwise, with
-    :py:class:`scipy.interpolate.interp1d`.
+    Interpolate in 2D if grouping is used, in 1D otherwise. The 1D interpolation gives the same results as
+    :py:class:`scipy.interpolate.interp1d`, for all points at once. In 2D, the quantiles of each group are a
+    row of a structured grid. Linear and cubic interpolations are done along the quantiles of the groups
+    surrounding each point, and then along the group. Nearest interpolation takes the closest node.
     Any nans in `xq` or `yq` are removed from the input map.
     Similarly, nans in newx are left nans.
 
@@ -464,6 +466,13 @@ def interp_on_quantiles(
       value of `yq` and those larger than the maximum, set to the last one (first and
       last non-nan values along the "quantiles" dimension). When the grouping is "time.month",
       these limits are linearly interpolated along the month dimension.
+
+    Previous versions of xsdba did the 2D interpolation with :py:func:`scipy.interpolate.griddata`. The triangles
+    of its linear and cubic interpolations depend on the relative scales of `xq` and of the group coordinate
+    and can join quantiles of distant groups, so the results of these methods have changed. For instance,
+    a daily temperature adjusted with a monthly grouping can change by a few kelvins. Results of the nearest
+    interpolation are unchanged, except for points exactly half-way between two nodes. These now take the
+    value of the lower node, as in 1D, while `griddata` broke ties in an arbitrary order.
     """
     dim = group.dim
     prop = group.prop
@@ -482,7 +491,6 @@ def interp_on_quantiles(
             kwargs={"method": method, "extrap": extrapolation},
             input_core_dims=[[dim], ["quantiles"], ["quantiles"]],
             output_core_dims=[[dim]],
-            vectorize=True,
             dask="parallelized",
             output_dtypes=[yq.dtype],
         )
@@ -520,7 +528,6 @@ def interp_on_quantiles(
             [prop, "quantiles"],
         ],
         output_core_dims=[[dim]],
-        vectorize=True,
         dask="parallelized",
         output_dtypes=[yq.dtype],
     )
@@ -875,6 +882,141 @@ def get_clusters(data: xr.DataArray, u1, u2, dim: str = "time") -> xr.Dataset:
     return ds
 
 
+# Odd multiplier combining the labels of the coordinates of an element into its counter
+_COUNTER_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _coordinate_labels(da: xr.DataArray, dim) -> np.ndarray:
+    """Hash of the coordinate values along `dim`, or the positions along `dim` if it has no coordinate."""
+    if dim not in da.indexes:
+        return np.arange(da.sizes[dim], dtype=np.uint64)
+    index = da.indexes[dim]
+    if isinstance(index, xr.CFTimeIndex):
+        # Much faster than hashing the cftime objects
+        return pd.util.hash_array(index.asi8)
+    return pd.util.hash_array(np.asarray(index))
+
+
+def random_counter(da: xr.DataArray) -> xr.DataArray:
+    """
+    Counter of the random numbers drawn for each element of a DataArray, see :py:func:`random_uniform`.
+
+    The counter of an element combines the coordinate values of the element along each dimension, in the order of
+    the names of the dimensions. It does not depend on the chunks or on the order of the dimensions of `da`.
+    Dimensions without a coordinate contribute the position of the element along them.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        The array whose coordinates are used. Only its dimensions and coordinates are read.
+
+    Returns
+    -------
+    xr.DataArray
+        Unsigned 64-bit integers, with the same dimensions as `da`, and the same chunks if it uses dask.
+    """
+    counter = xr.DataArray(np.uint64(0))
+    for i, dim in enumerate(sorted(da.dims, key=str)):
+        labels = xr.DataArray(_coordinate_labels(da, dim), dims=(dim,))
+        if uses_dask(da):
+            labels = labels.chunk({dim: da.chunksizes[dim]})
+        counter = labels if i == 0 else counter * _COUNTER_MULTIPLIER + labels
+    return counter.transpose(*da.dims)
+
+
+def counter_uniform(
+    counter: np.ndarray, stream: str, seed: int | None = None
+) -> np.ndarray:
+    """
+    Uniform random numbers in [0, 1), one for each element of a counter array.
+
+    The numbers are generated by the counter-based Philox4x32-10 algorithm :cite:p:`salmon_parallel_2011`. Each
+    number is a function of the seed, the stream and the counter of its element only. It can thus be generated
+    independently of the other elements, in any order, by any thread.
+
+    Parameters
+    ----------
+    counter : np.ndarray
+        Unsigned 64-bit integers identifying the elements.
+    stream : str
+        Name of the stream of numbers. Different streams give independent numbers for the same counters.
+    seed : int, optional
+        Seed of 64 bits. Defaults to :py:func:`xsdba.base.get_seed`.
+
+    Returns
+    -------
+    np.ndarray
+        Float numbers, with the shape of `counter`.
+    """
+    seed = get_seed() if seed is None else seed
+    counter = np.asarray(counter, dtype=np.uint64)
+    out = _philox_uniform(
+        counter.ravel(), np.uint64(zlib.crc32(stream.encode())), np.uint64(seed)
+    )
+    return out.reshape(counter.shape)
+
+
+def _default_random_key(da: xr.DataArray) -> str:
+    """Default key of :py:func:`random_uniform`, the name of `da` and a token of its data."""
+    return f"{da.name}:{tokenize(da.data)}"
+
+
+def random_uniform(
+    da: xr.DataArray,
+    stream: str,
+    low: float = 0,
+    high: float = 1,
+    key: str | None = None,
+) -> xr.DataArray:
+    """
+    Uniform random numbers in [low, high), one for each element of a DataArray.
+
+    Each number only depends on the ``random_seed`` option of :py:class:`xsdba.set_options`, the stream, the key and
+    the coordinates of its element, see :py:func:`random_counter`. The output is thus the same for any chunking of
+    `da`. With dask, the numbers of each chunk are generated independently and in parallel.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        The array giving the dimensions, coordinates and chunks of the output.
+    stream : str
+        Name of the stream of numbers. Different streams give independent numbers for the same elements.
+    low : float
+        Lower bound of the numbers.
+    high : float
+        Upper bound (excluded) of the numbers.
+    key : str, optional
+        Name of the array, which gives numbers independent of those of other arrays with the same coordinates.
+        Defaults to the name of `da` and a token of its data, see the notes.
+
+    Returns
+    -------
+    xr.DataArray
+        Float numbers, with the dimensions and coordinates of `da`.
+
+    Notes
+    -----
+    Arrays with the same coordinates get the same numbers for the same seed, stream and key. The default key holds
+    a token of the data of `da`, so that inputs with the same name over the same period, such as the `ref` and
+    `hist` of an adjustment, never get the same noise from :py:func:`xsdba.processing.jitter`. This token is a hash
+    of the values of in-memory arrays, but only the name of the graph of `dask` arrays, so that the default numbers
+    of a `dask` array change with its chunks. An explicit key gives the same numbers for any chunking. The
+    adjustments of `xsdba` give the role of their inputs as key, and the same can be done when preparing them::
+
+        ref = jitter_under_thresh(ref, "0.01 mm/d", key="ref")
+        hist = jitter_under_thresh(hist, "0.01 mm/d", key="hist")
+    """
+    key = _default_random_key(da) if key is None else key
+    u = xr.apply_ufunc(
+        counter_uniform,
+        random_counter(da),
+        kwargs={"stream": f"{stream}:{key}", "seed": get_seed()},
+        dask="parallelized",
+        output_dtypes=[np.float64],
+    )
+    return (high - low) * u + low
+
+
 def rand_rot_matrix(
     crd: xr.DataArray, num: int = 1, new_dim: str | None = None
 ) -> xr.DataArray:
@@ -1044,22 +1186,152 @@ def histogram(data, bin_width, bin_origin):
     return grid, mu, idx_bin
 
 
-def optimal_transport(gridX, gridY, muX, muY, num_iter_max, normalization):
+def _read_only(value):
+    """Make the arrays of `value`, an array, a sparse matrix or a tuple of them, read-only."""
+    if isinstance(value, tuple):
+        for v in value:
+            _read_only(v)
+    elif sparse.issparse(value):
+        for arr in [value.data, value.indices, value.indptr]:
+            arr.flags.writeable = False
+    else:
+        value.flags.writeable = False
+
+
+class _ArrayCache:
+    """
+    Cache of the last results of functions of arrays, which can be used by several threads.
+
+    The results are keyed by a hash of the arrays they depend on, and are made read-only.
+    """
+
+    def __init__(self):
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def values(self) -> list:
+        """List the results, from the least to the most recently used."""
+        with self._lock:
+            return list(self._results.values())
+
+    def clear(self):
+        """Remove all results."""
+        with self._lock:
+            self._results.clear()
+
+    def get(self, key_args: tuple, func: Callable, size: int):
+        """
+        Get the result of `func()`, computed unless it is one of the `size` last used results.
+
+        The result is identified by `key_args`, the arrays or strings `func` depends on.
+        """
+        if size == 0:
+            self.clear()
+            return func()
+
+        h = hashlib.blake2b(digest_size=32)
+        for arg in key_args:
+            arr = np.asarray(arg)
+            h.update(f"{arr.dtype}{arr.shape}".encode())
+            h.update(np.ascontiguousarray(arr).tobytes())
+        key = h.hexdigest()
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        result = func()
+        _read_only(result)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > size:
+                self._results.popitem(last=False)
+        return result
+
+
+# Optimal transport plans kept in memory when the `ot_plan_cache` option is set
+_OT_PLANS = _ArrayCache()
+
+
+def optimal_transport(
+    gridX,
+    gridY,
+    muX,
+    muY,
+    num_iter_max,
+    normalization,
+    solver="emd",
+    solver_kws=None,
+):
     """
     Compute the optimal transportation plan on (transformations of) X and Y.
 
+    The plans of the "emd" and "sliced" solvers have at most as many non-zero elements as there are source and
+    target bins and are returned as sparse matrices, whose size is linear in the number of bins. The entropic
+    plan of the "sinkhorn" solver is dense and is returned as an array. The "emd" and "sinkhorn" solvers also
+    compute the distances between all source and target bins, so their peak memory usage is quadratic in the
+    number of bins. Only the "sliced" solver avoids it.
+
+    When the `ot_plan_cache` option is set, the last computed plans are kept in memory and reused
+    when the same histograms are given. Those plans are read-only.
+
+    Parameters
+    ----------
+    gridX, gridY : np.ndarray
+        The centers of the bins of the source and target histograms.
+    muX, muY : np.ndarray
+        The frequencies of the bins of the source and target histograms.
+    num_iter_max : int
+        Maximum number of iterations used in the earth mover distance algorithm.
+    normalization : {None, 'standardize', 'max_distance', 'max_value'}
+        Per-variable transformation applied before the distances are calculated.
+    solver : {'emd', 'sinkhorn', 'sliced'}
+        The algorithm used to find the plan. "emd" solves the exact problem with the network simplex of POT.
+        "sinkhorn" solves the entropic-regularized problem and "sliced" keeps the best of the one-dimensional
+        plans between projections of the histograms. See :py:class:`xsdba.adjustment.OTC`.
+    solver_kws : dict, optional
+        Arguments of the "sinkhorn" solver (`reg`, `num_iter_max` and `tol`) or of the "sliced" solver (`n_projections`).
+
+    Returns
+    -------
+    scipy.sparse.csr_array or np.ndarray
+        The plan, normalized so that each row is the probability of a source bin to be transported to every target bin.
+        A sparse matrix with the "emd" and "sliced" solvers, an array with the "sinkhorn" solver.
+
     References
     ----------
     :cite:cts:`robin_2021`
     """
-    try:
-        from ot import emd  # pylint: disable=import-outside-toplevel
-    except ImportError as e:
-        raise ImportError(
-            "The optional dependency `POT` is required for optimal_transport. "
-            "You can install it with `pip install POT`, `conda install -c conda-forge pot` or `pip install 'xsdba[extras]'`."
-        ) from e
+    return _OT_PLANS.get(
+        (
+            gridX,
+            gridY,
+            muX,
+            muY,
+            num_iter_max,
+            str(normalization),
+            solver,
+            str(sorted((solver_kws or {}).items())),
+        ),
+        lambda: _optimal_transport(
+            gridX, gridY, muX, muY, num_iter_max, normalization, solver, solver_kws
+        ),
+        size=_block_option(OT_PLAN_CACHE),
+    )
 
+
+def _optimal_transport(
+    gridX,
+    gridY,
+    muX,
+    muY,
+    num_iter_max,
+    normalization,
+    solver="emd",
+    solver_kws=None,
+):
+    """Compute the optimal transportation plan, see :py:func:`optimal_transport`."""
+    solver_kws = solver_kws or {}
     if normalization == "standardize":
         gridX = (gridX - gridX.mean(axis=0)) / gridX.std(axis=0)
         gridY = (gridY - gridY.mean(axis=0)) / gridY.std(axis=0)
@@ -1076,16 +1348,114 @@ def optimal_transport(gridX, gridY, muX, muY, num_iter_max, normalization):
         gridX = gridX / max_value
         gridY = gridY / max_value
 
-    # Compute the distances from every X bin to every Y bin
-    C = distance.cdist(gridX, gridY, "sqeuclidean")
-
-    # Compute the optimal transportation plan
-    gamma = emd(muX, muY, C, numItermax=num_iter_max)
-    plan = (gamma.T / gamma.sum(axis=1)).T
+    if solver == "sliced":
+        gamma = _sliced_plan(gridX, gridY, muX, muY, **solver_kws)
+    elif solver == "sinkhorn":
+        # Compute the distances from every X bin to every Y bin
+        C = distance.cdist(gridX, gridY, "sqeuclidean")
+        # The entropic plan is dense, it is not worth storing as a sparse matrix
+        gamma = _sinkhorn_plan(C, muX, muY, **solver_kws)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+    elif solver == "emd":
+        try:
+            from ot import emd  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ImportError(
+                "The optional dependency `POT` is required for optimal_transport. "
+                "You can install it with `pip install POT`, `conda install -c conda-forge pot` or `pip install 'xsdba[extras]'`."
+            ) from e
+
+        # Compute the distances from every X bin to every Y bin
+        C = distance.cdist(gridX, gridY, "sqeuclidean")
+
+        # Compute the optimal transportation plan
+        gamma = emd(muX, muY, C, numItermax=num_iter_max)
+    else:
+        raise ValueError(
+            f"Unknown optimal transport solver {solver}, expected one of 'emd', 'sinkhorn' or 'sliced'."
+        )
+    plan = sparse.csr_array(gamma)
+    plan.data /= np.repeat(plan.sum(axis=1), np.diff(plan.indptr))
 
     return plan
 
 
+def _sinkhorn_plan(C, muX, muY, reg=1e-2, num_iter_max=1000, tol=1e-9):
+    """
+    Entropic-regularized optimal transport plan with the Sinkhorn-Knopp algorithm.
+
+    The scalings are absorbed in the dual potentials whenever they grow too large, which keeps the kernel
+    from underflowing even with a small regularization :cite:p:`schmitzer_stabilized_2019`.
+    """
+    # Initial potentials, such that each row and each column of the kernel has a maximum of 1.
+    f = C.min(axis=1)
+    g = (C - f[:, np.newaxis]).min(axis=0)
+    K = np.exp(-(C - f[:, np.newaxis] - g) / reg)
+    u = np.ones_like(muX)
+    v = np.ones_like(muY)
+    for it in range(num_iter_max):
+        v = muY / (K.T @ u)
+        u = muX / (K @ v)
+        if not (np.abs(u).max() < 1e50 and np.abs(v).max() < 1e50):
+            # Absorption of the scalings in the potentials
+            f = f + reg * np.log(u)
+            g = g + reg * np.log(v)
+            K = np.exp(-(C - f[:, np.newaxis] - g) / reg)
+            u = np.ones_like(muX)
+            v = np.ones_like(muY)
+        # The rows match `muX` after each iteration, check the columns
+        if it % 10 == 0 and np.abs(v * (K.T @ u) - muY).sum() < tol:
+            break
+    return u[:, np.newaxis] * K * v
+
+
+def _ot_1d_plan(x, y, muX, muY):
+    """
+    Optimal transport plan between two weighted sets of points on the line.
+
+    The plan is monotone : the sorted sources are matched to the sorted targets along their cumulative weights.
+    Returns the source and target indexes of the non-zero elements of the plan and their weights.
+    """
+    ix = np.argsort(x, kind="stable")
+    iy = np.argsort(y, kind="stable")
+    cx = np.cumsum(muX[ix])
+    cy = np.cumsum(muY[iy])
+    cx /= cx[-1]
+    cy /= cy[-1]
+    # The cumulative weights where the source or the target changes
+    breaks = np.unique(np.concatenate([cx, cy]))
+    weights = np.diff(breaks, prepend=0)
+    breaks, weights = breaks[weights > 0], weights[weights > 0]
+    middle = breaks - weights / 2
+    i = ix[np.minimum(np.searchsorted(cx, middle), x.size - 1)]
+    j = iy[np.minimum(np.searchsorted(cy, middle), y.size - 1)]
+    return i, j, weights
+
+
+def _sliced_plan(gridX, gridY, muX, muY, n_projections=50):
+    """
+    Approximate optimal transport plan given by the best one-dimensional plan between projections of the grids.
+
+    The grids are projected on the variable axes and on random directions. The plan between the projections with
+    the lowest cost on the original grids is kept :cite:p:`mahey_fast_2023`. The directions are drawn with a fixed
+    seed so that the plan is deterministic.
+    """
+    nv = gridX.shape[1]
+    directions = np.random.default_rng(0).normal(size=(n_projections, nv))
+    directions = np.concatenate([np.eye(nv), directions])
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+
+    best = None
+    for theta in directions:
+        i, j, w = _ot_1d_plan(gridX @ theta, gridY @ theta, muX, muY)
+        cost = (w * ((gridX[i] - gridY[j]) ** 2).sum(axis=1)).sum()
+        if best is None or cost < best[0]:
+            best = (cost, i, j, w)
+
+    _, i, j, w = best
+    return sparse.csr_array((w, (i, j)), shape=(muX.size, muY.size))
+
+
 def eps_cholesky(M, nit=26):
     """
     Cholesky decomposition.
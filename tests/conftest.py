@@ -7,6 +7,7 @@ from pathlib import Path
 import numpy as np
 import pytest
 import xarray as xr
+from numba.core import config
 
 from xsdba.testing import (
     test_cannon_2015_dist,
@@ -160,6 +161,21 @@ def gosset(threadsafe_data_dir, worker_id):
     )
 
 
+@pytest.fixture(autouse=True, scope="session")
+def numba_cache_dir(tmp_path_factory) -> Generator:
+    """
+    Give each test worker its own numba cache directory.
+
+    Numba's on-disk cache is not safe to share between processes writing to it at the same time, and the temporary
+    directory of each pytest-xdist worker is distinct.
+    """
+    path = str(tmp_path_factory.mktemp("numba_cache"))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("NUMBA_CACHE_DIR", path)
+        mp.setattr(config, "CACHE_DIR", path)
+        yield path
+
+
 @pytest.fixture
 def tmp_netcdf_filename(tmpdir) -> Generator:
     yield Path(tmpdir).joinpath("testfile.nc")
@@ -4,11 +4,14 @@ from __future__ import annotations
 import numpy as np
 import pytest
 import xarray as xr
-from scipy.stats import genpareto, norm, uniform
+from scipy.stats import genpareto, norm, special_ortho_group, uniform
 
-from xsdba import adjustment
+from xsdba import _adjustment, adjustment
+from xsdba import nbutils as nbu
+from xsdba import utils as u
 from xsdba.adjustment import (
     LOCI,
+    OTC,
     BaseAdjustment,
     DetrendedQuantileMapping,
     EmpiricalQuantileMapping,
@@ -18,10 +21,12 @@ from xsdba.adjustment import (
     QuantileDeltaMapping,
     Scaling,
     dOTC,
+    dOTCTrainAdjust,
 )
 from xsdba.base import Grouper, stack_periods
 from xsdba.options import set_options
 from xsdba.processing import (
+    grouped_time_indexes,
     jitter_under_thresh,
     stack_variables,
     uniform_noise_like,
@@ -361,6 +366,44 @@ class TestDQM:
         np.testing.assert_array_almost_equal(mqm, int(kind == MULTIPLICATIVE), 1)
         np.testing.assert_allclose(p.transpose(..., "time"), ref_t, rtol=0.1, atol=0.5)
 
+    @pytest.mark.parametrize("adapt_freq_thresh", [None, "1 kg m-2 d-1"])
+    def test_dask_not_parallel(
+        self, monkeypatch, timelonlatseries, adapt_freq_thresh, random
+    ):
+        attrs = {"units": "kg m-2 s-1", "kind": MULTIPLICATIVE}
+        ref = timelonlatseries(random.gamma(2, 2e-5, 3650), attrs=attrs)
+        hist = timelonlatseries(random.gamma(2, 3e-5, 3650), attrs=attrs)
+        ref = ref.expand_dims(x=[0, 1, 2])
+        hist = hist.expand_dims(x=[0, 1, 2])
+
+        calls = []
+
+        def spy(kernel):
+            def wrapper(*args, parallel=False, **kwargs):
+                calls.append(parallel)
+                return kernel(*args, parallel=parallel, **kwargs)
+
+            return wrapper
+
+        monkeypatch.setattr(nbu, "_quantile", spy(nbu._quantile))
+        monkeypatch.setattr(nbu, "_grouped_quantile", spy(nbu._grouped_quantile))
+
+        kws = {
+            "kind": MULTIPLICATIVE,
+            "group": "time.month",
+            "adapt_freq_thresh": adapt_freq_thresh,
+        }
+        with set_options(random_seed=42):
+            exp = DetrendedQuantileMapping.train(ref, hist, **kws).ds
+            assert calls and all(calls)
+            calls.clear()
+            out = DetrendedQuantileMapping.train(
+                ref.chunk(x=1), hist.chunk(x=1), **kws
+            ).ds.compute(scheduler="threads")
+        # The blocks of dask arrays are already processed in parallel, numba must not launch threads.
+        assert calls and not any(calls)
+        xr.testing.assert_allclose(out, exp)
+
     def test_cannon_and_from_ds(self, cannon_2015_rvs, tmp_path, random):
         ref, hist, sim = cannon_2015_rvs(15000, random=random)
 
@@ -657,6 +700,52 @@ class TestQM:
         # Test predict
         np.testing.assert_array_almost_equal(p, ref, 2)
 
+    @pytest.mark.parametrize(
+        "group,interp,exp",
+        [
+            (
+                "time.month",
+                "linear",
+                [280.861102, 292.314675, 291.974987, 282.871973, 273.610838],
+            ),
+            (
+                "time.month",
+                "cubic",
+                [280.913353, 292.314675, 291.974987, 282.842345, 273.700332],
+            ),
+            (
+                "time.season",
+                "linear",
+                [280.879874, 292.373841, 292.016153, 283.033594, 273.174526],
+            ),
+            (
+                "time.season",
+                "cubic",
+                [280.869024, 292.373841, 292.016153, 282.955301, 273.202663],
+            ),
+        ],
+    )
+    def test_grouped_interp_reference(self, timelonlatseries, group, interp, exp):
+        """Reference values of the grid interpolation, which differ from those of `scipy.interpolate.griddata`."""
+        i = np.arange(365 * 4)
+
+        def series(offset):
+            return timelonlatseries(
+                280
+                + offset
+                + (10 + offset) * np.sin(2 * np.pi * i / 365)
+                + (2 + offset) * np.sin(i * 1.7),
+                attrs={"units": "K"},
+            )
+
+        QM = EmpiricalQuantileMapping.train(
+            series(0), series(1), group=group, nquantiles=15, kind=ADDITIVE
+        )
+        scen = QM.adjust(series(2), interp=interp)
+        np.testing.assert_allclose(
+            scen.isel(time=[0, 100, 500, 900, 1300]), exp, rtol=1e-8
+        )
+
     @pytest.mark.parametrize("use_dask", [True, False])
     @pytest.mark.filterwarnings("ignore::RuntimeWarning")
     def test_add_dims(self, use_dask, gosset):
@@ -711,6 +800,97 @@ class TestQM:
         EmpiricalQuantileMapping._allow_diff_training_times = False
         assert (ds.af == ds_fut.af).all()
 
+    def test_jitter_key(self, timelonlatseries, random):
+        attrs = {"units": "mm/d"}
+        ref = timelonlatseries(random.gamma(1, size=(730, 2)), attrs=attrs)
+        hist = timelonlatseries(random.gamma(1, size=(730, 2)), attrs=attrs)
+        hist = hist.where(hist > 0.5, 0)
+        kws = {"kind": MULTIPLICATIVE, "jitter_under_thresh_value": "0.01 mm/d"}
+
+        with set_options(random_seed=1):
+            exp = EmpiricalQuantileMapping.train(
+                ref, jitter_under_thresh(hist, "0.01 mm/d", key="hist"), kind="*"
+            ).ds
+            # The noise of hist is keyed by its role, not by its name, which it may share with ref
+            for name in ["pr", "hist"]:
+                out = EmpiricalQuantileMapping.train(
+                    ref.rename("pr"), hist.rename(name), **kws
+                ).ds
+                xr.testing.assert_equal(out, exp)
+
+    @pytest.mark.parametrize(
+        "group,window", [("time", 1), ("time.month", 1), ("time.dayofyear", 31)]
+    )
+    @pytest.mark.parametrize("kind", [ADDITIVE, MULTIPLICATIVE])
+    @pytest.mark.parametrize("use_dask", [True, False])
+    def test_grouped_train(
+        self, timelonlatseries, random, group, window, kind, use_dask
+    ):
+        ref = timelonlatseries(random.random((365 * 2, 2)) + 1, attrs={"units": "K"})
+        hist = timelonlatseries(random.random((365 * 2, 2)), attrs={"units": "K"})
+        ds = xr.Dataset({"ref": ref, "hist": hist})
+        if use_dask:
+            ds = ds.chunk(lon=1)
+        group = Grouper(group, window=window)
+        quantiles = equally_spaced_nodes(20)
+
+        exp = _adjustment.eqm_train(ds, group=group, kind=kind, quantiles=quantiles)
+        out = _adjustment.eqm_train_grouped(
+            ds, group=group, kind=kind, quantiles=quantiles
+        )
+        xr.testing.assert_identical(out, exp)
+
+        exp = _adjustment.dqm_train(ds, group=group, kind=kind, quantiles=quantiles)
+        out = _adjustment.dqm_train_grouped(
+            ds, group=group, kind=kind, quantiles=quantiles
+        )
+        xr.testing.assert_allclose(out, exp)
+
+    @pytest.mark.parametrize(
+        "group,window", [("time", 1), ("time.month", 1), ("time.dayofyear", 31)]
+    )
+    @pytest.mark.parametrize("kind", [ADDITIVE, MULTIPLICATIVE])
+    @pytest.mark.parametrize(
+        "cls",
+        [EmpiricalQuantileMapping, DetrendedQuantileMapping, QuantileDeltaMapping],
+    )
+    def test_sketch_train(self, timelonlatseries, random, group, window, kind, cls):
+        ref = timelonlatseries(random.random((365 * 4, 2)) + 1, attrs={"units": "K"})
+        hist = timelonlatseries(random.random((365 * 4, 2)), attrs={"units": "K"})
+        group = Grouper(group, window=window)
+        exp = cls.train(ref, hist, group=group, kind=kind, nquantiles=20).ds
+
+        # Sketches larger than the groups are exact, chunks along time are accepted.
+        out = cls.train(
+            ref.chunk(time=365),
+            hist.chunk(time=365),
+            group=group,
+            kind=kind,
+            nquantiles=20,
+            sketch_error=1e-6,
+        ).ds
+        assert out.af.chunks is not None
+        xr.testing.assert_allclose(out, exp)
+
+        out = cls.train(
+            ref.chunk(time=100),
+            hist.chunk(time=100),
+            group=group,
+            kind=kind,
+            nquantiles=20,
+            sketch_error=0.05,
+        ).ds
+        np.testing.assert_allclose(out.hist_q, exp.hist_q, atol=0.1)
+
+    def test_sketch_train_raises(self, timelonlatseries, random):
+        ref = timelonlatseries(random.random((365, 2)), attrs={"units": "K"})
+        with pytest.raises(ValueError, match="Frequency adaptation is not supported"):
+            EmpiricalQuantileMapping.train(
+                ref, ref, sketch_error=0.01, adapt_freq_thresh="0.5 K"
+            )
+        with pytest.raises(ValueError, match="Multiple chunks"):
+            EmpiricalQuantileMapping.train(ref.chunk(time=100), ref.chunk(time=100))
+
 
 @pytest.mark.slow
 class TestMBCn:
@@ -758,6 +938,122 @@ class TestMBCn:
         # 'does it run' test
         p.load()
 
+    @pytest.mark.parametrize("interp", ["nearest", "linear", "cubic"])
+    def test_npdft_train(self, random, interp):
+        ref = random.gamma(2, size=(2, 3, 500))
+        hist = random.normal(size=(2, 3, 520))
+        hist[1, 0, ::13] = np.nan
+        rots = special_ortho_group.rvs(3, size=5, random_state=random)
+        quantiles = u.equally_spaced_nodes(20)
+
+        af_q, escores = _adjustment._npdft_train(
+            ref, hist, rots, quantiles, interp, "constant", 100, True
+        )
+        assert af_q.shape == (2, 5, 3, 20)
+        assert escores.shape == (2, 5)
+
+        # Reference: one point at a time, one variable at a time
+        for ip in range(2):
+            r = (ref[ip] - np.nanmean(ref[ip], -1, keepdims=True)) / np.nanstd(
+                ref[ip], -1, keepdims=True
+            )
+            h = (hist[ip] - np.nanmean(hist[ip], -1, keepdims=True)) / np.nanstd(
+                hist[ip], -1, keepdims=True
+            )
+            for ii in range(5):
+                rot = rots[ii] if ii == 0 else rots[ii] @ rots[ii - 1].T
+                r, h = rot @ r, rot @ h
+                for iv in range(3):
+                    exp = nbu._quantile(r[iv], quantiles) - nbu._quantile(
+                        h[iv], quantiles
+                    )
+                    np.testing.assert_array_equal(af_q[ip, ii, iv], exp)
+                    h[iv] = h[iv] + u._interp_on_quantiles_1D(
+                        u._rank_bn(h[iv]), quantiles, exp, interp, "constant"
+                    )
+                np.testing.assert_array_equal(
+                    escores[ip, ii], nbu._escore(r[:, ::5], h[:, ::6])
+                )
+
+    def _stacked(self, timeseries, random, loc, scale):
+        n = 365 * 3
+        ds = xr.Dataset(
+            {
+                "tas": timeseries(
+                    loc + scale * random.normal(size=n), units="K", calendar="noleap"
+                ),
+                "pr": timeseries(
+                    random.gamma(2, scale, size=n), units="mm/d", calendar="noleap"
+                ),
+            }
+        )
+        return stack_variables(ds.expand_dims(location=["a", "b"]))
+
+    def test_period_dim_deprecated(self, timeseries, random):
+        ref = self._stacked(timeseries, random, 280, 1)
+        hist = self._stacked(timeseries, random, 282, 2)
+        MBCN = MBCn.train(ref, hist, base_kws=dict(nquantiles=10), n_iter=2)
+
+        exp = MBCN.adjust(sim=hist, ref=ref, hist=hist)
+        with pytest.warns(FutureWarning, match="period_dim"):
+            out = MBCN.adjust(sim=hist, ref=ref, hist=hist, period_dim="period")
+        xr.testing.assert_equal(out, exp)
+
+    @pytest.mark.parametrize("group,window", [("time.dayofyear", 5), ("5D", 3)])
+    def test_train_time_blocks(self, timeseries, random, group, window):
+        ref = self._stacked(timeseries, random, 280, 1)
+        hist = self._stacked(timeseries, random, 282, 2)
+        group = Grouper(group, window)
+        MBCN = MBCn.train(ref, hist, base_kws=dict(nquantiles=10, group=group))
+        af_q = MBCN.ds.af_q
+        rots = MBCN.ds.rot_matrices.transpose("iterations", "multivar_prime", ...)
+
+        # Each block is the same as if it was trained separately
+        _, gw_idxs = grouped_time_indexes(ref.time, group)
+        gr_dim = gw_idxs.attrs["group_dim"]
+        for ib in [0, 30, af_q[gr_dim].size - 1]:
+            ind = gw_idxs[{gr_dim: ib}].fillna(-1).astype(int).values
+            ind = ind[ind >= 0]
+            exp, _ = _adjustment._npdft_train(
+                ref.transpose("location", "multivar", "time").values[..., ind],
+                hist.transpose("location", "multivar", "time").values[..., ind],
+                rots.values,
+                af_q.quantiles.values,
+                "nearest",
+                "constant",
+                -1,
+                True,
+            )
+            np.testing.assert_allclose(
+                af_q[{gr_dim: ib}].transpose("location", ...), exp, rtol=1e-5
+            )
+
+    @pytest.mark.parametrize("use_dask", [True, False])
+    def test_adjust_reorders_univariate(self, timeseries, random, use_dask):
+        ref = self._stacked(timeseries, random, 280, 1)
+        hist = self._stacked(timeseries, random, 282, 2)
+        sim = self._stacked(timeseries, random, 284, 2)
+        if use_dask:
+            ref, hist, sim = (da.chunk(location=1) for da in [ref, hist, sim])
+
+        MBCN = MBCn.train(ref, hist, n_iter=5)
+        scen = MBCN.adjust(sim=sim, ref=ref, hist=hist).load()
+        assert scen.dims == sim.dims
+
+        # Without grouping, scen is a reordering of the univariate adjustment
+        for v in ["tas", "pr"]:
+            sl = {"multivar": sim.multivar.values.tolist().index(v)}
+            uni = QuantileDeltaMapping.train(
+                ref[sl],
+                hist[sl],
+                nquantiles=MBCN.ds.af_q.quantiles.values,
+                skip_input_checks=True,
+            ).adjust(sim[sl], skip_input_checks=True)
+            np.testing.assert_allclose(
+                np.sort(scen[sl].transpose("location", "time"), axis=-1),
+                np.sort(uni.transpose("location", "time"), axis=-1),
+            )
+
 
 class TestPrincipalComponents:
     @pytest.mark.parametrize(
@@ -995,6 +1291,50 @@ class TestOTC:
         scen_sbck = scen_sbck.to_numpy()
         assert np.allclose(scen, scen_sbck)
 
+    @pytest.mark.parametrize("solver", ["emd", "sinkhorn", "sliced"])
+    def test_solvers(self, random, timelonlatseries, solver):
+        if solver == "emd":
+            pytest.importorskip("ot")
+        ns = 2000
+        attrs = {"units": "K"}
+        ref = stack_variables(
+            xr.Dataset(
+                {
+                    "tas": timelonlatseries(random.normal(size=ns), attrs=attrs),
+                    "dtr": timelonlatseries(random.gamma(4, size=ns), attrs=attrs),
+                }
+            )
+        )
+        hist = stack_variables(
+            xr.Dataset(
+                {
+                    "tas": timelonlatseries(random.normal(3, 2, size=ns), attrs=attrs),
+                    "dtr": timelonlatseries(random.gamma(2, size=ns), attrs=attrs),
+                }
+            )
+        )
+        scen = OTC.adjust(ref, hist, solver=solver, jitter_inside_bins=False)
+
+        assert scen.notnull().all()
+        # The distribution of ref is recovered
+        np.testing.assert_allclose(scen.mean("time"), ref.mean("time"), atol=0.1)
+        np.testing.assert_allclose(scen.std("time"), ref.std("time"), rtol=0.1)
+
+    def test_sample_plan(self, random):
+        from scipy import sparse
+
+        plan = np.array([[0.5, 0, 0.5, 0], [0, 0, 0, 1], [0.1, 0.2, 0.3, 0.4]])
+        rows = np.repeat([0, 1, 2], 20_000)
+        uniform = random.random(rows.size)
+        choice = _adjustment._sample_plan(sparse.csr_array(plan), rows, uniform)
+        for i in range(3):
+            freq = np.bincount(choice[rows == i], minlength=4) / 20_000
+            np.testing.assert_allclose(freq, plan[i], atol=0.01)
+        # Dense plans give the same columns
+        np.testing.assert_array_equal(
+            _adjustment._sample_plan(plan, rows, uniform), choice
+        )
+
 
 # TODO: Add tests for normalization methods
 class TestdOTC:
@@ -1121,6 +1461,62 @@ class TestdOTC:
         ref, hist, sim = (stack_variables(arr) for arr in [ref, hist, sim])
         dOTC.adjust(ref, hist, sim)
 
+    @pytest.mark.parametrize("use_dask", [True, False])
+    @pytest.mark.parametrize("group", ["time", "time.month"])
+    @pytest.mark.parametrize("cov_factor", ["std", "cholesky"])
+    def test_train_adjust(self, random, timelonlatseries, use_dask, group, cov_factor):
+        pytest.importorskip("ot")
+        ns = 1000
+        u = random.random(ns)
+        data = {
+            "ref": (uniform(loc=1000, scale=100).ppf(u), norm(loc=0, scale=100).ppf(u)),
+            "hist": (
+                norm(loc=-500, scale=100).ppf(u),
+                uniform(loc=-1000, scale=100).ppf(u),
+            ),
+            "sim": (norm(loc=0, scale=100).ppf(u), uniform(loc=0, scale=100).ppf(u)),
+        }
+        # At most 1 point per bin, so that the transports are deterministic
+        bin_width = [
+            min(np.diff(np.sort(arrs[i])).min() for arrs in data.values()) * 9 / 10
+            for i in range(2)
+        ]
+
+        das = {}
+        for name, (x, y) in data.items():
+            start = "2040-01-01" if name == "sim" else "2000-01-01"
+            attrs = {"units": "K"}
+            ds = xr.Dataset(
+                {
+                    "tas": timelonlatseries(x, start=start, attrs=attrs),
+                    "dtr": timelonlatseries(y, start=start, attrs=attrs),
+                }
+            )
+            if use_dask:
+                ds = ds.chunk({"time": -1})
+            das[name] = stack_variables(ds)
+        ref, hist, sim = das["ref"], das["hist"], das["sim"]
+
+        dotc = dOTCTrainAdjust.train(
+            ref, hist, bin_width=bin_width, cov_factor=cov_factor, group=group
+        )
+        assert {"ref", "hist", "ref_to_hist", "bin_width", "bin_origin"}.issubset(
+            dotc.ds.data_vars
+        )
+        scen = dotc.adjust(sim, jitter_inside_bins=False)
+        np.testing.assert_array_equal(scen.time, sim.time)
+
+        exp = dOTC.adjust(
+            ref,
+            hist,
+            sim.copy(),
+            bin_width=bin_width,
+            jitter_inside_bins=False,
+            cov_factor=cov_factor,
+            group=group,
+        )
+        np.testing.assert_allclose(scen, exp.transpose(*scen.dims), atol=1e-8)
+
 
 def test_raise_on_multiple_chunks(timelonlatseries):
     attrs_tas = {"units": "K", "kind": ADDITIVE}
@@ -1140,6 +1536,122 @@ def test_default_grouper_understood(timelonlatseries):
     assert eqm.group.dim == "time"
 
 
+class TestSaveLoad:
+    def test_quantile_mapping(self, timelonlatseries, random, tmp_path):
+        pytest.importorskip("zarr")
+        attrs = {"units": "K", "kind": ADDITIVE}
+        ref = timelonlatseries(random.normal(size=(730, 3, 2)) + 280, attrs=attrs)
+        hist = timelonlatseries(random.normal(size=(730, 3, 2)) + 282, attrs=attrs)
+        sim = timelonlatseries(random.normal(size=(730, 3, 2)) + 283, attrs=attrs)
+        eqm = EmpiricalQuantileMapping.train(ref, hist, group="time.month")
+        eqm.save(tmp_path / "eqm.zarr")
+
+        loaded = adjustment.TrainAdjust.load(tmp_path / "eqm.zarr")
+        assert isinstance(loaded, EmpiricalQuantileMapping)
+        assert loaded.parameters.keys() == eqm.parameters.keys()
+        assert loaded.group.prop == "month"
+        # The training dataset is read lazily, the groups and the quantiles are not divided
+        assert loaded.ds.af.chunks is not None
+        assert loaded.ds.af.chunksizes["quantiles"] == (eqm.ds.quantiles.size,)
+        assert loaded.ds.af.chunksizes["month"] == (12,)
+
+        out = loaded.adjust(sim, interp="linear")
+        assert out.chunks is not None
+        np.testing.assert_array_equal(out, eqm.adjust(sim, interp="linear"))
+
+        # Explicit chunks
+        eqm.save(tmp_path / "chunked.zarr", chunks={"lon": 1})
+        loaded = EmpiricalQuantileMapping.load(tmp_path / "chunked.zarr")
+        assert loaded.ds.af.chunksizes["lon"] == (1, 1, 1)
+        with pytest.raises(ValueError, match="not QuantileDeltaMapping"):
+            QuantileDeltaMapping.load(tmp_path / "chunked.zarr")
+
+    def test_mbcn(self, timelonlatseries, random, tmp_path):
+        pytest.importorskip("zarr")
+        ref, hist, sim = (
+            stack_variables(
+                xr.Dataset(
+                    {
+                        "tas": timelonlatseries(
+                            random.normal(size=(730, 2)) + 280 + i, attrs={"units": "K"}
+                        ),
+                        "pr": timelonlatseries(
+                            random.gamma(1 + i, size=(730, 2)), attrs={"units": "mm/d"}
+                        ),
+                    }
+                )
+            )
+            for i in range(3)
+        )
+        mbcn = MBCn.train(ref, hist, base_kws={"nquantiles": 10}, n_iter=2)
+        mbcn.save(tmp_path / "mbcn.zarr")
+        loaded = MBCn.load(tmp_path / "mbcn.zarr")
+
+        np.testing.assert_array_equal(
+            loaded.adjust(sim=sim, ref=ref, hist=hist),
+            mbcn.adjust(sim=sim, ref=ref, hist=hist),
+        )
+
+    def test_train_cache(self, timelonlatseries, random, tmp_path, monkeypatch):
+        pytest.importorskip("zarr")
+        attrs = {"units": "K", "kind": ADDITIVE}
+        ref = timelonlatseries(random.normal(size=(730, 3)) + 280, attrs=attrs)
+        hist = timelonlatseries(random.normal(size=(730, 3)) + 282, attrs=attrs)
+
+        with set_options(train_cache=tmp_path):
+            eqm = EmpiricalQuantileMapping.train(ref, hist, group="time.month")
+            assert len(list(tmp_path.glob("*.zarr"))) == 1
+
+            def _fail(*args, **kwargs):
+                raise AssertionError("Trained again.")
+
+            with monkeypatch.context() as m:
+                m.setattr(EmpiricalQuantileMapping, "_train", _fail)
+                # Same values in other objects, the group given differently
+                cached = EmpiricalQuantileMapping.train(
+                    ref.copy(deep=True), hist, group=Grouper("time.month")
+                )
+                xr.testing.assert_identical(cached.ds, eqm.ds)
+                # Not the same arguments nor the same inputs
+                with pytest.raises(AssertionError, match="Trained again"):
+                    EmpiricalQuantileMapping.train(ref, hist, group="time")
+                with pytest.raises(AssertionError, match="Trained again"):
+                    EmpiricalQuantileMapping.train(hist, ref, group="time.month")
+
+            # Trainings are evicted until the cache fits in its size
+            with set_options(train_cache_size=1):
+                EmpiricalQuantileMapping.train(ref, hist, group="time")
+            assert len(list(tmp_path.glob("*.zarr"))) == 0
+            EmpiricalQuantileMapping.train(ref, hist, group="time")
+            assert len(list(tmp_path.glob("*.zarr"))) == 1
+
+    def test_train_cache_random_seed(self, timelonlatseries, random, tmp_path):
+        pytest.importorskip("zarr")
+        attrs = {"units": "mm/d", "kind": MULTIPLICATIVE}
+        ref = timelonlatseries(random.gamma(1, size=(730, 3)), attrs=attrs)
+        hist = timelonlatseries(random.gamma(1, size=(730, 3)), attrs=attrs)
+        hist = hist.where(hist > 0.5, 0)
+        kws = {
+            "group": "time",
+            "kind": MULTIPLICATIVE,
+            "jitter_under_thresh_value": "0.01 mm/d",
+            "adapt_freq_thresh": "0.1 mm/d",
+        }
+
+        def train(seed):
+            with set_options(random_seed=seed):
+                return EmpiricalQuantileMapping.train(ref, hist, **kws).ds
+
+        with set_options(train_cache=tmp_path):
+            cached = [train(1), train(2), train(1)]
+        assert len(list(tmp_path.glob("*.zarr"))) == 2
+        # The random numbers of the training depend on the seed, which must be part of the cache key
+        xr.testing.assert_equal(cached[0], train(1))
+        xr.testing.assert_equal(cached[1], train(2))
+        xr.testing.assert_identical(cached[2], cached[0])
+        assert not cached[0].equals(cached[1])
+
+
 class TestSBCKutils:
     @pytest.mark.slow
     @pytest.mark.parametrize(
@@ -7,7 +7,8 @@ import pytest
 import xarray as xr
 
 from xsdba import set_options
-from xsdba.base import Grouper, Parametrizable, map_blocks, map_groups
+from xsdba.base import Grouper, Parametrizable, get_seed, map_blocks, map_groups
+from xsdba.nbutils import grouped_mean
 
 
 class ATestSubClass(Parametrizable):
@@ -71,6 +72,26 @@ def test_grouper_get_index(timeseries, group, interp, val90, calendar):
     assert indx[90] == val90
 
 
+@pytest.mark.parametrize(
+    "group,window",
+    [("time", 1), ("time.month", 1), ("time.season", 1), ("time.dayofyear", 5)],
+)
+def test_grouper_get_group_indexes(timeseries, group, window):
+    da = timeseries(np.arange(366.0), start="2000-01-01")
+    grouper = Grouper(group, window=window)
+    idx = grouper.get_group_indexes(da)
+
+    exp = grouper.group(da)
+    assert idx.dims == (grouper.prop, "group_member")
+    np.testing.assert_array_equal(idx[grouper.prop], grouper.get_coordinate(da))
+    for lbl, grp in exp:
+        members = idx.sel({grouper.prop: lbl}).values
+        values = da.values[members[members >= 0]]
+        np.testing.assert_array_equal(
+            np.sort(values), np.sort(grp.values[~np.isnan(grp.values)].ravel())
+        )
+
+
 # xarray does not yet access "week" or "weekofyear" with groupby in a pandas-compatible way for cftime objects.
 # See: https://github.com/pydata/xarray/discussions/6375
 @pytest.mark.filterwarnings("ignore:dt.weekofyear and dt.week have been deprecated")
@@ -234,6 +255,25 @@ class TestMapBlocks:
         assert set(data.data.dims) == {"dayofyear"}
         assert "leftover" in data
 
+    @pytest.mark.parametrize("use_dask", [True, False])
+    def test_grouper_indexed(self, timeseries, use_dask):
+        da0 = timeseries(np.arange(366.0), start="2000-01-01")
+        da0 = da0.expand_dims(lat=[1, 2, 3, 4])
+        if use_dask:
+            da0 = da0.chunk(lat=1)
+
+        @map_groups(data=[Grouper.PROP], indexed=True)
+        def func(ds, *, dim, indexes, group):
+            assert dim == ["time"]
+            assert "window" not in ds.dims
+            assert indexes.dims == (group.prop, "group_member")
+            return grouped_mean(ds.da0, indexes, dim).rename("data").to_dataset()
+
+        group = Grouper("time.dayofyear", window=5)
+        data = func(xr.Dataset(dict(da0=da0)), group=group).load()
+        exp = group.apply("mean", da0)
+        np.testing.assert_allclose(data.data.transpose(*exp.dims), exp)
+
     def test_raises_error(self, timeseries):
         da0 = timeseries(np.arange(366), start="2000-01-01")
         da0 = da0.expand_dims(lat=[1, 2, 3, 4]).chunk(lat=1)
@@ -246,6 +286,27 @@ class TestMapBlocks:
         with pytest.raises(ValueError, match="cannot be chunked"):
             func(xr.Dataset(dict(da0=da0)), group="time")
 
+    def test_random_seed(self, timeseries):
+        da0 = timeseries(np.arange(366), start="2000-01-01")
+        da0 = da0.expand_dims(lat=[1, 2, 3, 4]).chunk(lat=1)
+
+        @map_blocks(reduces=["time"], data=[])
+        def func(ds, *, group):
+            seed = xr.full_like(ds.da0.isel(time=0, drop=True), get_seed())
+            return seed.rename("data").to_dataset()
+
+        # The seed is read when the function is called, not when the blocks are computed.
+        with set_options(random_seed=42):
+            data = func(xr.Dataset(dict(da0=da0)), group="time")
+            data2 = func(xr.Dataset(dict(da0=da0)), group="time")
+        assert data["data"].data.name == data2["data"].data.name
+        with set_options(random_seed=43):
+            np.testing.assert_array_equal(data.data, 42)
+
+        # Without seed, each call draws a different one.
+        seeds = [get_seed() for _ in range(2)]
+        assert seeds[0] != seeds[1]
+
     @pytest.mark.parametrize("use_dask", [True, False])
     def test_dataarray_cfencode(self, use_dask, gosset):
         ds = xr.open_dataset(gosset.fetch("sdba/CanESM2_1950-2100.nc"))
@@ -3,6 +3,7 @@ from __future__ import annotations
 import numpy as np
 import pytest
 import xarray as xr
+from dask.callbacks import Callback
 from scipy.signal import windows
 
 from xsdba import Grouper
@@ -40,6 +41,54 @@ def test_poly_detrend_and_from_ds(timeseries, tmp_path):
     np.testing.assert_array_equal(dx, dx2)
 
 
+@pytest.mark.parametrize("group", ["time", "time.month"])
+@pytest.mark.parametrize("use_dask", [True, False])
+def test_poly_detrend_batched(timeseries, random, group, use_dask):
+    t = np.arange(5 * 365)
+    x = xr.concat(
+        [
+            timeseries(1e-3 * t + 1e-7 * t**2 + random.normal(size=t.size))
+            for _ in range(4)
+        ],
+        dim="lat",
+    )
+    x[1, [3, 400]] = np.nan
+    x[2] = np.nan
+    if use_dask:
+        x = x.chunk(lat=2)
+
+    trend = PolyDetrend(group=group, degree=2).fit(x).ds.trend.load()
+
+    # Same as fitting each series and group separately on their valid values
+    for lat in range(4):
+        for _, grp in Grouper(group).group(x.isel(lat=lat).load()):
+            valid = grp.notnull().values
+            exp = np.full(grp.size, np.nan)
+            if valid.any():
+                xt = grp.time[valid].values.astype(float)
+                coeffs = np.polynomial.polynomial.polyfit(xt, grp.values[valid], 2)
+                exp = np.polynomial.polynomial.polyval(
+                    grp.time.values.astype(float), coeffs
+                )
+            np.testing.assert_allclose(
+                trend.isel(lat=lat).sel(time=grp.time), exp, rtol=1e-8
+            )
+    assert trend.isel(lat=1).notnull().all()
+    assert trend.isel(lat=2).isnull().all()
+
+
+@pytest.mark.parametrize("calendar", ["standard", "noleap", "360_day"])
+def test_poly_detrend_calendars(calendar):
+    time = xr.date_range(
+        "2000-01-01", periods=3 * 365, freq="D", calendar=calendar, use_cftime=True
+    )
+    t = np.arange(time.size)
+    x = xr.DataArray(2 + 1e-3 * t, dims=("time",), coords={"time": time})
+
+    dx = PolyDetrend(degree=1).fit(x).detrend(x)
+    np.testing.assert_allclose(dx, 0, atol=1e-10)
+
+
 @pytest.mark.slow
 def test_loess_detrend(timeseries):
     x = timeseries(np.arange(12 * 365.25))
@@ -93,6 +142,63 @@ def test_rollingmean_detrend(timeseries):
     assert fx.ds.trend.notnull().sum() == 365
 
 
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"win": 29},
+        {"win": 30, "min_periods": 1},
+        {"win": 11, "weights": windows.get_window("triang", 11, False)},
+    ],
+)
+def test_rollingmean_detrend_chunked(timeseries, random, kwargs):
+    x = xr.concat([timeseries(random.normal(size=2000)) for _ in range(2)], dim="lat")
+    x[1, [0, 5, 100, 101, 1999]] = np.nan
+    xc = x.chunk(time=137)
+
+    exp = RollingMeanDetrend(**kwargs).fit(x)
+    fx = RollingMeanDetrend(**kwargs).fit(xc)
+    assert fx.ds.trend.chunks[fx.ds.trend.get_axis_num("time")][0] == 137
+    np.testing.assert_allclose(fx.ds.trend, exp.ds.trend, rtol=1e-10)
+    np.testing.assert_allclose(fx.detrend(xc), exp.detrend(x), atol=1e-10)
+
+
+@pytest.mark.parametrize(
+    "group", ["time", "time.month", Grouper("time.dayofyear", window=5)]
+)
+def test_mean_detrend_chunked(timeseries, random, group):
+    x = xr.concat([timeseries(random.normal(size=2000)) for _ in range(2)], dim="lat")
+    x[1, [0, 5, 100]] = np.nan
+    xc = x.chunk(time=137)
+
+    exp = MeanDetrend(group=group).fit(x)
+    fx = MeanDetrend(group=group).fit(xc)
+    assert fx.ds.trend.chunks[fx.ds.trend.get_axis_num("time")][0] == 137
+    np.testing.assert_allclose(
+        fx.ds.trend.transpose(*exp.ds.trend.dims), exp.ds.trend, rtol=1e-10
+    )
+
+
+@pytest.mark.parametrize(
+    "group", ["time", "time.month", Grouper("time.dayofyear", window=5)]
+)
+def test_mean_detrend_chunked_memory(timeseries, random, group):
+    x = xr.concat([timeseries(random.normal(size=2000)) for _ in range(2)], dim="lat")
+    xc = x.chunk(time=137)
+
+    # Results of the tasks computing the trend, which stays chunked as the input
+    sizes = []
+    with Callback(
+        posttask=lambda key, res, *args: sizes.append(getattr(res, "nbytes", 0))
+    ):
+        trend = MeanDetrend(group=group).fit(xc).ds.trend.persist()
+
+    assert trend.chunks[trend.get_axis_num("time")] == xc.chunks[1]
+    # Neither the whole series nor its rolling window are held in a single chunk
+    assert max(sizes) < x.nbytes / 2
+    exp = MeanDetrend(group=group).fit(x).ds.trend
+    np.testing.assert_allclose(trend.transpose(*exp.dims), exp, rtol=1e-10)
+
+
 def test_no_detrend(timeseries):
     x = timeseries(np.arange(12 * 365.25))
 
@@ -85,3 +85,50 @@ def test_loess_smoothing_nan(use_dask):
     assert out.dims == da.dims
     # check that the output is all nan on the axis with nan in the input
     assert np.isnan(out.values[0, 0]).all()
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    "d,weights,f",
+    [
+        (0, "tricube", 0.2),
+        (1, "tricube", 0.2),
+        (1, "tricube", 0.9),
+        (1, "gaussian", 0.1),
+    ],
+)
+def test_loess_smoothing_equal_spacing(random, d, weights, f):
+    x = np.linspace(0, 1, num=1000)
+    y = np.sin(x * np.pi * 10) + random.normal(size=(3, 1000))
+    y[1, [10, 500, 501]] = np.nan
+    da = xr.DataArray(y, dims=("site", "x"), coords={"x": x})
+
+    out = loess_smoothing(da, dim="x", d=d, f=f, weights=weights, equal_spacing=True)
+
+    w = {"tricube": _tricube_weighting, "gaussian": _gaussian_weighting}[weights]
+    regfun = {0: _constant_regression, 1: _linear_regression}[d]
+    exp = [
+        _loess_nb(x, ys, f=f, reg_func=regfun, weight_func=w, dx=x[1] - x[0])
+        for ys in y
+    ]
+    np.testing.assert_allclose(out, exp, atol=1e-10)
+    np.testing.assert_array_equal(out.isnull(), da.isnull())
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("d", [0, 1])
+def test_loess_smoothing_unequal_spacing(random, d):
+    x = np.sort(random.random(300))
+    x = (x - x[0]) / (x[-1] - x[0])
+    y = np.sin(x * np.pi * 10) + random.normal(size=(2, 3, 300))
+    y[0, 1, [10, 150]] = np.nan
+    da = xr.DataArray(y, dims=("lat", "lon", "x"), coords={"x": x})
+
+    out = loess_smoothing(da, dim="x", d=d, f=0.2)
+
+    regfun = {0: _constant_regression, 1: _linear_regression}[d]
+    exp = np.stack(
+        [_loess_nb(x, ys, f=0.2, reg_func=regfun) for ys in y.reshape(6, 300)]
+    )
+    assert out.dims == da.dims
+    np.testing.assert_allclose(out.values.reshape(6, 300), exp, atol=1e-10)
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import dask
 import numpy as np
 import pytest
 import xarray as xr
+from dask.callbacks import Callback
+from numba.core import config
+from numba.core.caching import NullCache
 
 from xsdba import nbutils as nbu
+from xsdba import set_options, utils
+from xsdba.base import Grouper
+from xsdba.options import _numba_cache_attribute, _numba_kernels
 
 
 class TestQuantiles:
@@ -36,3 +43,291 @@ class TestQuantiles:
         da = xr.DataArray([np.nan] * 100, dims="dim_0")
         out_nbu = nbu.quantile(da, q, dim="dim_0")
         np.testing.assert_array_equal(out_nbu.values, np.full_like(q, np.nan))
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def test_chunked(self, random, dtype):
+        q = np.concatenate([[0, 1e-6], np.linspace(0.01, 0.99, 21), [1 - 1e-6, 1]])
+        q = q.astype(dtype)
+        data = np.stack(
+            [
+                random.normal(size=(2, 2000)),
+                random.integers(0, 5, size=(2, 2000)),
+                random.gamma(0.3, size=(2, 2000)) ** 5,
+            ]
+        )
+        data[0, 0, ::3] = np.nan
+        data[1, 0, 1:] = np.nan
+        data[1, 1] = np.nan
+        data[2, 0, 10] = np.inf
+        da = xr.DataArray(data.astype(dtype), dims=("x", "y", "time"))
+
+        def no_compute(*args, **kwargs):
+            raise AssertionError("The quantiles should not be computed eagerly.")
+
+        exp = nbu.quantile(da, q, dim="time")
+        with dask.config.set(scheduler=no_compute):
+            out = nbu.quantile(da.chunk(time=150, x=1), q, dim="time")
+        assert out.chunks is not None
+        np.testing.assert_array_equal(out, exp)
+
+        exp = nbu.quantile(da, q, dim=["time", "y"])
+        out = nbu.quantile(da.chunk(time=500, y=1), q, dim=["time", "y"])
+        np.testing.assert_array_equal(out.transpose(*exp.dims), exp)
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def test_chunked_ties(self, random, dtype):
+        q = np.linspace(0.01, 0.99, 99)
+        # Hundreds of copies of values with long mantissas, like 0.1, are never few enough to be gathered
+        data = np.round(random.gamma(1, size=(3, 6000)) * [[1], [2], [10]], 1)
+        data[0, ::7] = np.nan
+        da = xr.DataArray(data.astype(dtype), dims=("x", "time"))
+
+        exp = nbu.quantile(da, q, dim="time")
+        out = nbu.quantile(da.chunk(time=1500), q, dim="time")
+        np.testing.assert_array_equal(out, exp)
+
+    def test_chunked_memory(self, random):
+        q = np.linspace(0.01, 0.99, 50)
+        data = random.normal(size=(4, 3000))
+        data[1, ::3] = np.nan
+        da = xr.DataArray(data, dims=("x", "time"))
+        dac = da.chunk(time=300).persist()
+
+        sizes = []
+        with Callback(posttask=lambda key, res, *args: sizes.append(res.nbytes)):
+            out = nbu.quantile(dac, q, dim="time").persist()
+
+        # At most the gathered values and the smallest value above them for each series and quantile of a chunk
+        assert max(sizes) <= da.x.size * q.size * (nbu._QUANTILE_GATHER_SIZE + 1) * 8
+        np.testing.assert_array_equal(out, nbu.quantile(da, q, dim="time"))
+
+    def test_parallel(self, random):
+        q = np.linspace(0.01, 0.99, 20)
+        data = random.normal(size=(300, 4, 5))
+        data[0, 1] = np.nan
+        # time is the first axis, the data is strided once transposed by apply_ufunc
+        da = xr.DataArray(data, dims=("time", "x", "y"))
+
+        arr, keep_shape = nbu._as_2d(data.transpose(1, 2, 0), 1)
+        assert np.shares_memory(arr, data)
+        assert keep_shape == (4, 5)
+
+        exp = nbu.quantile(da, q, dim="time", parallel=False)
+        out = nbu.quantile(da, q, dim="time", parallel=True)
+        np.testing.assert_array_equal(out, exp)
+        np.testing.assert_array_equal(
+            exp.isel(x=2, y=3), nbu._nan_quantile_1d(data[:, 2, 3].copy(), q)
+        )
+
+        exp = nbu.quantile(da.chunk(x=1), q, dim=["time", "y"])
+        out = nbu.quantile(da, q, dim=["time", "y"])
+        np.testing.assert_array_equal(out, exp)
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def test_select(self, random, dtype):
+        q = np.concatenate([[0], np.linspace(0.01, 0.99, 50), [1]]).astype(dtype)
+        data = [
+            random.normal(size=1000),
+            np.round(random.normal(size=1000) * 2),
+            np.where(random.random(1000) < 0.7, 0, random.gamma(0.5, size=1000)),
+            np.arange(1000.0)[::-1],
+            np.array([3.0]),
+        ]
+        data[0][::7] = np.nan
+        data[1][0] = -np.inf
+        buf = np.empty(1000, dtype=dtype)
+        for arr in data:
+            arr = arr.astype(dtype)
+            exp = nbu._nan_quantile_1d(arr.copy(), q)
+            out = nbu._nan_quantile_select_1d(arr, q, buf)
+            np.testing.assert_array_equal(out, exp)
+        np.testing.assert_array_equal(
+            nbu._nan_quantile_select_1d(np.full(10, np.nan, dtype), q, buf),
+            np.full_like(q, np.nan),
+        )
+
+
+class TestGroupedQuantiles:
+    @pytest.mark.parametrize(
+        "group,window,add_dims",
+        [
+            ("time", 1, None),
+            ("time.month", 1, None),
+            ("time.month", 5, None),
+            ("time.season", 1, None),
+            ("time.dayofyear", 31, None),
+            ("time.dayofyear", 4, ["lat"]),
+        ],
+    )
+    @pytest.mark.parametrize("use_dask", [True, False])
+    def test_same_as_groupby(
+        self, timelonlatseries, random, group, window, add_dims, use_dask
+    ):
+        da = timelonlatseries(random.normal(size=(365 * 4 + 1, 2, 2)))
+        da[::7, 0, 0] = np.nan
+        q = np.linspace(0.01, 0.99, 11)
+        grouper = Grouper(group, window=window, add_dims=add_dims)
+        exp_q = grouper.apply(nbu.quantile, da, q=q)
+        exp_mean = grouper.apply("mean", da)
+
+        if use_dask:
+            da = da.chunk(lon=1)
+        idx = grouper.get_group_indexes(da)
+        dims = [grouper.dim] + grouper.add_dims
+        out = nbu.grouped_quantile(da, q, idx, dims)
+        np.testing.assert_array_equal(out.transpose(*exp_q.dims), exp_q)
+
+        out = nbu.grouped_mean(da, idx, dims)
+        np.testing.assert_allclose(out.transpose(*exp_mean.dims), exp_mean)
+
+    def test_scale_shift(self, timelonlatseries, random):
+        da = timelonlatseries(random.normal(size=(365 * 2, 3)))
+        q = np.linspace(0.01, 0.99, 11)
+        grouper = Grouper("time.month")
+        idx = grouper.get_group_indexes(da)
+        scale = xr.DataArray(np.linspace(-2, 2, 12), dims=("month",))
+        shift = xr.DataArray([1, 2, 3], dims=("lon",))
+
+        exp = grouper.apply(
+            nbu.quantile, da * scale.isel(month=da.time.dt.month - 1) + shift, q=q
+        )
+        out = nbu.grouped_quantile(da, q, idx, "time", scale=scale, shift=shift)
+        np.testing.assert_array_equal(out.transpose(*exp.dims), exp)
+
+    @pytest.mark.parametrize(
+        "group,window,add_dims",
+        [
+            ("time", 1, None),
+            ("time.month", 1, None),
+            ("time.dayofyear", 31, None),
+            ("time.dayofyear", 4, ["lat"]),
+        ],
+    )
+    def test_sketch(self, timelonlatseries, random, group, window, add_dims):
+        da = timelonlatseries(random.normal(size=(365 * 4 + 1, 2, 2)))
+        da[::7, 0, 0] = np.nan
+        q = np.linspace(0, 1, 11)
+        grouper = Grouper(group, window=window, add_dims=add_dims)
+        idx = grouper.get_group_indexes(da)
+        dims = [grouper.dim] + grouper.add_dims
+        exp_q = nbu.grouped_quantile(da, q, idx, dims)
+
+        # Sketches larger than the groups are exact
+        sketch = nbu.grouped_sketch(da.chunk(time=100), idx, dims, error=1e-6)
+        np.testing.assert_allclose(nbu.sketch_quantile(sketch, q), exp_q)
+        np.testing.assert_allclose(
+            nbu.sketch_mean(sketch), nbu.grouped_mean(da, idx, dims)
+        )
+
+        # Otherwise, the ranks of the estimated quantiles are within the error bound
+        error = 0.05
+        sketch = nbu.grouped_sketch(da.chunk(time=30), idx, dims, error=error)
+        keep = [d for d in da.dims if d not in dims]
+        out = nbu.sketch_quantile(sketch, q).transpose(*keep, grouper.prop, ...)
+        out = out.values.reshape(-1, idx.shape[0], q.size)
+        data = da.transpose(*keep, *dims[::-1]).values
+        data = data.reshape(out.shape[0], -1, da.time.size)
+        for ig, members in enumerate(idx.values):
+            members = members[members >= 0]
+            for ipt in range(out.shape[0]):
+                vals = np.sort(data[ipt][:, members].ravel())
+                vals = vals[~np.isnan(vals)]
+                est = out[ipt, ig]
+                lo = np.searchsorted(vals, est, side="left")
+                hi = np.searchsorted(vals, est, side="right") - 1
+                rank = q * (vals.size - 1)
+                # One more rank for the interpolation between two elements
+                assert (np.maximum(lo - rank, rank - hi) <= error * vals.size + 1).all()
+
+    @pytest.mark.parametrize("group,window", [("time.month", 1), ("time.dayofyear", 7)])
+    def test_rank_vecquantiles(self, timelonlatseries, random, group, window):
+        da = timelonlatseries(random.integers(0, 10, size=(365 * 2, 2)).astype(float))
+        da[::5, 0] = np.nan
+        grouper = Grouper(group, window=window)
+        idx = grouper.get_group_indexes(da)
+        centers = grouper.get_group_indexes(da, main_only=True)
+
+        exp = grouper.apply(utils.rank, da, pct=True)
+        out = nbu.grouped_rank(da, idx, centers, "time")
+        np.testing.assert_allclose(out.transpose(*exp.dims), exp)
+
+        rnk = xr.DataArray(
+            random.random(size=(2, idx[grouper.prop].size)),
+            dims=("lon", grouper.prop),
+            coords={grouper.prop: idx[grouper.prop]},
+        )
+        out = nbu.grouped_vecquantiles(da, rnk, idx, "time")
+        for lbl, grp in grouper.group(da):
+            for ilon in range(2):
+                r = rnk.isel(lon=ilon).sel({grouper.prop: lbl})
+                np.testing.assert_allclose(
+                    out.isel(lon=ilon).sel({grouper.prop: lbl}),
+                    np.nanquantile(grp.isel(lon=ilon).values, r),
+                )
+
+
+def test_numba_cache_dir(tmp_path):
+    kernels = list(_numba_kernels())
+    assert nbu._get_indexes in kernels
+    assert nbu._vecquantiles._dispatcher in kernels
+
+    def cache(kernel):
+        # Generalized ufuncs and njit functions name their cache differently
+        return getattr(kernel, _numba_cache_attribute(kernel))
+
+    # The kernels are not cached on disk by default
+    assert all(isinstance(cache(kernel), NullCache) for kernel in kernels)
+    numba_default = config.CACHE_DIR
+    with set_options(numba_cache_dir=tmp_path):
+        # The setting only applies to the kernels of xsdba
+        assert config.CACHE_DIR == numba_default
+        for kernel in kernels:
+            path = cache(kernel)._impl.locator.get_cache_path()
+            assert path.startswith(str(tmp_path))
+        # The kernels compiled for new signatures are written to the cache directory
+        nbu._virtual_indexes(np.int16(10), np.array([0.5], dtype=np.float32), 1, 1)
+        assert any(tmp_path.rglob("nbutils._virtual_indexes*.nbi"))
+    assert config.CACHE_DIR == numba_default
+    assert all(isinstance(cache(kernel), NullCache) for kernel in kernels)
+
+
+def test_numba_cache_private_api(monkeypatch):
+    # The option relies on these private attributes of numba, a new version without them must fail this test
+    from numba.core import caching
+    from numba.core.dispatcher import Dispatcher
+    from numba.np.ufunc.gufunc import GUFunc
+
+    assert isinstance(nbu._get_indexes, Dispatcher)
+    assert isinstance(nbu._get_indexes._cache, caching.NullCache)
+    assert isinstance(nbu._vecquantiles, GUFunc)
+    assert isinstance(nbu._vecquantiles._dispatcher.cache, caching.NullCache)
+    for cls in ["UserProvidedCacheLocator", "CompileResultCacheImpl", "FunctionCache"]:
+        assert hasattr(caching, cls)
+    assert hasattr(caching.UserProvidedCacheLocator, "get_suitable_cache_subpath")
+
+    # Without them, the option raises instead of silently not caching
+    monkeypatch.delattr(nbu._get_indexes, "_cache")
+    with pytest.raises(RuntimeError, match="does not support numba"):
+        set_options(numba_cache_dir="unused")
+
+
+@pytest.mark.parametrize(
+    "ctr,key,exp",
+    [
+        # Known-answer tests of Random123
+        ([0, 0, 0, 0], [0, 0], [0x6627E8D5, 0xE169C58D, 0xBC57AC4C, 0x9B00DBD8]),
+        (
+            [0xFFFFFFFF] * 4,
+            [0xFFFFFFFF] * 2,
+            [0x408F276D, 0x41C83B0E, 0xA20BC7C6, 0x6D5451FD],
+        ),
+        (
+            [0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344],
+            [0xA4093822, 0x299F31D0],
+            [0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1],
+        ),
+    ],
+)
+def test_philox4x32(ctr, key, exp):
+    out = nbu._philox4x32(*map(np.uint64, ctr), *map(np.uint64, key))
+    assert [int(o) for o in out] == exp
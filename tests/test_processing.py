@@ -5,8 +5,10 @@ import pandas as pd
 import pytest
 import xarray as xr
 
+from xsdba._processing import _adapt_freq_group
 from xsdba.adjustment import EmpiricalQuantileMapping
 from xsdba.base import Grouper
+from xsdba.options import set_options
 from xsdba.processing import (
     adapt_freq,
     escore,
@@ -47,7 +49,7 @@ def test_jitter_under_thresh():
     assert da[0] > 0
     np.testing.assert_allclose(da[1:], out[1:])
     assert (
-        "jitter(x=<array>, lower='1 K', upper=None, minimum=None, maximum=None) - xsdba version"
+        "jitter(x=<array>, lower='1 K', upper=None, minimum=None, maximum=None, key=None) - xsdba version"
         in out.attrs["history"]
     )
 
@@ -63,6 +65,38 @@ def test_jitter_over_thresh():
     assert out.units == "m"
 
 
+def test_jitter_random_seed(timelonlatseries, random):
+    da = timelonlatseries(random.random((365, 3, 2)), attrs={"units": "K"})
+    with set_options(random_seed=1):
+        exp = jitter(da, lower="0.2 K", upper="0.8 K", maximum="1 K", key="x")
+        out = jitter(
+            da.chunk(time=50, lat=1),
+            lower="0.2 K",
+            upper="0.8 K",
+            maximum="1 K",
+            key="x",
+        )
+        np.testing.assert_array_equal(out, exp)
+    with set_options(random_seed=2):
+        out = jitter(da, lower="0.2 K", upper="0.8 K", maximum="1 K", key="x")
+    changed = (da < 0.2) | (da >= 0.8)
+    assert (out != exp).where(changed, True).all()
+    np.testing.assert_array_equal(out.where(~changed), exp.where(~changed))
+
+    # Arrays with the same coordinates get independent noise with different keys, or with different data
+    zeros = xr.zeros_like(da)
+    with set_options(random_seed=1):
+        ref = jitter_under_thresh(zeros, "1 K", key="ref")
+        hist = jitter_under_thresh(zeros, "1 K", key="hist")
+        assert (ref != hist).all()
+        ref = jitter_under_thresh(zeros.rename("pr"), "1 K")
+        hist = jitter_under_thresh((zeros + 0.5).rename("pr"), "1 K")
+        assert (ref != hist).all()
+        np.testing.assert_array_equal(
+            jitter_under_thresh(zeros.rename("pr"), "1 K"), ref
+        )
+
+
 @pytest.mark.parametrize("use_dask", [True, False])
 def test_adapt_freq(use_dask, random):
     time = pd.date_range("1990-01-01", "2020-12-31", freq="D")
@@ -141,6 +175,73 @@ def test_adapt_freq_add_dims(use_dask, random):
     assert set(sim_ad.dims) == set(prsim.dims)
 
 
+@pytest.mark.parametrize(
+    "group,window",
+    [("time", 1), ("time.month", 1), ("time.season", 1), ("time.dayofyear", 15)],
+)
+def test_adapt_freq_same_as_groupby(random, group, window):
+    time = pd.date_range("1990-01-01", "1995-12-31", freq="D")
+    pr = xr.DataArray(
+        random.integers(0, 100, size=(time.size, 2)).astype(float),
+        coords={"time": time, "lat": [0, 1]},
+        dims=("time", "lat"),
+        attrs={"units": "mm d-1"},
+    )
+    prsim = pr.where(pr >= 20, pr / 20)
+    prref = pr.where(pr >= 10, pr / 20)
+    group = Grouper(group, window=window)
+
+    sim_ad, pth, dP0 = adapt_freq(prref, prsim, thresh="1 mm d-1", group=group)
+
+    # Same computation on the grouped (and windowed) data
+    def _adapt(ds, dim):
+        out = _adapt_freq_group(ds, dim=dim, thresh=1)
+        return out.sim_ad != ds.sim, out.pth, out.dP0
+
+    ds = xr.Dataset({"sim": prsim, "ref": prref})
+    changed, exp_pth, exp_dP0 = (
+        group.apply(lambda grp, dim: _adapt(grp, dim)[i], ds) for i in range(3)
+    )
+    np.testing.assert_allclose(pth.transpose(*exp_pth.dims), exp_pth, rtol=1e-12)
+    np.testing.assert_allclose(dP0.transpose(*exp_dP0.dims), exp_dP0, rtol=1e-12)
+    # The randomly generated values differ, but the same elements are corrected.
+    np.testing.assert_array_equal(
+        (sim_ad != prsim).transpose(*changed.dims), changed.astype(bool)
+    )
+
+
+def test_adapt_freq_random_seed(random):
+    time = pd.date_range("1990-01-01", "1995-12-31", freq="D")
+    pr = xr.DataArray(
+        random.integers(0, 100, size=(time.size, 4)).astype(float),
+        coords={"time": time, "lat": [0, 1, 2, 3]},
+        dims=("time", "lat"),
+        attrs={"units": "mm d-1"},
+    )
+    prsim = pr.where(pr >= 20, pr / 20)
+    prref = pr.where(pr >= 10, pr / 20)
+
+    with set_options(random_seed=0):
+        exp = adapt_freq(
+            prref, prsim, thresh="1 mm d-1", group="time.month", key="sim"
+        )[0]
+        for chunks in [{"lat": 1}, {"lat": 3}]:
+            sim_ad = adapt_freq(
+                prref.chunk(chunks),
+                prsim.chunk(chunks),
+                thresh="1 mm d-1",
+                group="time.month",
+                key="sim",
+            )[0]
+            np.testing.assert_array_equal(sim_ad, exp)
+        other = adapt_freq(
+            prref, prsim, thresh="1 mm d-1", group="time.month", key="other"
+        )[0]
+    changed = exp != prsim
+    assert changed.any()
+    assert (other != exp).where(changed, True).all()
+
+
 def test_escore():
     x = np.array([1, 4, 3, 6, 4, 7, 5, 8, 4, 5, 3, 7]).reshape(2, 6)
     y = np.array([6, 6, 3, 8, 5, 7, 3, 7, 3, 6, 4, 3]).reshape(2, 6)
@@ -278,6 +379,12 @@ def test_normalize(timeseries, random):
     xp2, norm = normalize(tas, norm=norm, group="time.dayofyear")
     np.testing.assert_allclose(xp, xp2)
 
+    group = Grouper("time.dayofyear", window=31)
+    xp, norm = normalize(tas, group=group, kind="*")
+    exp = group.apply("mean", tas)
+    np.testing.assert_allclose(norm, exp, rtol=1e-12)
+    np.testing.assert_allclose(xp * norm.sel(dayofyear=tas.time.dt.dayofyear), tas)
+
 
 def test_stack_variables(gosset):
     ds1 = xr.open_dataset(gosset.fetch("sdba/CanESM2_1950-2100.nc"))
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pytest
+
+from xsdba import set_options
+from xsdba.adjustment import EmpiricalQuantileMapping
+from xsdba.profiling import get_report, profile, profiled
+
+
+@pytest.fixture
+def ref_hist_sim(timelonlatseries):
+    rng = np.random.default_rng(0)
+    return [
+        timelonlatseries(
+            280 + i + rng.normal(size=(365 * 3, 2, 1)),
+            attrs={"units": "K", "kind": "+"},
+        )
+        for i in range(3)
+    ]
+
+
+class TestProfile:
+    @pytest.mark.parametrize("use_dask", [True, False])
+    def test_train_adjust(self, ref_hist_sim, use_dask, tmp_path):
+        ref, hist, sim = ref_hist_sim
+        if use_dask:
+            ref, hist, sim = (da.chunk(lon=1) for da in [ref, hist, sim])
+        with profile() as report:
+            EQM = EmpiricalQuantileMapping.train(ref, hist, group="time.month")
+            EQM.adjust(sim).load()
+
+        assert get_report() is report
+        assert report.end is not None
+        summary = report.summary()
+        stages = summary.xs("stage", level="category").index
+        for name in [
+            "harmonize_units",
+            "check_inputs",
+            "Grouper.apply",
+            "grouped_quantile",
+            "interp_on_quantiles",
+            "EmpiricalQuantileMapping.train",
+            "EmpiricalQuantileMapping.adjust",
+        ]:
+            assert name in stages
+        graphs = summary.xs("graph", level="category")
+        assert {"block_group_eqm_train_grouped", "block_qm_adjust"} <= set(graphs.index)
+        assert (summary.total_time >= 0).all()
+        if use_dask:
+            assert (graphs.tasks > 0).all()
+            tasks = summary.xs("task", level="category").index
+            assert "block_qm_adjust-scen" in tasks
+        else:
+            assert (graphs.tasks == 0).all()
+            assert "task" not in summary.index.get_level_values("category")
+
+        trace = report.to_chrome_trace(tmp_path / "trace.json")
+        with (tmp_path / "trace.json").open() as f:
+            assert json.load(f) == trace
+        phases = {event["ph"] for event in trace["traceEvents"]}
+        assert "X" in phases
+
+    def test_disabled(self, ref_hist_sim):
+        ref, hist, sim = ref_hist_sim
+        with profile() as report:
+            pass
+        assert repr(report) == "<ProfileReport: no events>"
+
+        EmpiricalQuantileMapping.train(ref, hist).adjust(sim)
+        assert report.events == []
+
+    def test_set_options(self):
+        @profiled("double")
+        def double(x):
+            return 2 * x
+
+        with set_options(profile=True):
+            assert double(2) == 4
+            report = get_report()
+            with profile() as same:
+                double(3)
+            assert same is report
+        double(4)
+
+        assert [event.name for event in report.events] == ["double", "double"]
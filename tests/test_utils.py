@@ -3,11 +3,13 @@ from __future__ import annotations
 import numpy as np
 import pytest
 import xarray as xr
+from scipy.spatial import distance
 from scipy.stats import norm
 
 from xsdba import nbutils as nbu
 from xsdba import utils as u
-from xsdba.base import Grouper
+from xsdba.base import Grouper, map_blocks
+from xsdba.options import set_options
 
 
 def test_ecdf(timeseries, random):
@@ -160,6 +162,110 @@ def test_interp_on_quantiles_monthly(random):
         assert afi.isnull().sum("time") == 0, interp
 
 
+@pytest.mark.parametrize("interp", ["nearest", "linear", "cubic"])
+@pytest.mark.parametrize("extrap", ["constant", "nan"])
+def test_interp_on_quantiles_1d(random, interp, extrap):
+    scipy_interpolate = pytest.importorskip("scipy.interpolate")
+    oldx = np.sort(random.normal(size=(3, 20)), axis=-1)
+    oldy = random.normal(size=(3, 20))
+    oldx[1, 5] = np.nan
+    newx = 1.5 * random.normal(size=(3, 100))
+    newx[:, ::10] = np.nan
+    newx[:, 1:4] = oldx[:, 6:9]
+
+    out = u._interp_on_quantiles_1D(newx, oldx, oldy, interp, extrap)
+    for i in range(3):
+        valid = ~np.isnan(oldx[i])
+        fill = (oldy[i, 0], oldy[i, -1]) if extrap == "constant" else np.nan
+        exp = scipy_interpolate.interp1d(
+            oldx[i, valid],
+            oldy[i, valid],
+            kind=interp,
+            bounds_error=False,
+            fill_value=fill,
+        )(newx[i])
+        exp[np.isnan(newx[i])] = np.nan
+        np.testing.assert_allclose(out[i], exp, rtol=1e-10)
+
+
+def test_interp_on_quantiles_1d_duplicates(random):
+    # Quantiles of precipitation with many zeros
+    oldx = np.concatenate([np.zeros(5), np.sort(random.gamma(1, size=15))])
+    oldy = np.arange(20.0)
+    newx = random.uniform(0, 3, size=100)
+    with pytest.raises(ValueError, match="distinct nodes"):
+        u._interp_on_quantiles_1D(newx, oldx, oldy, "cubic", "constant")
+    out = u._interp_on_quantiles_1D(newx, oldx, oldy, "linear", "constant")
+    assert np.isfinite(out).all()
+    # Repeated NaN nodes are skipped
+    oldx[:4] = np.nan
+    out = u._interp_on_quantiles_1D(newx, oldx, oldy, "cubic", "constant")
+    assert np.isfinite(out).all()
+
+
+@pytest.mark.parametrize("interp", ["nearest", "linear", "cubic"])
+def test_interp_on_quantiles_grid(random, interp):
+    t = xr.cftime_range("2000-01-01", periods=365, freq="D", calendar="noleap")
+    quantiles = u.equally_spaced_nodes(20)
+    month = np.arange(1, 13)
+    # Each month has its own sorted nodes, the values are a plane
+    xq = xr.DataArray(
+        np.sort(random.uniform(0, 10, size=(2, 12, 20)), axis=-1),
+        dims=("lat", "month", "quantiles"),
+        coords={"month": month, "quantiles": quantiles},
+    )
+    xq[..., 0] = 0
+    xq[..., -1] = 10
+    yq = 2 * xq + 3 * xq.month
+    xq[0, 4, 3:6] = np.nan
+    newx = xr.DataArray(
+        random.uniform(-1, 11, size=(2, t.size)),
+        dims=("lat", "time"),
+        coords={"time": t},
+    )
+    newx[1, ::10] = np.nan
+
+    out = u.interp_on_quantiles(
+        newx, xq, yq, group="time.month", method=interp, extrapolation="nan"
+    )
+    assert out.dims == newx.dims
+    assert out.isel(lat=1, time=slice(None, None, 10)).isnull().all()
+
+    mon = Grouper("time.month").get_index(newx, interp=interp != "nearest")
+    if interp == "nearest":
+        scipy_interpolate = pytest.importorskip("scipy.interpolate")
+        xq0 = xq.isel(lat=0)
+        valid = xq0.notnull().values
+        exp = scipy_interpolate.griddata(
+            (xq0.values[valid], xq0.month.broadcast_like(xq0).values[valid]),
+            yq.isel(lat=0).values[valid],
+            (newx.isel(lat=0).values, mon.values),
+            method="nearest",
+        )
+        inside = out.isel(lat=0).notnull()
+        np.testing.assert_array_equal(out.isel(lat=0)[inside], exp[inside])
+    else:
+        # Both interpolations are exact for a plane, away from the cyclic bounds.
+        exp = 2 * newx + 3 * mon
+        inside = out.notnull() & (mon >= 2) & (mon <= 11)
+        np.testing.assert_allclose(out.where(inside), exp.where(inside), rtol=1e-12)
+        assert inside.sum() > 300
+
+
+def test_interp_on_quantiles_nearest_ties(timelonlatseries):
+    quantiles = np.array([0.125, 0.375, 0.625, 0.875])
+    xq = xr.DataArray(
+        np.tile(quantiles, (12, 1)),
+        dims=("month", "quantiles"),
+        coords={"month": np.arange(1, 13), "quantiles": quantiles},
+    )
+    yq = 8 * xq + xq.month
+    # Points half-way between two nodes take the value of the lower one
+    newx = timelonlatseries(np.tile([0.25, 0.5, 0.75], 122))
+    out = u.interp_on_quantiles(newx, xq, yq, group="time.month", method="nearest")
+    np.testing.assert_array_equal(out, 8 * (newx - 0.125) + newx.time.dt.month)
+
+
 @pytest.mark.parametrize(
     "interp,expi", [("nearest", 2.9), ("linear", 2.95), ("cubic", 2.95)]
 )
@@ -223,3 +329,139 @@ def test_rank(random):
     exp = arr.argsort().argsort() + 1
 
     np.testing.assert_array_equal(ranks.values, exp)
+
+
+def test_optimal_transport_cache(random):
+    pytest.importorskip("ot")
+    gridX, gridY = random.normal(size=(20, 2)), random.normal(size=(15, 2))
+    muX, muY = np.full(20, 1 / 20), np.full(15, 1 / 15)
+
+    plan = u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance")
+    assert u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance") is not plan
+
+    with set_options(ot_plan_cache=1):
+        plan1 = u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance")
+        np.testing.assert_array_equal(plan1.toarray(), plan.toarray())
+        assert not plan1.data.flags.writeable
+        assert (
+            u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance") is plan1
+        )
+        # Different normalization, a new plan replaces the previous one
+        plan2 = u.optimal_transport(gridX, gridY, muX, muY, 1000, None)
+        assert plan2 is not plan1
+        assert u.optimal_transport(gridX, gridY, muX, muY, 1000, None) is plan2
+        assert (
+            u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance")
+            is not plan1
+        )
+
+
+def test_optimal_transport_cache_blocks(random, timeseries):
+    pytest.importorskip("ot")
+    gridX, gridY = random.normal(size=(20, 2)), random.normal(size=(15, 2))
+    muX, muY = np.full(20, 1 / 20), np.full(15, 1 / 15)
+    da = timeseries(np.arange(365.0)).expand_dims(lat=[1, 2]).chunk(lat=1)
+
+    @map_blocks(reduces=["time"], data=[])
+    def func(ds, *, group):
+        plan = u.optimal_transport(gridX, gridY, muX, muY, 1000, "max_distance")
+        cached = any(plan is p for p in u._OT_PLANS.values())
+        return xr.full_like(ds.da.isel(time=0, drop=True), cached).to_dataset(
+            name="data"
+        )
+
+    # The option is read when the function is called, not when the blocks are computed.
+    with set_options(ot_plan_cache=1):
+        cached = func(xr.Dataset({"da": da}), group="time")
+    uncached = func(xr.Dataset({"da": da}), group="time")
+    with set_options(ot_plan_cache=1):
+        uncached = uncached.compute()
+    assert cached.data.all()
+    assert not uncached.data.any()
+
+
+@pytest.mark.parametrize("solver", ["sinkhorn", "sliced"])
+def test_optimal_transport_solvers(random, solver):
+    pytest.importorskip("ot")
+    gridX, gridY = random.normal(size=(60, 3)), random.normal(size=(50, 3)) + 1
+    muX, muY = random.random(60), random.random(50)
+    muX, muY = muX / muX.sum(), muY / muY.sum()
+    exp = u.optimal_transport(gridX, gridY, muX, muY, 100_000, "max_distance")
+
+    kws = {"reg": 1e-3, "num_iter_max": 10_000} if solver == "sinkhorn" else {}
+    plan = u.optimal_transport(
+        gridX, gridY, muX, muY, 100_000, "max_distance", solver, kws
+    )
+    assert plan.shape == (60, 50)
+    # The entropic plan is dense
+    assert isinstance(plan, np.ndarray) == (solver == "sinkhorn")
+    if solver == "sliced":
+        plan = plan.toarray()
+    exp = exp.toarray()
+    np.testing.assert_allclose(plan.sum(axis=1), 1)
+    # The plan transports muX to muY
+    np.testing.assert_allclose(muX @ plan, muY, atol=1e-8)
+
+    # The approximate plans are close to the optimum
+    max_dist = np.maximum(
+        np.abs(gridX.max(axis=0) - gridY.min(axis=0)),
+        np.abs(gridY.max(axis=0) - gridX.min(axis=0)),
+    )
+    C = distance.cdist(gridX / max_dist, gridY / max_dist, "sqeuclidean")
+    cost = (muX[:, np.newaxis] * plan * C).sum()
+    exp_cost = (muX[:, np.newaxis] * exp * C).sum()
+    assert exp_cost <= cost + 1e-12
+    assert cost < exp_cost * (1.1 if solver == "sinkhorn" else 2)
+
+
+def test_optimal_transport_sparse(random):
+    pytest.importorskip("ot")
+    gridX, gridY = random.normal(size=(200, 2)), random.normal(size=(150, 2))
+    muX, muY = np.full(200, 1 / 200), np.full(150, 1 / 150)
+    plan = u.optimal_transport(gridX, gridY, muX, muY, 100_000, "max_distance")
+    # An exact plan has at most as many non-zero elements as there are bins
+    assert plan.nnz < 200 + 150
+    np.testing.assert_allclose(plan.sum(axis=1), 1)
+
+
+def test_counter_uniform():
+    counter = np.arange(100_000, dtype=np.uint64)
+    out = u.counter_uniform(counter, "test", seed=1)
+    assert ((out >= 0) & (out < 1)).all()
+    np.testing.assert_allclose(out.mean(), 0.5, atol=0.01)
+    np.testing.assert_allclose(out.var(), 1 / 12, atol=0.01)
+
+    # Each number only depends on its counter, the stream and the seed
+    np.testing.assert_array_equal(
+        u.counter_uniform(counter[::-7], "test", seed=1), out[::-7]
+    )
+    for other in [
+        u.counter_uniform(counter, "other", seed=1),
+        u.counter_uniform(counter, "test", seed=2),
+    ]:
+        assert np.abs(np.corrcoef(out, other)[0, 1]) < 0.02
+
+
+def test_random_uniform(timelonlatseries):
+    da = timelonlatseries(np.zeros((365, 3, 2)), attrs={})
+    with set_options(random_seed=0):
+        exp = u.random_uniform(da, "test", low=1, high=2, key="x")
+        # The same numbers for any chunking or order of the dimensions
+        for other in [da.chunk(time=100, lon=1), da.transpose("lon", "time", "lat")]:
+            out = u.random_uniform(other, "test", low=1, high=2, key="x")
+            assert out.dims == other.dims
+            xr.testing.assert_equal(out.transpose(*exp.dims), exp)
+        # A subset gets the numbers of the same elements
+        xr.testing.assert_equal(
+            u.random_uniform(
+                da.isel(time=slice(10, 20), lon=[2]), "test", 1, 2, key="x"
+            ),
+            exp.isel(time=slice(10, 20), lon=[2]),
+        )
+        # The default key depends on the data, not only on the name
+        default = u.random_uniform(da, "test", low=1, high=2)
+        xr.testing.assert_equal(u.random_uniform(da.copy(), "test", 1, 2), default)
+        assert (u.random_uniform(da + 1, "test", 1, 2) != default).all()
+    assert ((exp >= 1) & (exp < 2)).all()
+    # All elements get different numbers
+    assert np.unique(exp).size == exp.size
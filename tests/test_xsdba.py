@@ -4,6 +4,8 @@
 from __future__ import annotations
 
 import pathlib
+import subprocess  # noqa: S404
+import sys
 from importlib.util import find_spec
 
 from xsdba import xsdba  # noqa: F401
@@ -24,3 +26,77 @@ def test_package_metadata():
         assert """Éric Dupuis""" in contents
         assert '__email__ = "dupuis.eric@ouranos.ca"' in contents
         assert '__version__ = "0.3.3-dev.0"' in contents
+
+
+def test_import_time():
+    """Importing the package does not import the heavy dependencies before they are needed."""
+    proc = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", "import xsdba"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines are "import time: self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "[us]" not in line:
+            _, cum, name = line.split("|")
+            cumulative[name.strip()] = int(cum)
+
+    for heavy in ["numba", "scipy", "statsmodels", "xclim", "SBCK", "xarray"]:
+        assert heavy not in cumulative
+    # A generous bound, the import takes a few tens of milliseconds
+    assert cumulative["xsdba"] < 1e6
+
+
+def test_lazy_objects_in_sync():
+    """The objects imported on first access exist, and those of `xsdba.adjustment` are its `__all__`."""
+    from xsdba import _OBJECTS, adjustment, base, processing
+
+    assert set(adjustment.__all__) == {
+        name for name, mod in _OBJECTS.items() if mod == "adjustment"
+    }
+    for name, mod in _OBJECTS.items():
+        assert hasattr(
+            {"adjustment": adjustment, "base": base, "processing": processing}[mod],
+            name,
+        )
+
+
+def test_star_import():
+    import xsdba
+
+    namespace = {}
+    exec("from xsdba import *", namespace)  # noqa: S102
+
+    assert set(xsdba.__all__).issubset(namespace)
+    for name in [
+        "adjustment",
+        "utils",
+        "set_options",
+        "Grouper",
+        "stack_periods",
+        "stack_variables",
+        "MBCn",
+    ]:
+        assert name in namespace
+    assert (
+        namespace["EmpiricalQuantileMapping"]
+        is xsdba.adjustment.EmpiricalQuantileMapping
+    )
+    assert ("measures" in namespace) is xsdba.xclim_installed
+    assert "importlib" not in namespace
+
+
+def test_lazy_attributes():
+    from xsdba import adjustment, base
+
+    package = sys.modules["xsdba"]
+
+    assert package.MBCn is adjustment.MBCn
+    assert package.Grouper is base.Grouper
+    assert {"processing", "stack_variables", "EmpiricalQuantileMapping"}.issubset(
+        dir(package)
+    )
+    assert not hasattr(package, "not_an_attribute")
+    assert not hasattr(adjustment, "SBCK_not_a_method")